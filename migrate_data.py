@@ -1,6 +1,11 @@
+import io
 import os
+import csv
 import sys
+import json
+import time
 import sqlite3
+import argparse
 import django
 from pathlib import Path
 
@@ -10,12 +15,21 @@ sys.path.append(str(BASE_DIR))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'studentstat.settings')
 django.setup()
 
+from django.db import connection, transaction
 from studStat.models import StatStudent
+from studStat.dimensions import DIMENSIONS, dimension_version_source, get_dimensions
+from studStat.stats import apply_summary_counts, apply_summary_delta
+from studStat.utils import bulk_insert_statstudent, clean_grade_data
+from studStat.versions import bump_data_version
 
-def migrate_sqlite_to_postgres():
+# Файл с позицией последней перенесенной записи для пакетного режима
+CHECKPOINT_PATH = BASE_DIR / 'migrate_data.checkpoint.json'
+COLUMNS = ('name', 'subject', 'grade', 'date', 'teacher', 'cafedra')
+
+def migrate_sqlite_to_postgres(sqlite_path=None):
     """Перенос данных из SQLite в PostgreSQL"""
     
-    sqlite_path = BASE_DIR / 'db.sqlite3'
+    sqlite_path = Path(sqlite_path or BASE_DIR / 'db.sqlite3')
     
     if not sqlite_path.exists():
         print("❌ Файл db.sqlite3 не найден!")
@@ -53,9 +67,17 @@ def migrate_sqlite_to_postgres():
     for i, (name, subject, grade, date, teacher, cafedra) in enumerate(rows, 1):
         try:
             # Проверка на дубликаты
+            grade_data = {
+                'name': name,
+                'subject': subject,
+                'grade': grade,
+                'date': date,
+                'teacher': teacher or '',
+                'cafedra': cafedra or ''
+            }
             duplicate = StatStudent.objects.filter(
-                name=name,
-                subject=subject,
+                student__name=name,
+                subject__name=subject,
                 grade=grade,
                 date=date
             ).exists()
@@ -66,14 +88,14 @@ def migrate_sqlite_to_postgres():
                 continue
             
             # Создание записи в PostgreSQL
-            StatStudent.objects.create(
-                name=name,
-                subject=subject,
-                grade=grade,
-                date=date,
-                teacher=teacher or '',
-                cafedra=cafedra or ''
-            )
+            with transaction.atomic():
+                statstudent = StatStudent.objects.create(
+                    grade=grade,
+                    date=date,
+                    **get_dimensions(grade_data)
+                )
+                apply_summary_delta(statstudent, +1)
+                bump_data_version('db')
             
             migrated += 1
             if i % 10 == 0 or i == total:
@@ -96,6 +118,211 @@ def migrate_sqlite_to_postgres():
     
     return errors == 0
 
+def load_checkpoint(sqlite_path, checkpoint_path=CHECKPOINT_PATH):
+    """Позиция, с которой нужно продолжить перенос из этого файла SQLite"""
+    if not checkpoint_path.exists():
+        return {'last_id': 0, 'migrated': 0, 'processed': 0, 'invalid': 0}
+    checkpoint = json.loads(checkpoint_path.read_text(encoding='utf-8'))
+    if checkpoint.get('sqlite_path') != str(sqlite_path):
+        return {'last_id': 0, 'migrated': 0, 'processed': 0, 'invalid': 0}
+    checkpoint.setdefault('invalid', 0)
+    return checkpoint
+
+
+def save_checkpoint(sqlite_path, checkpoint, checkpoint_path=CHECKPOINT_PATH):
+    """Атомарно сохраняет позицию переноса"""
+    checkpoint['sqlite_path'] = str(sqlite_path)
+    tmp_path = checkpoint_path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(checkpoint), encoding='utf-8')
+    os.replace(tmp_path, checkpoint_path)
+
+
+def copy_rows(cursor, table, rows):
+    """Загружает строки в таблицу через COPY (psycopg2 и psycopg 3)"""
+    buffer = io.StringIO()
+    # QUOTE_ALL: пустая строка остается пустой строкой, а не NULL
+    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+    sql = f"COPY {table} ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+    raw_cursor = cursor.cursor
+    if hasattr(raw_cursor, 'copy_expert'):
+        buffer.seek(0)
+        raw_cursor.copy_expert(sql, buffer)
+    else:
+        with raw_cursor.copy(sql) as copy:
+            copy.write(buffer.getvalue())
+
+
+def insert_batch_postgres(cursor, rows):
+    """COPY в промежуточную таблицу, пополнение справочников и вставка без дубликатов"""
+    table = StatStudent._meta.db_table
+    copy_rows(cursor, 'studstat_staging', rows)
+
+    # Новые имена студентов, предметов, преподавателей и кафедр
+    for column, (_, model) in DIMENSIONS.items():
+        cursor.execute(f'''
+            INSERT INTO {model._meta.db_table} (name)
+            SELECT DISTINCT {column} FROM studstat_staging WHERE {column} <> ''
+            ON CONFLICT DO NOTHING
+        ''')
+        if cursor.rowcount:
+            bump_data_version(dimension_version_source(model))
+
+    # Оценки со ссылками на справочники; пустые преподаватель и кафедра дают NULL.
+    # RETURNING отдает только вставленные строки - их и добавляем в сводку
+    cursor.execute(f'''
+        WITH inserted AS (
+            INSERT INTO {table} (student_id, subject_id, grade, date, teacher_id, cafedra_id)
+            SELECT st.id, sb.id, s.grade, s.date, t.id, c.id
+            FROM studstat_staging s
+            JOIN {DIMENSIONS['name'][1]._meta.db_table} st ON st.name = s.name
+            JOIN {DIMENSIONS['subject'][1]._meta.db_table} sb ON sb.name = s.subject
+            LEFT JOIN {DIMENSIONS['teacher'][1]._meta.db_table} t ON t.name = s.teacher
+            LEFT JOIN {DIMENSIONS['cafedra'][1]._meta.db_table} c ON c.name = s.cafedra
+            ON CONFLICT DO NOTHING
+            RETURNING student_id, subject_id, grade, cafedra_id
+        )
+        SELECT st.name, sb.name, i.grade, c.name
+        FROM inserted i
+        JOIN {DIMENSIONS['name'][1]._meta.db_table} st ON st.id = i.student_id
+        JOIN {DIMENSIONS['subject'][1]._meta.db_table} sb ON sb.id = i.subject_id
+        LEFT JOIN {DIMENSIONS['cafedra'][1]._meta.db_table} c ON c.id = i.cafedra_id
+    ''')
+    created = [dict(zip(('name', 'subject', 'grade', 'cafedra'), row)) for row in cursor.fetchall()]
+    cursor.execute('TRUNCATE studstat_staging')
+    apply_summary_counts(created)
+    bump_data_version('db')
+    return len(created)
+
+
+def insert_batch_generic(cursor, rows):
+    """Вставка пачки для других СУБД (например, SQLite при разработке)"""
+    return bulk_insert_statstudent([dict(zip(COLUMNS, row)) for row in rows])
+
+
+def clean_rows(rows):
+    """Проверка и нормализация строк SQLite, как при импорте XML: (корректные строки, id отклоненных)"""
+    batch, rejected = [], []
+    for row_id, *row in rows:
+        values = dict(zip(COLUMNS, row))
+        if values['grade'] is not None:
+            values['grade'] = str(values['grade'])
+        values = clean_grade_data(values)
+        if values is None:
+            rejected.append(row_id)
+        else:
+            batch.append(tuple(values[column] for column in COLUMNS))
+    return batch, rejected
+
+
+def migrate_sqlite_to_postgres_batched(batch_size=5000, reset=False, sqlite_path=None, checkpoint_path=None):
+    """Пакетный перенос данных из SQLite с продолжением после прерывания"""
+
+    sqlite_path = Path(sqlite_path or BASE_DIR / 'db.sqlite3')
+    checkpoint_path = Path(checkpoint_path or CHECKPOINT_PATH)
+
+    if not sqlite_path.exists():
+        print("❌ Файл db.sqlite3 не найден!")
+        print("Положите файл SQLite рядом с manage.py")
+        return False
+
+    if reset and checkpoint_path.exists():
+        checkpoint_path.unlink()
+    checkpoint = load_checkpoint(sqlite_path, checkpoint_path)
+
+    sqlite_conn = sqlite3.connect(str(sqlite_path))
+    sqlite_cursor = sqlite_conn.cursor()
+    sqlite_cursor.execute('SELECT COUNT(*) FROM studstat WHERE id > ?', [checkpoint['last_id']])
+    remaining = sqlite_cursor.fetchone()[0]
+
+    if remaining == 0:
+        print("✅ Нет новых данных для миграции")
+        sqlite_conn.close()
+        return True
+
+    if checkpoint['last_id']:
+        print(f"↩️  Продолжаем с записи id > {checkpoint['last_id']}")
+    print(f"📊 Осталось перенести записей: {remaining}")
+
+    sqlite_cursor.execute(f'''
+        SELECT id, {', '.join(COLUMNS)}
+        FROM studstat
+        WHERE id > ?
+        ORDER BY id
+    ''', [checkpoint['last_id']])
+
+    is_postgres = connection.vendor == 'postgresql'
+    insert_batch = insert_batch_postgres if is_postgres else insert_batch_generic
+    started = time.monotonic()
+    processed = 0
+    invalid = 0
+
+    with connection.cursor() as cursor:
+        if is_postgres:
+            # Промежуточная таблица хранит оценки в текстовом виде, как в SQLite
+            cursor.execute('''
+                CREATE TEMP TABLE IF NOT EXISTS studstat_staging (
+                    name varchar(100), subject varchar(20), grade varchar(20),
+                    date date, teacher varchar(100), cafedra varchar(100)
+                )
+            ''')
+
+        while True:
+            rows = sqlite_cursor.fetchmany(batch_size)
+            if not rows:
+                break
+
+            # Пустые после strip имя или предмет, неверная дата и слишком длинные значения -
+            # ошибки, а не дубликаты: такие строки не попадают в COPY
+            batch, rejected = clean_rows(rows)
+            for row_id in rejected:
+                print(f"   ❌ Запись id={row_id}: некорректные данные, пропускаем")
+            inserted = 0
+            if batch:
+                with transaction.atomic():
+                    inserted = insert_batch(cursor, batch)
+
+            processed += len(rows)
+            invalid += len(rejected)
+            checkpoint['last_id'] = rows[-1][0]
+            checkpoint['processed'] = checkpoint.get('processed', 0) + len(rows)
+            checkpoint['migrated'] = checkpoint.get('migrated', 0) + inserted
+            checkpoint['invalid'] = checkpoint.get('invalid', 0) + len(rejected)
+            save_checkpoint(sqlite_path, checkpoint, checkpoint_path)
+
+            elapsed = time.monotonic() - started
+            print(f"   ✅ Обработано {processed}/{remaining} записей "
+                  f"({processed / elapsed if elapsed else 0:.0f} строк/с)")
+
+    sqlite_conn.close()
+
+    elapsed = time.monotonic() - started
+    print("\n" + "="*50)
+    print("📊 ИТОГИ МИГРАЦИИ:")
+    print(f"   Обработано записей: {processed}")
+    print(f"   Всего перенесено (с учетом прошлых запусков): {checkpoint['migrated']}")
+    print(f"   Пропущено дубликатов: {checkpoint['processed'] - checkpoint['migrated'] - checkpoint['invalid']}")
+    print(f"   Ошибок (некорректные записи): {checkpoint['invalid']}")
+    print(f"   Скорость: {processed / elapsed if elapsed else 0:.0f} строк/с")
+    print(f"   Всего записей в PostgreSQL: {StatStudent.objects.count()}")
+
+    return invalid == 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Перенос оценок из db.sqlite3 в основную базу данных')
+    parser.add_argument('--batched', action='store_true',
+                        help='Пакетный режим: COPY + INSERT ... ON CONFLICT, с продолжением после прерывания')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки в пакетном режиме')
+    parser.add_argument('--reset', action='store_true', help='Начать пакетный перенос заново, игнорируя checkpoint')
+    parser.add_argument('--sqlite-path', default=None, help='Файл SQLite (по умолчанию db.sqlite3 рядом с manage.py)')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    success = migrate_sqlite_to_postgres()
+    args = parse_args()
+    if args.batched:
+        success = migrate_sqlite_to_postgres_batched(batch_size=args.batch_size, reset=args.reset,
+                                                     sqlite_path=args.sqlite_path)
+    else:
+        success = migrate_sqlite_to_postgres(sqlite_path=args.sqlite_path)
     sys.exit(0 if success else 1)
\ No newline at end of file
@@ -0,0 +1,436 @@
+import datetime
+import threading
+from itertools import islice
+import numpy as np
+from django.conf import settings
+from .dimensions import DIMENSIONS
+from .models import StatStudent
+from .versions import get_data_version
+from .xml_store import iter_legacy_grades, iter_partition_grades, parse_grade_date, select_partitions
+
+# Отчеты по оценкам на NumPy: распределение оценок, средний балл, перцентили,
+# доля сдавших по группам и динамика по неделям или месяцам.
+# Из БД через values_list читаются только нужные столбцы (идентификаторы справочников,
+# оценка, дата), из XML хранилища - записи секций. Строки переводятся в массивы порциями
+# по GRADES_ANALYTICS_CHUNK_SIZE, поэтому в памяти не бывает объектов моделей или словарей
+# на все оценки сразу. Группировки считаются через np.bincount по целочисленным кодам,
+# имена справочников запрашиваются только для групп, попавших в ответ.
+# Загруженные столбцы (около 26 байт на оценку) хранятся в памяти процесса, пока не
+# изменится версия источника, поэтому повторные отчеты не читают БД и файлы.
+
+# Группировка отчета -> ключ справочника в DIMENSIONS
+GROUPINGS = {'student': 'name', 'subject': 'subject', 'teacher': 'teacher', 'cafedra': 'cafedra'}
+
+ANALYTICS_SOURCES = ('db', 'xml')
+TREND_PERIODS = ('week', 'month')
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+MAX_ANALYTICS_LIMIT = 1000
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+# Буквенные оценки (ECTS) в пятибалльной шкале
+LETTER_SCORES = {'A': 5, 'B': 4, 'C': 4, 'D': 3, 'E': 3, 'FX': 2, 'F': 2}
+PASS_WORDS = {'зачет': 1, 'незачет': 0}
+
+
+class AnalyticsError(ValueError):
+    pass
+
+
+def get_analytics_chunk_size():
+    return getattr(settings, 'GRADES_ANALYTICS_CHUNK_SIZE', 20000)
+
+# Балл и результат по тексту оценки: (балл или nan, 1 - сдано, 0 - не сдано, -1 - неизвестно).
+# '4-5' дает средний балл 4.5, зачет/незачет - результат без балла
+def grade_value(label):
+    key = label.strip().lower().replace('ё', 'е')
+    if key in PASS_WORDS:
+        return np.nan, PASS_WORDS[key]
+    if key.upper() in LETTER_SCORES:
+        score = LETTER_SCORES[key.upper()]
+    else:
+        try:
+            parts = [float(part) for part in key.split('-')]
+        except ValueError:
+            return np.nan, -1
+        score = sum(parts) / len(parts)
+    return float(score), int(score >= 3)
+
+
+# Столбцы оценок в виде массивов: коды группировок, коды текстов оценок и даты.
+# Для БД код группировки - идентификатор записи справочника, для XML - номер имени
+# в vocabularies; код 0 означает пустое значение (оценка без преподавателя или кафедры)
+class GradeFrame:
+    def __init__(self, columns, grade_labels, vocabularies=None):
+        self.columns = columns
+        self.grade_labels = grade_labels
+        self.vocabularies = vocabularies
+        values = [grade_value(label) for label in grade_labels]
+        self.label_scores = np.array([score for score, _ in values], dtype=np.float64)
+        self.label_passed = np.array([passed for _, passed in values], dtype=np.int8)
+
+    def __len__(self):
+        return len(self.columns['grade'])
+
+    # Балл и результат каждой оценки
+    def scores(self, mask):
+        return self.label_scores[self.columns['grade'][mask]]
+
+    def passed(self, mask):
+        return self.label_passed[self.columns['grade'][mask]]
+
+    # Имена для кодов группировки (запрос к справочнику только по этим кодам)
+    def labels(self, grouping, codes):
+        codes = [int(code) for code in codes]
+        if self.vocabularies is not None:
+            vocabulary = self.vocabularies[grouping]
+            return [vocabulary[code] for code in codes]
+        model = DIMENSIONS[GROUPINGS[grouping]][1]
+        names = dict(model.objects.filter(id__in=[code for code in codes if code]).values_list('id', 'name'))
+        return [names.get(code, '') for code in codes]
+
+    # Код группировки по имени (None, если такого имени нет)
+    def code(self, grouping, name):
+        if not name:
+            return 0
+        if self.vocabularies is not None:
+            try:
+                return self.vocabularies[grouping].index(name)
+            except ValueError:
+                return None
+        model = DIMENSIONS[GROUPINGS[grouping]][1]
+        return model.objects.filter(name=name).values_list('id', flat=True).first()
+
+
+# Собирает GradeFrame из порций строк (значения группировок..., оценка, дата)
+class FrameBuilder:
+    def __init__(self, encode_names=False):
+        self.groupings = tuple(GROUPINGS)
+        self.parts = {grouping: [np.empty(0, dtype=np.int32)] for grouping in self.groupings}
+        self.parts['grade'] = [np.empty(0, dtype=np.int16)]
+        self.parts['date'] = [np.empty(0, dtype='datetime64[D]')]
+        self.grade_codes = {}
+        # Для XML имена переводятся в коды здесь же; '' всегда имеет код 0
+        self.name_codes = {grouping: {'': 0} for grouping in self.groupings} if encode_names else None
+
+    @staticmethod
+    def encode(values, codes, dtype):
+        return np.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=dtype, count=len(values))
+
+    def add(self, rows):
+        columns = list(zip(*rows))
+        for grouping, values in zip(self.groupings, columns):
+            if self.name_codes is None:
+                array = np.fromiter((value or 0 for value in values), dtype=np.int32, count=len(values))
+            else:
+                array = self.encode(values, self.name_codes[grouping], np.int32)
+            self.parts[grouping].append(array)
+        self.parts['grade'].append(self.encode(columns[-2], self.grade_codes, np.int16))
+        self.parts['date'].append(dates_to_array(columns[-1]))
+
+    def build(self):
+        columns = {column: np.concatenate(parts) for column, parts in self.parts.items()}
+        vocabularies = None
+        if self.name_codes is not None:
+            vocabularies = {grouping: list(codes) for grouping, codes in self.name_codes.items()}
+        return GradeFrame(columns, list(self.grade_codes), vocabularies)
+
+
+# Даты (date или None) в datetime64[D]; через toordinal это в десятки раз быстрее,
+# чем np.array по объектам date
+def dates_to_array(values):
+    ordinals = np.fromiter((value.toordinal() if value else 0 for value in values), dtype=np.int64, count=len(values))
+    dates = (ordinals - EPOCH_ORDINAL).astype('datetime64[D]')
+    dates[ordinals == 0] = np.datetime64('NaT')
+    return dates
+
+def iter_chunks(rows, chunk_size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+# Столбцы из studstat: только идентификаторы справочников, оценка и дата, без JOIN
+def load_db_frame(chunk_size=None):
+    chunk_size = chunk_size or get_analytics_chunk_size()
+    fields = [f'{DIMENSIONS[key][0]}_id' for key in GROUPINGS.values()]
+    builder = FrameBuilder()
+    rows = StatStudent.objects.order_by().values_list(*fields, 'grade', 'date').iterator(chunk_size=chunk_size)
+    for chunk in iter_chunks(rows, chunk_size):
+        builder.add(chunk)
+    return builder.build()
+
+# Оценки всех секций XML хранилища и старого grades.xml
+def load_xml_frame(chunk_size=None):
+    builder = FrameBuilder(encode_names=True)
+
+    def rows():
+        for partition in select_partitions():
+            yield from iter_partition_grades(partition)
+        yield from iter_legacy_grades()
+
+    records = (
+        (*(grade.get(key) or '' for key in GROUPINGS.values()), grade.get('grade') or '', parse_grade_date(grade.get('date')))
+        for grade in rows()
+    )
+    for chunk in iter_chunks(records, chunk_size or get_analytics_chunk_size()):
+        builder.add(chunk)
+    return builder.build()
+
+FRAME_LOADERS = {'db': load_db_frame, 'xml': load_xml_frame}
+
+
+class FrameCache:
+    def __init__(self):
+        self.frames = {}  # источник -> (версия, GradeFrame)
+        self.lock = threading.Lock()
+
+    def get(self, source):
+        version = get_data_version(source)
+        entry = self.frames.get(source)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self.lock:
+            entry = self.frames.get(source)
+            if entry is None or entry[0] != version:
+                # Старые столбцы освобождаются до загрузки новых
+                self.frames.pop(source, None)
+                entry = (version, FRAME_LOADERS[source]())
+                self.frames[source] = entry
+        return entry[1]
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+
+
+frame_cache = FrameCache()
+
+
+# Строки под фильтры: имена справочников (student, subject, teacher, cafedra) и период
+def filter_mask(frame, filters, date_from=None, date_to=None):
+    mask = np.ones(len(frame), dtype=bool)
+    for grouping, name in filters.items():
+        code = frame.code(grouping, name)
+        if code is None:
+            return np.zeros(len(frame), dtype=bool)
+        mask &= frame.columns[grouping] == code
+    dates = frame.columns['date']
+    if date_from:
+        mask &= dates >= np.datetime64(date_from, 'D')
+    if date_to:
+        mask &= dates <= np.datetime64(date_to, 'D')
+    return mask
+
+# Счетчики по группам: оценок всего, с баллом, сумма баллов, с известным результатом, сдано
+def aggregate(codes, scores, passed, size):
+    scored = ~np.isnan(scores)
+    return {
+        'total': np.bincount(codes, minlength=size),
+        'scored': np.bincount(codes[scored], minlength=size),
+        'score_sum': np.bincount(codes[scored], weights=scores[scored], minlength=size),
+        'graded': np.bincount(codes[passed >= 0], minlength=size),
+        'passed': np.bincount(codes[passed == 1], minlength=size),
+    }
+
+def ratio(numerator, denominator):
+    return round(float(numerator) / float(denominator), 4) if denominator else None
+
+def group_codes(frame, grouping, mask):
+    codes = frame.columns[grouping][mask]
+    return codes, int(codes.max()) + 1 if len(codes) else 0
+
+
+# Распределение оценок: по всем выбранным оценкам или по группам (как get_grade_stats)
+def distribution_report(frame, mask, by=None, limit=100):
+    grades = frame.columns['grade'][mask]
+    labels = len(frame.grade_labels)
+    present = np.flatnonzero(np.bincount(grades, minlength=labels))
+    result = {'grades': sorted(frame.grade_labels[code] for code in present), 'total': int(len(grades))}
+    if not by:
+        counts = np.bincount(grades, minlength=labels)
+        result['distribution'] = {frame.grade_labels[code]: int(counts[code]) for code in present}
+        return result
+
+    codes, size = group_codes(frame, by, mask)
+    counts = np.bincount(codes.astype(np.int64) * labels + grades, minlength=size * labels).reshape(size, labels)
+    totals = counts.sum(axis=1)
+    order = np.flatnonzero(totals)
+    order = order[np.lexsort((order, -totals[order]))][:limit]
+    result['groups'] = [
+        {
+            'value': value,
+            'total': int(totals[code]),
+            'grades': {frame.grade_labels[grade]: int(counts[code, grade]) for grade in np.flatnonzero(counts[code])},
+        }
+        for code, value in zip(order, frame.labels(by, order))
+    ]
+    return result
+
+# Средний балл по группам (по умолчанию по студентам), лучшие первыми
+def gpa_report(frame, mask, by='student', limit=100, min_count=1):
+    codes, size = group_codes(frame, by, mask)
+    stats = aggregate(codes, frame.scores(mask), frame.passed(mask), size)
+    selected = np.flatnonzero(stats['scored'] >= min_count)
+    gpa = stats['score_sum'][selected] / stats['scored'][selected]
+    order = selected[np.lexsort((-stats['scored'][selected], -gpa))][:limit]
+    return {
+        'groups_count': int(len(selected)),
+        'groups': [
+            {
+                'value': value,
+                'count': int(stats['scored'][code]),
+                'gpa': round(float(stats['score_sum'][code] / stats['scored'][code]), 3),
+            }
+            for code, value in zip(order, frame.labels(by, order))
+        ],
+    }
+
+# Перцентили среднего балла групп и баллов отдельных оценок
+def percentiles_report(frame, mask, by='student', percentiles=DEFAULT_PERCENTILES, min_count=1):
+    scores = frame.scores(mask)
+    codes, size = group_codes(frame, by, mask)
+    stats = aggregate(codes, scores, frame.passed(mask), size)
+    selected = stats['scored'] >= min_count
+    gpa = stats['score_sum'][selected] / stats['scored'][selected]
+    scores = scores[~np.isnan(scores)]
+
+    def values(array):
+        if not len(array):
+            return {str(p): None for p in percentiles}
+        return {str(p): round(float(value), 3) for p, value in zip(percentiles, np.percentile(array, percentiles))}
+
+    return {
+        'groups_count': int(len(gpa)),
+        'gpa_percentiles': values(gpa),
+        'score_percentiles': values(scores),
+    }
+
+# Доля сдавших по группам (по умолчанию по предметам), самые большие группы первыми
+def pass_rates_report(frame, mask, by='subject', limit=100):
+    codes, size = group_codes(frame, by, mask)
+    stats = aggregate(codes, frame.scores(mask), frame.passed(mask), size)
+    selected = np.flatnonzero(stats['total'])
+    order = selected[np.lexsort((selected, -stats['total'][selected]))][:limit]
+    return {
+        'groups_count': int(len(selected)),
+        'groups': [
+            {
+                'value': value,
+                'total': int(stats['total'][code]),
+                'graded': int(stats['graded'][code]),
+                'passed': int(stats['passed'][code]),
+                'pass_rate': ratio(stats['passed'][code], stats['graded'][code]),
+            }
+            for code, value in zip(order, frame.labels(by, order))
+        ],
+    }
+
+# Динамика по неделям (с понедельника) или месяцам: число оценок, средний балл, доля сдавших
+def trends_report(frame, mask, period='week'):
+    dates = frame.columns['date'][mask]
+    dated = ~np.isnat(dates)
+    dates = dates[dated]
+    if period == 'month':
+        bins = dates.astype('datetime64[M]').astype(np.int64)
+    else:
+        days = dates.astype(np.int64)
+        # 1970-01-01 - четверг, поэтому понедельник недели - days - (days + 3) % 7
+        bins = days - (days + 3) % 7
+    if not len(bins):
+        return {'period': period, 'points': []}
+
+    start = int(bins.min())
+    stats = aggregate(bins - start, frame.scores(mask)[dated], frame.passed(mask)[dated], int(bins.max()) - start + 1)
+    unit = 'M' if period == 'month' else 'D'
+    return {
+        'period': period,
+        'points': [
+            {
+                'period': str(np.datetime64(start + int(offset), unit)),
+                'total': int(stats['total'][offset]),
+                'gpa': ratio(stats['score_sum'][offset], stats['scored'][offset]),
+                'pass_rate': ratio(stats['passed'][offset], stats['graded'][offset]),
+            }
+            for offset in np.flatnonzero(stats['total'])
+        ],
+    }
+
+ANALYTICS_REPORTS = {
+    'distribution': distribution_report,
+    'gpa': gpa_report,
+    'percentiles': percentiles_report,
+    'pass_rates': pass_rates_report,
+    'trends': trends_report,
+}
+
+# Группировка по умолчанию для отчета (None - без группировки)
+DEFAULT_GROUPINGS = {'distribution': None, 'gpa': 'student', 'percentiles': 'student', 'pass_rates': 'subject'}
+
+
+def parse_int(params, name, default, minimum, maximum):
+    value = params.get(name)
+    if not value:
+        return default
+    try:
+        return max(minimum, min(int(value), maximum))
+    except ValueError:
+        raise AnalyticsError(f'Некорректное значение {name}: {value}')
+
+def parse_date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise AnalyticsError(f'Некорректная дата {name}: {value}')
+
+def parse_percentiles(value):
+    if not value:
+        return DEFAULT_PERCENTILES
+    try:
+        percentiles = tuple(float(part) for part in value.split(',') if part.strip())
+    except ValueError:
+        raise AnalyticsError(f'Некорректный список перцентилей: {value}')
+    if not percentiles or any(not 0 <= p <= 100 for p in percentiles):
+        raise AnalyticsError('Перцентили должны быть в диапазоне 0-100')
+    return tuple(int(p) if p.is_integer() else p for p in percentiles)
+
+# Отчет report по источнику source ('db' или 'xml'); params - параметры запроса:
+# by, student/subject/teacher/cafedra, date_from, date_to, limit, min_count, p, period
+def run_report(report, source, params):
+    if report not in ANALYTICS_REPORTS:
+        raise AnalyticsError(f'Неизвестный отчет: {report}')
+    if source not in ANALYTICS_SOURCES:
+        raise AnalyticsError(f'Неизвестный источник: {source}')
+
+    options = {}
+    if report in DEFAULT_GROUPINGS:
+        by = params.get('by') or DEFAULT_GROUPINGS[report]
+        if by is not None and by not in GROUPINGS:
+            raise AnalyticsError(f'Неизвестная группировка: {by}')
+        options['by'] = by
+    if report in ('distribution', 'gpa', 'pass_rates'):
+        default_limit = getattr(settings, 'GRADES_ANALYTICS_LIMIT', 100)
+        options['limit'] = parse_int(params, 'limit', default_limit, 1, MAX_ANALYTICS_LIMIT)
+    if report in ('gpa', 'percentiles'):
+        options['min_count'] = parse_int(params, 'min_count', 1, 1, 10 ** 6)
+    if report == 'percentiles':
+        options['percentiles'] = parse_percentiles(params.get('p'))
+    if report == 'trends':
+        options['period'] = params.get('period') or 'week'
+        if options['period'] not in TREND_PERIODS:
+            raise AnalyticsError(f"Неизвестный период: {options['period']}")
+
+    filters = {grouping: params[grouping] for grouping in GROUPINGS if params.get(grouping)}
+    date_from, date_to = parse_date(params, 'date_from'), parse_date(params, 'date_to')
+
+    frame = frame_cache.get(source)
+    mask = filter_mask(frame, filters, date_from, date_to)
+    result = {
+        'report': report,
+        'source': source,
+        'filters': {**filters, 'date_from': date_from and date_from.isoformat(), 'date_to': date_to and date_to.isoformat()},
+        'rows': int(mask.sum()),
+    }
+    result.update(ANALYTICS_REPORTS[report](frame, mask, **options))
+    return result
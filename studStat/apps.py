@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class StudstatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'studStat'
+
+    def ready(self):
+        from .search import install_search_index
+        post_migrate.connect(install_search_index, sender=self)
@@ -0,0 +1,73 @@
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError
+from .models import Student, Subject, Teacher, Cafedra
+from .versions import bump_data_version
+
+# Справочники оценки: ключ в словаре оценки -> (поле StatStudent, модель справочника)
+DIMENSIONS = {
+    'name': ('student', Student),
+    'subject': ('subject', Subject),
+    'teacher': ('teacher', Teacher),
+    'cafedra': ('cafedra', Cafedra),
+}
+
+
+# Версия справочника: меняется при добавлении имен, по ней обновляются подсказки поиска
+def dimension_version_source(model):
+    return f'names_{model._meta.model_name}'
+
+# Запись справочника по имени, создается при необходимости (None для пустого имени)
+def get_dimension(model, name):
+    name = (name or '').strip()
+    if not name:
+        return None
+    obj, created = model.objects.get_or_create(name=name)
+    if created:
+        bump_data_version(dimension_version_source(model))
+    return obj
+
+# Идентификаторы записей справочника для набора имен; недостающие создаются одним запросом
+def resolve_dimension_ids(model, names):
+    names = {name for name in names if name}
+    if not names:
+        return {}
+    ids = dict(model.objects.filter(name__in=names).values_list('name', 'id'))
+    missing = names - set(ids)
+    if missing:
+        model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+        bump_data_version(dimension_version_source(model))
+        ids.update(model.objects.filter(name__in=missing).values_list('name', 'id'))
+    return ids
+
+# Фильтр StatStudent по уникальному ключу оценки (студент, предмет, оценка, дата);
+# такой запрос полностью обслуживается уникальным индексом studstat
+def grade_lookup(grade_data):
+    return {
+        'student__name': grade_data['name'],
+        'subject__name': grade_data['subject'],
+        'grade': grade_data['grade'],
+        'date': grade_data['date'],
+    }
+
+# Объекты справочников для сохранения одной оценки
+def get_dimensions(grade_data):
+    return {field: get_dimension(model, grade_data.get(key)) for key, (field, model) in DIMENSIONS.items()}
+
+# Идентификаторы справочников оценки (запоминаются до изменения или удаления)
+def dimension_ids(statstudent):
+    return {field: getattr(statstudent, f'{field}_id') for field, _ in DIMENSIONS.values()}
+
+# Удаляет записи справочников, на которые больше не ссылается ни одна оценка,
+# чтобы подсказки поиска не предлагали имена без оценок. Если параллельный запрос
+# успел сослаться на запись, удаление откатывается в точке сохранения
+def prune_dimensions(ids):
+    for field, model in DIMENSIONS.values():
+        if not ids.get(field):
+            continue
+        try:
+            with transaction.atomic():
+                deleted, _ = model.objects.filter(id=ids[field], grades__isnull=True).delete()
+        except (IntegrityError, ProtectedError):
+            continue
+        if deleted:
+            bump_data_version(dimension_version_source(model))
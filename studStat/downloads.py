@@ -0,0 +1,153 @@
+import os
+import re
+import time
+from urllib.parse import quote
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+from .export import aiter_blocks
+
+# Отдача файлов из grades_xml.
+# При GRADES_DOWNLOAD_OFFLOAD передачу выполняет фронтальный веб сервер (nginx X-Accel-Redirect
+# или X-Sendfile для Apache/lighttpd), процесс Django только формирует заголовки.
+# Иначе файл отдается из процесса с поддержкой ETag/If-None-Match, Last-Modified и Range,
+# поэтому повторная или продолженная загрузка не передает файл целиком.
+
+DOWNLOAD_BLOCK_SIZE = 256 * 1024
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_offload_mode():
+    return (getattr(settings, 'GRADES_DOWNLOAD_OFFLOAD', '') or '').lower()
+
+# ETag по inode, времени изменения и размеру файла (без чтения содержимого).
+# Для сжатого файла, отданного с распаковкой, это другое представление - другой ETag
+def file_etag(stat, representation=''):
+    suffix = f'-{representation}' if representation else ''
+    return f'"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}{suffix}"'
+
+# Диапазон из заголовка Range: (начало, конец включительно), None - весь файл,
+# False - диапазон вне файла. Несколько диапазонов не поддерживаются, отдается весь файл.
+# В пустом файле нет ни одного байта, любой диапазон в нем вне файла
+def parse_range(header, size):
+    match = RANGE_PATTERN.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    if size == 0:
+        return False
+    start, end = match.groups()
+    if not start:
+        # bytes=-N: последние N байт
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+# Диапазон учитывается, только если If-Range (ETag или дата) совпадает с текущим файлом.
+# По RFC 9110 дата должна совпасть с Last-Modified точно и быть сильным валидатором:
+# файл изменен хотя бы на секунду раньше ответа, иначе в ту же секунду могла выйти
+# другая версия файла с той же датой
+def if_range_matches(request, etag, last_modified):
+    value = request.headers.get('If-Range')
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    date = parse_http_date_safe(value)
+    return date is not None and date == int(last_modified) and time.time() - last_modified >= 1
+
+# Блоки части файла [start, end]
+def iter_file_range(file_path, start, end):
+    remaining = end - start + 1
+    with open(file_path, 'rb') as file:
+        file.seek(start)
+        while remaining > 0:
+            block = file.read(min(DOWNLOAD_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
+# Потоковый ответ; в ASGI блоки читаются в пуле потоков, а не собираются в память
+def streaming_response(request, blocks):
+    if isinstance(request, ASGIRequest):
+        blocks = aiter_blocks(blocks, thread_sensitive=False)
+    return StreamingHttpResponse(blocks)
+
+# Ответ, передающий файл фронтальному серверу
+def offloaded_response(file_path, mode):
+    response = HttpResponse()
+    if mode == 'x-accel-redirect':
+        relative = os.path.relpath(file_path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        prefix = getattr(settings, 'GRADES_DOWNLOAD_ACCEL_PREFIX', '/protected/')
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + relative)
+    else:
+        response['X-Sendfile'] = os.path.abspath(file_path)
+    return response
+
+# Отдает файл с диска как есть (content_encoding - заголовок для сжатого файла).
+# Сжатые файлы отдаются из процесса: nginx после X-Accel-Redirect не сохраняет Content-Encoding
+def serve_file(request, file_path, content_type, filename, content_encoding=None):
+    mode = get_offload_mode()
+    if mode in ('x-accel-redirect', 'x-sendfile') and not content_encoding:
+        response = offloaded_response(file_path, mode)
+    else:
+        stat = os.stat(file_path)
+        etag, last_modified = file_etag(stat), stat.st_mtime
+        response = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+        if response is None:
+            response = ranged_file_response(request, file_path, stat.st_size, etag, last_modified)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Type'] = content_type
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    return response
+
+def ranged_file_response(request, file_path, size, etag, last_modified):
+    byte_range = None
+    if request.method == 'GET' and 'Range' in request.headers and if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers['Range'], size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        if isinstance(request, ASGIRequest):
+            response = streaming_response(request, iter_file_range(file_path, 0, size - 1))
+            response['Content-Length'] = size
+            return response
+        return FileResponse(open(file_path, 'rb'))
+
+    start, end = byte_range
+    response = streaming_response(request, iter_file_range(file_path, start, end))
+    response.status_code = 206
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    return response
+
+# Отдает распакованное содержимое сжатого файла (длина заранее неизвестна, без Range)
+def serve_decoded_file(request, file_path, content_type, filename, blocks):
+    stat = os.stat(file_path)
+    etag = file_etag(stat, 'identity')
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = streaming_response(request, blocks)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Content-Type'] = content_type
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,105 @@
+import csv
+import zlib
+import xml.etree.ElementTree as ET
+from django.conf import settings
+import datetime
+from asgiref.sync import sync_to_async
+from .models import StatStudent
+from .search import search_statstudent
+from .utils import build_grade_element
+
+# Потоковый экспорт оценок из БД в XML (схема StudentsGrades/Grade) и CSV
+
+EXPORT_FIELDS = ('name', 'subject', 'grade', 'date', 'teacher', 'cafedra')
+EXPORT_LOOKUPS = ('student__name', 'subject__name', 'grade', 'date', 'teacher__name', 'cafedra__name')
+EXPORT_CSV_HEADER = ('ФИО студента', 'Предмет', 'Оценка', 'Дата', 'Преподаватель', 'Кафедра')
+
+# Количество строк, которые объединяются в один блок ответа
+EXPORT_ROWS_PER_BLOCK = 500
+
+
+# Выборка для экспорта: строка поиска q и диапазон дат date_from/date_to
+def filter_grades_for_export(query='', date_from=None, date_to=None):
+    queryset = StatStudent.objects.all()
+    if query:
+        queryset = search_statstudent(query, queryset)
+    for lookup, value in (('date__gte', date_from), ('date__lte', date_to)):
+        if value:
+            try:
+                queryset = queryset.filter(**{lookup: datetime.date.fromisoformat(value)})
+            except ValueError:
+                pass
+    return queryset.order_by('-date', '-id')
+
+def get_export_chunk_size():
+    return getattr(settings, 'GRADES_EXPORT_CHUNK_SIZE', 2000)
+
+# Строки таблицы как словари, без создания объектов модели.
+# iterator() в PostgreSQL читает выборку серверным курсором порциями по chunk_size
+def iter_export_rows(queryset, chunk_size=None):
+    rows = queryset.values_list(*EXPORT_LOOKUPS).iterator(chunk_size=chunk_size or get_export_chunk_size())
+    for row in rows:
+        yield dict(zip(EXPORT_FIELDS, row))
+
+# Группирует строки в блоки байт
+def join_blocks(parts):
+    block = []
+    for part in parts:
+        block.append(part)
+        if len(block) >= EXPORT_ROWS_PER_BLOCK:
+            yield ''.join(block).encode('utf-8')
+            block = []
+    if block:
+        yield ''.join(block).encode('utf-8')
+
+def iter_xml_export(queryset, chunk_size=None):
+    yield b"<?xml version='1.0' encoding='utf-8'?>\n<StudentsGrades>\n"
+    yield from join_blocks(
+        ET.tostring(build_grade_element(row), encoding='unicode') + '\n'
+        for row in iter_export_rows(queryset, chunk_size)
+    )
+    yield b'</StudentsGrades>\n'
+
+# Объект с методом write для csv.writer: возвращает строку вместо записи в файл
+class Echo:
+    def write(self, value):
+        return value
+
+def iter_csv_export(queryset, chunk_size=None):
+    writer = csv.writer(Echo())
+    # BOM, чтобы Excel распознал UTF-8
+    yield '\ufeff'.encode('utf-8') + writer.writerow(EXPORT_CSV_HEADER).encode('utf-8')
+    yield from join_blocks(
+        writer.writerow([row[field] if row[field] is not None else '' for field in EXPORT_FIELDS])
+        for row in iter_export_rows(queryset, chunk_size)
+    )
+
+EXPORT_FORMATS = {
+    'xml': (iter_xml_export, 'application/xml', 'xml'),
+    'csv': (iter_csv_export, 'text/csv; charset=utf-8', 'csv'),
+}
+
+# Сжимает поток байт в формат gzip на лету; каждый блок сбрасывается сразу,
+# чтобы клиент получал данные по мере выгрузки
+def gzip_stream(blocks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for block in blocks:
+        yield compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+# Асинхронная обертка для ASGI: синхронный поток Django собрал бы в память целиком.
+# Блоки берутся в потоке запроса, где открыт серверный курсор; для чтения файлов
+# (thread_sensitive=False) подходит любой поток пула
+async def aiter_blocks(blocks, thread_sensitive=True):
+    iterator = iter(blocks)
+    next_block = sync_to_async(next, thread_sensitive=thread_sensitive)
+    try:
+        while True:
+            block = await next_block(iterator, None)
+            if block is None:
+                break
+            yield block
+    finally:
+        # Прерванная выгрузка (клиент отключился) закрывает курсор или файл сразу
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close, thread_sensitive=thread_sensitive)()
@@ -1,6 +1,8 @@
 from django import forms
+from django.conf import settings
 import re
 from .models import StatStudent
+from .dimensions import DIMENSIONS, get_dimensions
 
 #Форма добавления оценки
 class StudentForm(forms.Form):
@@ -60,20 +62,62 @@ class StudentForm(forms.Form):
             raise forms.ValidationError('Некорректный формат оценки')
         return grade
 
+#Проверка одной оценки, пришедшей через API (те же правила, что в StudentForm)
+class GradeRecordForm(StudentForm):
+    save_to = None
+    subject = forms.CharField(max_length=20)
+
 #Форма для редактирования контакта
 class StudentEditForm(forms.ModelForm):
+    # Студент, предмет, преподаватель и кафедра хранятся в справочниках, в форме - по имени
+    name = forms.CharField(
+        label='ФИО студента',
+        max_length=100,
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    subject = forms.CharField(
+        label='Предмет',
+        max_length=20,
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    teacher = forms.CharField(
+        label='Преподаватель',
+        max_length=100,
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    cafedra = forms.CharField(
+        label='Кафедра',
+        max_length=100,
+        required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+
+    field_order = ['name', 'subject', 'grade', 'date', 'teacher', 'cafedra']
+
     class Meta:
         model = StatStudent
-        fields = ['name', 'subject', 'grade', 'date', 'teacher', 'cafedra']
+        fields = ['grade', 'date']
         widgets = {
-            'name': forms.TextInput(attrs={'class': 'form-control'}),
-            'subject': forms.TextInput(attrs={'class': 'form-control'}),
             'grade': forms.TextInput(attrs={'class': 'form-control'}),
             'date': forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}),
-            'teacher': forms.TextInput(attrs={'class': 'form-control'}),
-            'cafedra': forms.TextInput(attrs={'class': 'form-control'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            for key, (field, _) in DIMENSIONS.items():
+                value = getattr(self.instance, field)
+                self.initial.setdefault(key, value.name if value else '')
+
+    def save(self, commit=True):
+        statstudent = super().save(commit=False)
+        for field, value in get_dimensions(self.cleaned_data).items():
+            setattr(statstudent, field, value)
+        if commit:
+            statstudent.save()
+        return statstudent
+
 #Форма для отображения данных
 class DataSourceForm(forms.Form):
     SOURCE_CHOICES = [
@@ -88,9 +132,57 @@ class DataSourceForm(forms.Form):
         widget=forms.Select(attrs={'class': 'form-control', 'id': 'source-selector'})
     )
 
+#Фильтры списка оценок из XML: период, кафедра и предмет (варианты из сводок секций)
+class XMLFilterForm(forms.Form):
+    date_from = forms.DateField(
+        label='С',
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    date_to = forms.DateField(
+        label='По',
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    cafedra = forms.ChoiceField(
+        label='Кафедра',
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    subject = forms.ChoiceField(
+        label='Предмет',
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
+    def __init__(self, *args, cafedras=(), subjects=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['cafedra'].choices = [('', 'Все кафедры')] + [(name, name) for name in cafedras]
+        self.fields['subject'].choices = [('', 'Все предметы')] + [(name, name) for name in subjects]
+
+    # Фильтры для get_all_grades_from_xml (некорректные значения не учитываются)
+    def get_filters(self):
+        self.is_valid()
+        return {name: self.cleaned_data.get(name) or None for name in self.fields}
+
 #Форма загрузки xml-файла
 class UploadXMLForm(forms.Form):
     xml_file = forms.FileField(
         label='XML файл с успеваемостью',
         widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.xml'})
-    )
\ No newline at end of file
+    )
+    import_to_db = forms.BooleanField(
+        label='Импортировать оценки в базу данных',
+        required=False,
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    compression = forms.ChoiceField(
+        label='Хранение файла',
+        choices=[('', 'Без сжатия'), ('gz', 'Сжатие gzip'), ('xz', 'Сжатие xz')],
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['compression'].initial = getattr(settings, 'GRADES_XML_COMPRESSION', '')
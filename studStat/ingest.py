@@ -0,0 +1,101 @@
+import json
+from django.conf import settings
+from django.db import transaction
+from .forms import GradeRecordForm
+from .stats import apply_summary_counts
+from .utils import INSERT_ROWS_PER_STATEMENT, insert_grades_on_conflict
+
+# Пакетный прием оценок через API (JSON массив или NDJSON, по объекту на строку).
+# Каждая запись проверяется GradeRecordForm, корректные записываются пачками
+# INSERT ... ON CONFLICT DO NOTHING, для каждой записи возвращается результат.
+
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonlines', 'application/jsonl')
+
+
+class IngestError(ValueError):
+    pass
+
+
+def get_ingest_chunk_size():
+    return getattr(settings, 'GRADES_API_CHUNK_SIZE', 500)
+
+# Записи из тела NDJSON, читаются построчно из потока запроса.
+# Вместо строки, которая не разбирается, возвращается IngestError с номером строки
+def iter_ndjson_records(stream):
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield IngestError(f'Строка {line_number}: некорректный JSON: {e.msg} (позиция {e.colno})')
+        except ValueError as e:
+            yield IngestError(f'Строка {line_number}: {e}')
+
+# Записи из тела запроса в зависимости от Content-Type
+def iter_request_records(request):
+    if request.content_type in NDJSON_CONTENT_TYPES:
+        return iter_ndjson_records(request)
+    try:
+        records = json.loads(request.body)
+    except ValueError:
+        raise IngestError('Тело запроса не является корректным JSON')
+    if not isinstance(records, list):
+        raise IngestError('Ожидается JSON массив оценок')
+    return iter(records)
+
+# Проверка записи: (словарь значений, None) или (None, ошибки по полям)
+def validate_record(record):
+    if isinstance(record, IngestError):
+        return None, {'__all__': [str(record)]}
+    if not isinstance(record, dict):
+        return None, {'__all__': ['Ожидается JSON объект с полями оценки']}
+    form = GradeRecordForm(record)
+    if not form.is_valid():
+        return None, {field: list(errors) for field, errors in form.errors.items()}
+    return form.cleaned_data, None
+
+# Пачка пишется несколькими INSERT, чтобы не выйти за предел числа параметров запроса
+def write_chunk(chunk, results, stats):
+    with transaction.atomic():
+        grade_ids = []
+        for start in range(0, len(chunk), INSERT_ROWS_PER_STATEMENT):
+            grade_ids.extend(insert_grades_on_conflict(
+                [values for _, values in chunk[start:start + INSERT_ROWS_PER_STATEMENT]]
+            ))
+        apply_summary_counts(values for (_, values), grade_id in zip(chunk, grade_ids) if grade_id)
+
+    for (index, _), grade_id in zip(chunk, grade_ids):
+        if grade_id:
+            stats['created'] += 1
+            results.append({'index': index, 'status': 'created', 'id': grade_id})
+        else:
+            stats['duplicates'] += 1
+            results.append({'index': index, 'status': 'duplicate'})
+
+# Проверяет и записывает оценки; результаты идут в порядке номеров записей
+def ingest_grades(records, chunk_size=None):
+    chunk_size = chunk_size or get_ingest_chunk_size()
+    stats = {'total': 0, 'created': 0, 'duplicates': 0, 'invalid': 0}
+    results = []
+    chunk = []
+
+    for index, record in enumerate(records):
+        stats['total'] += 1
+        values, errors = validate_record(record)
+        if errors:
+            stats['invalid'] += 1
+            results.append({'index': index, 'status': 'invalid', 'errors': errors})
+            continue
+
+        chunk.append((index, values))
+        if len(chunk) >= chunk_size:
+            write_chunk(chunk, results, stats)
+            chunk = []
+
+    if chunk:
+        write_chunk(chunk, results, stats)
+
+    results.sort(key=lambda result: result['index'])
+    return {**stats, 'results': results}
@@ -0,0 +1,112 @@
+import os
+import datetime
+import traceback
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import ImportJob
+from .utils import GRADES_XML_FILENAME, compact_grades_xml, get_grades_xml_dir, import_xml_file_to_db
+
+# Очередь импорта XML файлов в БД без внешнего брокера.
+# Задачи хранятся в таблице studstat_import_job и выполняются командой run_import_worker;
+# веб запрос только ставит задачу в очередь. Обработчик сообщает о ходе импорта
+# после каждой пачки, по этим данным /jobs/ отдает статус и скорость (строк/с).
+
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+def import_jobs_enabled():
+    return getattr(settings, 'GRADES_IMPORT_JOBS', True)
+
+def get_stale_seconds():
+    return getattr(settings, 'GRADES_IMPORT_JOB_STALE_SECONDS', 300)
+
+# Ставит файл в очередь импорта (повторно не ставится, пока предыдущая задача ждет)
+def enqueue_import(filename):
+    job = ImportJob.objects.filter(filename=filename, status='pending').first()
+    return job or ImportJob.objects.create(filename=filename)
+
+# Забирает следующую задачу: ожидающую или брошенную остановившимся обработчиком.
+# Задача закрепляется условным UPDATE, поэтому два обработчика не возьмут одну задачу
+def claim_next_job():
+    stale = timezone.now() - datetime.timedelta(seconds=get_stale_seconds())
+    candidates = ImportJob.objects.filter(
+        Q(status='pending') | Q(status='running', heartbeat_at__lt=stale)
+    ).order_by('id')
+
+    for job in candidates[:10]:
+        now = timezone.now()
+        claimed = ImportJob.objects.filter(id=job.id, status=job.status, heartbeat_at=job.heartbeat_at).update(
+            status='running', started_at=now, heartbeat_at=now, finished_at=None,
+            rows_processed=0, rows_created=0, rows_skipped=0, rows_invalid=0, error='',
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+# Сохраняет ход импорта после очередной пачки
+def report_progress(job, stats):
+    job.rows_processed = stats['total']
+    job.rows_invalid = stats['invalid']
+    job.heartbeat_at = timezone.now()
+    ImportJob.objects.filter(id=job.id).update(
+        rows_processed=job.rows_processed, rows_invalid=job.rows_invalid, heartbeat_at=job.heartbeat_at
+    )
+
+# Выполняет задачу импорта и записывает итог
+def run_job(job):
+    file_path = os.path.join(get_grades_xml_dir(), job.filename)
+    try:
+        if job.filename == GRADES_XML_FILENAME:
+            compact_grades_xml()
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(f'Файл {job.filename} не найден')
+        stats = import_xml_file_to_db(file_path, progress=lambda stats: report_progress(job, stats))
+    except Exception as e:
+        traceback.print_exc()
+        job.status, job.error = 'failed', str(e) or e.__class__.__name__
+    else:
+        job.status = 'done'
+        job.rows_processed = stats['total']
+        job.rows_created = stats['created']
+        job.rows_skipped = stats['skipped']
+        job.rows_invalid = stats['invalid']
+
+    job.finished_at = job.heartbeat_at = timezone.now()
+    job.save()
+    return job
+
+# Скорость импорта по данным задачи (строк/с)
+def rows_per_second(job):
+    if not job.started_at:
+        return 0
+    elapsed = ((job.finished_at or job.heartbeat_at or job.started_at) - job.started_at).total_seconds()
+    return round(job.rows_processed / elapsed) if elapsed > 0 else 0
+
+def job_status_data(job):
+    return {
+        'id': job.id,
+        'filename': job.filename,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'rows_processed': job.rows_processed,
+        'rows_created': job.rows_created,
+        'rows_skipped': job.rows_skipped,
+        'rows_invalid': job.rows_invalid,
+        'rows_per_second': rows_per_second(job),
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+# Последняя задача по каждому из файлов (или по всем файлам из недавних задач)
+def latest_jobs(filenames=None, limit=100):
+    jobs = ImportJob.objects.order_by('-id')
+    if filenames:
+        jobs = jobs.filter(filename__in=filenames)
+    latest = {}
+    for job in jobs[:limit]:
+        latest.setdefault(job.filename, job)
+    return list(latest.values())
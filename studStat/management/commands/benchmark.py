@@ -0,0 +1,231 @@
+import io
+import copy
+import json
+import time
+import shutil
+import sqlite3
+import datetime
+import platform
+import statistics
+import tempfile
+from contextlib import redirect_stdout
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+from django.db.utils import load_backend
+from django.test import Client, override_settings
+from studStat.utils import (
+    ensure_grades_dir, import_grades_to_db, iter_synthetic_grades, update_xml_manifest, write_grades_xml_file
+)
+from studStat.xml_store import append_grades_to_partitions, save_grade_to_xml
+from studStat.xml_cache import xml_parse_cache
+from studStat.analytics import frame_cache, load_db_frame
+
+# Замер основных страниц и операций на синтетических данных разного объема.
+# Данные каждого объема добавляются в транзакции и откатываются после замеров,
+# XML файлы создаются во временной MEDIA_ROOT.
+
+BENCHMARK_XML_FILENAME = 'benchmark.xml'
+MIGRATE_COLUMNS = ('name', 'subject', 'grade', 'date', 'teacher', 'cafedra')
+
+
+def parse_sizes(value):
+    try:
+        return [int(size.strip().lower().replace('k', '000').replace('m', '000000'))
+                for size in value.split(',') if size.strip()]
+    except ValueError:
+        raise CommandError(f'Некорректный список объемов: {value}')
+
+# Время выполнения func в миллисекундах: min/median/max по repeat запускам
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        'min_ms': round(timings[0], 2),
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'max_ms': round(timings[-1], 2),
+        'repeat': repeat,
+    }
+
+# Запрос "открыть соединение, SELECT 1, вернуть соединение" для отдельной копии настроек БД:
+# без пула каждый раз устанавливается новое соединение, с пулом оно берется из пула
+def measure_connection_setup(requests_count):
+    base = connections.settings[DEFAULT_DB_ALIAS]
+    modes = {'direct': {key: value for key, value in base.get('OPTIONS', {}).items() if key != 'pool'}}
+    if base['ENGINE'].endswith('postgresql') and base.get('OPTIONS', {}).get('pool'):
+        modes['pooled'] = base['OPTIONS']
+
+    results = {}
+    for mode, options in modes.items():
+        settings_dict = copy.deepcopy({**base, 'OPTIONS': options, 'CONN_MAX_AGE': 0})
+        wrapper = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias=f'benchmark_{mode}')
+
+        def request():
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            wrapper.close()
+
+        request()  # пул открывается при первом запросе
+        results[mode] = measure(request, requests_count)
+        if mode == 'pooled':
+            wrapper.close_pool()
+    return results
+
+def get_page(client, url, **headers):
+    def request():
+        response = client.get(url, **headers)
+        if response.status_code != 200:
+            raise CommandError(f'{url}: статус {response.status_code}')
+        # Потоковые ответы нужно дочитать, чтобы замер включал формирование тела
+        if response.streaming:
+            b''.join(response.streaming_content)
+    return request
+
+# Файл SQLite в формате старой схемы (текстовые колонки) для migrate_data.py
+def create_legacy_sqlite(path, size, seed):
+    sqlite_conn = sqlite3.connect(path)
+    sqlite_conn.execute('''
+        CREATE TABLE studstat (id INTEGER PRIMARY KEY, name TEXT, subject TEXT, grade TEXT,
+                               date TEXT, teacher TEXT, cafedra TEXT)
+    ''')
+    sqlite_conn.executemany(
+        f"INSERT INTO studstat ({', '.join(MIGRATE_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+        ([grade[column] if column != 'date' else grade['date'].isoformat() for column in MIGRATE_COLUMNS]
+         for grade in iter_synthetic_grades(size, seed=f'{seed}-migrate'))
+    )
+    sqlite_conn.commit()
+    sqlite_conn.close()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет grades_list, ajax_search, xml_files_list, view_xml_file, save_grade_to_xml '
+            'и migrate_data.py на синтетических данных и выводит результаты в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1k,100k,1m', help='Объемы данных через запятую, например 1k,100k,1m')
+        parser.add_argument('--repeat', type=int, default=5, help='Сколько раз повторять каждый замер')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора данных')
+        parser.add_argument('--only', default='', help='Замерять только указанные операции (через запятую)')
+        parser.add_argument('--connections', type=int, default=200,
+                            help='Запросов для замера установки соединения с пулом и без (0 - не замерять)')
+        parser.add_argument('--output', '-o', help='Файл для JSON результатов (по умолчанию stdout)')
+        parser.add_argument('--baseline', help='JSON прошлого запуска для сравнения')
+        parser.add_argument('--threshold', type=float, default=1.5,
+                            help='Во сколько раз медиана может вырасти относительно baseline')
+
+    def handle(self, *args, **options):
+        only = {name.strip() for name in options['only'].split(',') if name.strip()}
+        results = {
+            'started': datetime.datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'repeat': options['repeat'],
+            'sizes': {},
+        }
+
+        if options['connections']:
+            results['connections'] = measure_connection_setup(options['connections'])
+            for mode, timing in results['connections'].items():
+                self.stderr.write(f"Соединение ({mode}): {timing['median_ms']} мс")
+
+        for size in parse_sizes(options['sizes']):
+            self.stderr.write(f'Объем {size}...')
+            results['sizes'][str(size)] = self.run_size(size, options, only)
+
+        output = json.dumps(results, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'Результаты записаны в {options["output"]}'))
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['threshold'])
+
+    def run_size(self, size, options, only):
+        media_root = tempfile.mkdtemp(prefix='studstat_benchmark_')
+        try:
+            with override_settings(MEDIA_ROOT=media_root, ALLOWED_HOSTS=['*']), transaction.atomic():
+                size_results = {}
+                started = time.perf_counter()
+                import_grades_to_db(iter_synthetic_grades(size, seed=options['seed']))
+                grades_dir = ensure_grades_dir()
+                write_grades_xml_file(f'{grades_dir}/{BENCHMARK_XML_FILENAME}',
+                                      iter_synthetic_grades(size, seed=f"{options['seed']}-xml"))
+                append_grades_to_partitions(iter_synthetic_grades(size, seed=f"{options['seed']}-main"))
+                update_xml_manifest(BENCHMARK_XML_FILENAME)
+                size_results['setup_s'] = round(time.perf_counter() - started, 2)
+
+                for name, func in self.operations(size, options, media_root).items():
+                    if only and name not in only:
+                        continue
+                    xml_parse_cache.clear()
+                    size_results[name] = measure(func, options['repeat'])
+                    self.stderr.write(f"  {name}: {size_results[name]['median_ms']} мс")
+
+                transaction.set_rollback(True)
+            return size_results
+        finally:
+            xml_parse_cache.clear()
+            frame_cache.clear()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def operations(self, size, options, media_root):
+        client = Client()
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        sample = next(iter_synthetic_grades(1, seed=f"{options['seed']}-save"))
+        return {
+            'grades_list_db': get_page(client, '/grades/'),
+            'grades_list_xml': get_page(client, '/grades/?source=xml'),
+            'grades_list_xml_month': get_page(client, '/grades/?source=xml&date_from=2022-03-01&date_to=2022-03-31'),
+            'ajax_search': get_page(client, '/ajax-search/?q=Петров', **ajax),
+            'ajax_search_relevance': get_page(client, '/ajax-search/?q=Петров Математика&order=relevance', **ajax),
+            'analytics_load_db': load_db_frame,
+            'analytics_gpa': get_page(client, '/analytics/gpa/'),
+            'analytics_trends': get_page(client, '/analytics/trends/?period=month&subject=Математика'),
+            'xml_files_list': get_page(client, '/files/'),
+            'view_xml_file': get_page(client, f'/files/{BENCHMARK_XML_FILENAME}/'),
+            'save_grade_to_xml': lambda: save_grade_to_xml(sample),
+            'migrate_data': self.migrate_data_operation(size, options, media_root),
+        }
+
+    # Пакетный перенос migrate_data.py из SQLite файла старой схемы того же объема
+    def migrate_data_operation(self, size, options, media_root):
+        sqlite_path = f'{media_root}/legacy.sqlite3'
+        checkpoint_path = f'{media_root}/migrate_data.checkpoint.json'
+        prepared = []
+
+        def run():
+            import migrate_data
+            if not prepared:
+                create_legacy_sqlite(sqlite_path, size, options['seed'])
+                prepared.append(True)
+            with redirect_stdout(io.StringIO()), transaction.atomic():
+                migrate_data.migrate_sqlite_to_postgres_batched(
+                    reset=True, sqlite_path=sqlite_path, checkpoint_path=checkpoint_path
+                )
+                transaction.set_rollback(True)
+        return run
+
+    def compare(self, results, baseline_path, threshold):
+        with open(baseline_path, encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)
+
+        regressions = []
+        for size, operations in results['sizes'].items():
+            for name, timing in operations.items():
+                previous = baseline.get('sizes', {}).get(size, {}).get(name)
+                if not isinstance(timing, dict) or not isinstance(previous, dict):
+                    continue
+                ratio = timing['median_ms'] / previous['median_ms'] if previous['median_ms'] else 1
+                if ratio > threshold:
+                    regressions.append(f"{name} ({size}): {previous['median_ms']} -> {timing['median_ms']} мс")
+
+        if regressions:
+            raise CommandError('Замедление относительно baseline:\n' + '\n'.join(regressions))
+        self.stderr.write(self.style.SUCCESS('Замедлений относительно baseline нет'))
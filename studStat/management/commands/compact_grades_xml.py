@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from studStat.utils import compact_grades_xml
+
+
+class Command(BaseCommand):
+    help = 'Переносит записи из журнала дозаписи в основной файл grades.xml'
+
+    def handle(self, *args, **options):
+        moved = compact_grades_xml()
+        self.stdout.write(self.style.SUCCESS(f'Перенесено оценок из журнала: {moved}'))
@@ -0,0 +1,44 @@
+import os
+import shutil
+from django.core.management.base import BaseCommand
+from studStat.utils import (
+    GRADES_XML_FILENAME, XML_COMPRESSIONS, ensure_grades_dir, update_xml_manifest
+)
+
+
+class Command(BaseCommand):
+    help = 'Сжимает XML файлы в grades_xml (gzip или xz); grades.xml не сжимается'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='Имена файлов в grades_xml (по умолчанию все несжатые)')
+        parser.add_argument('--compression', choices=sorted(XML_COMPRESSIONS), default='gz', help='Способ сжатия')
+
+    def handle(self, *args, **options):
+        grades_dir = ensure_grades_dir()
+        filenames = options['files'] or sorted(
+            filename for filename in os.listdir(grades_dir) if filename.endswith('.xml')
+        )
+        saved = 0
+
+        for filename in filenames:
+            file_path = os.path.join(grades_dir, filename)
+            if filename == GRADES_XML_FILENAME or not filename.endswith('.xml') or not os.path.exists(file_path):
+                self.stderr.write(f'{filename}: пропущен')
+                continue
+
+            compressed_name = f"{filename}.{options['compression']}"
+            compressed_path = os.path.join(grades_dir, compressed_name)
+            tmp_path = compressed_path + '.tmp'
+            # Пишем во временный файл с тем же способом сжатия и переименовываем
+            with open(file_path, 'rb') as source, XML_COMPRESSIONS[options['compression']].open(tmp_path, 'wb') as output:
+                shutil.copyfileobj(source, output, 1024 * 1024)
+            os.replace(tmp_path, compressed_path)
+
+            size, compressed_size = os.path.getsize(file_path), os.path.getsize(compressed_path)
+            os.remove(file_path)
+            update_xml_manifest(filename)
+            update_xml_manifest(compressed_name)
+            saved += size - compressed_size
+            self.stdout.write(f'{filename} -> {compressed_name}: {size} -> {compressed_size} байт')
+
+        self.stdout.write(self.style.SUCCESS(f'Освобождено {saved} байт'))
@@ -0,0 +1,88 @@
+import re
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from studStat.models import StatStudent
+from studStat.dimensions import DIMENSIONS, grade_lookup
+from studStat.export import filter_grades_for_export
+from studStat.search import search_statstudent
+from studStat.utils import get_all_statstudent_from_db, import_grades_to_db, iter_synthetic_grades
+
+TABLE = StatStudent._meta.db_table
+
+# Последовательное сканирование studstat: "Seq Scan on studstat" в PostgreSQL,
+# "SCAN studstat" без индекса в SQLite (справочники studstat_* не учитываются)
+SEQUENTIAL_SCAN = re.compile(rf'(Seq Scan on|SCAN) {TABLE}\b(?!_)')
+
+# Оценка из таблицы, на которой проверяются запросы с параметрами
+def sample_grade():
+    return StatStudent.objects.select_related('student', 'subject').order_by('id').first()
+
+def grade_data(grade):
+    return {'name': grade.student.name, 'subject': grade.subject.name, 'grade': grade.grade, 'date': grade.date}
+
+def page_after(grade):
+    return get_all_statstudent_from_db().filter(
+        models.Q(date__lt=grade.date) | models.Q(date=grade.date, id__lt=grade.id)
+    )[:50]
+
+# Горячие запросы приложения, планы которых не должны деградировать до полного сканирования.
+# Запросы с параметрами получают оценку из sample_grade()
+HOT_QUERIES = {
+    'grades_list: первая страница': lambda grade: get_all_statstudent_from_db()[:50],
+    'grades_list: следующая страница': page_after,
+    'save_statstudent_to_db: дубликат': lambda grade: StatStudent.objects.filter(**grade_lookup(grade_data(grade))),
+    'edit_grade: дубликат': lambda grade: StatStudent.objects.filter(
+        **grade_lookup(grade_data(grade))
+    ).exclude(id=grade.id),
+    'ajax_search: текст': lambda grade: search_statstudent('Петров'),
+    'ajax_search: несколько слов': lambda grade: search_statstudent('Иванов Математика'),
+    'ajax_search: оценка': lambda grade: search_statstudent('незачет'),
+    'ajax_search: месяц': lambda grade: search_statstudent('2021-03'),
+    'export_grades: период': lambda grade: filter_grades_for_export(date_from='2021-03-01', date_to='2021-03-31'),
+}
+
+# Признак последовательного сканирования таблицы оценок в плане запроса
+def is_sequential_scan(plan):
+    for line in plan.splitlines():
+        if SEQUENTIAL_SCAN.search(line) and 'USING' not in line:
+            return True
+    return False
+
+
+class Command(BaseCommand):
+    help = ('Выводит планы выполнения горячих запросов и завершается с ошибкой, '
+            'если какой-то из них сканирует таблицу studstat целиком')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Временно добавить N синтетических оценок (откатываются после проверки)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['seed']:
+                started = time.monotonic()
+                stats = import_grades_to_db(iter_synthetic_grades(options['seed']))
+                self.stdout.write(f"Добавлено {stats['created']} оценок за {time.monotonic() - started:.1f} с")
+            # Статистика для планировщика по оценкам и справочникам
+            with connection.cursor() as cursor:
+                for table in (TABLE, *(model._meta.db_table for _, model in DIMENSIONS.values())):
+                    cursor.execute(f'ANALYZE {table}')
+
+            grade = sample_grade()
+            if grade is None:
+                raise CommandError('Таблица оценок пуста, запустите команду с --seed N')
+
+            failures = []
+            for name, build_queryset in HOT_QUERIES.items():
+                plan = build_queryset(grade).explain()
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(plan)
+                if is_sequential_scan(plan):
+                    failures.append(name)
+
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError('Полное сканирование таблицы в запросах: ' + ', '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
@@ -0,0 +1,40 @@
+import sys
+import time
+from django.core.management.base import BaseCommand
+from studStat.export import EXPORT_FORMATS, filter_grades_for_export, gzip_stream
+
+
+class Command(BaseCommand):
+    help = 'Потоковый экспорт оценок из базы данных в XML или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='xml')
+        parser.add_argument('--output', '-o', help='Файл для записи (по умолчанию stdout)')
+        parser.add_argument('--query', '-q', default='', help='Строка поиска, как в ajax_search')
+        parser.add_argument('--date-from', help='Начальная дата (YYYY-MM-DD)')
+        parser.add_argument('--date-to', help='Конечная дата (YYYY-MM-DD)')
+        parser.add_argument('--gzip', action='store_true', help='Сжать вывод gzip')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Размер порции чтения из БД')
+
+    def handle(self, *args, **options):
+        queryset = filter_grades_for_export(options['query'], options['date_from'], options['date_to'])
+        exporter = EXPORT_FORMATS[options['format']][0]
+        content = exporter(queryset, chunk_size=options['chunk_size'])
+        if options['gzip']:
+            content = gzip_stream(content)
+
+        started = time.monotonic()
+        written = 0
+        output = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for block in content:
+                output.write(block)
+                written += len(block)
+        finally:
+            if options['output']:
+                output.close()
+
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Записано {written} байт в {options["output"]} за {time.monotonic() - started:.2f} с'
+            ))
@@ -0,0 +1,42 @@
+import os
+import time
+from django.core.management.base import BaseCommand
+from studStat.utils import (
+    ensure_grades_dir, import_grades_to_db, iter_synthetic_grades, update_xml_manifest, write_grades_xml_file
+)
+
+
+class Command(BaseCommand):
+    help = 'Создает синтетические оценки в базе данных и XML файлы в grades_xml для нагрузочных проверок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--db', type=int, default=0, help='Сколько оценок добавить в базу данных')
+        parser.add_argument('--xml-files', type=int, default=0, help='Сколько XML файлов создать')
+        parser.add_argument('--xml-size', type=int, default=1000, help='Оценок в каждом XML файле')
+        parser.add_argument('--seed', type=int, default=0, help='Начальное значение генератора (для повторяемости)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Размер пачки при вставке в БД')
+        parser.add_argument('--compression', choices=['gz', 'xz'], default=None, help='Сжимать XML файлы')
+
+    def handle(self, *args, **options):
+        if options['db']:
+            started = time.monotonic()
+            stats = import_grades_to_db(iter_synthetic_grades(options['db'], seed=options['seed']),
+                                        batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"БД: добавлено {stats['created']}, дубликатов {stats['skipped']} "
+                f"за {time.monotonic() - started:.2f} с"
+            ))
+
+        grades_dir = ensure_grades_dir()
+        for number in range(options['xml_files']):
+            started = time.monotonic()
+            filename = f"synthetic_{options['seed']}_{number + 1}.xml"
+            if options['compression']:
+                filename += f".{options['compression']}"
+            # У каждого файла свой seed, чтобы файлы не повторяли друг друга
+            grades = iter_synthetic_grades(options['xml_size'], seed=f"{options['seed']}-{number}")
+            count = write_grades_xml_file(os.path.join(grades_dir, filename), grades)
+            update_xml_manifest(filename)
+            self.stdout.write(self.style.SUCCESS(
+                f'{filename}: {count} оценок за {time.monotonic() - started:.2f} с'
+            ))
@@ -0,0 +1,34 @@
+import os
+import time
+import xml.etree.ElementTree as ET
+from django.core.management.base import BaseCommand, CommandError
+from studStat.utils import get_grades_xml_dir, import_xml_file_to_db
+
+
+class Command(BaseCommand):
+    help = 'Импорт оценок из XML файлов в базу данных пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='Пути к XML файлам или имена файлов в grades_xml')
+        parser.add_argument('--batch-size', type=int, default=None, help='Размер пачки для bulk_create')
+
+    def handle(self, *args, **options):
+        for filename in options['files']:
+            file_path = filename
+            if not os.path.exists(file_path):
+                file_path = os.path.join(get_grades_xml_dir(), filename)
+            if not os.path.exists(file_path):
+                raise CommandError(f'Файл {filename} не найден')
+
+            started = time.monotonic()
+            try:
+                stats = import_xml_file_to_db(file_path, batch_size=options['batch_size'])
+            except ET.ParseError as e:
+                raise CommandError(f'Файл {filename} не является валидным XML: {e}')
+            elapsed = time.monotonic() - started
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{filename}: всего {stats['total']}, добавлено {stats['created']}, "
+                f"дубликатов {stats['skipped']}, некорректных {stats['invalid']} "
+                f"за {elapsed:.2f} с"
+            ))
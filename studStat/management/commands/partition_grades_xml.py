@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from studStat.xml_store import partition_legacy_grades_xml, rebuild_partition_summaries
+
+
+class Command(BaseCommand):
+    help = 'Разносит grades.xml по секциям XML хранилища (месяц и кафедра) и обновляет сводки секций'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Пересчитать сводки всех секций по их файлам')
+
+    def handle(self, *args, **options):
+        moved = partition_legacy_grades_xml()
+        self.stdout.write(self.style.SUCCESS(f'Перенесено из grades.xml: {moved}'))
+        if options['rebuild']:
+            count = rebuild_partition_summaries()
+            self.stdout.write(self.style.SUCCESS(f'Пересчитано секций: {count}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from studStat.models import GradeSummary
+from studStat.stats import rebuild_grade_summary
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сводные таблицы статистики оценок по таблице studstat'
+
+    def handle(self, *args, **options):
+        rebuild_grade_summary()
+        self.stdout.write(self.style.SUCCESS(f'Строк в сводке: {GradeSummary.objects.count()}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from studStat.utils import reconcile_xml_manifest
+
+
+class Command(BaseCommand):
+    help = 'Сверяет манифест XML файлов с содержимым директории grades_xml'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Пересчитать все файлы, даже если размер и время изменения не менялись')
+
+    def handle(self, *args, **options):
+        stats = reconcile_xml_manifest(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Пересчитано: {stats['scanned']}, без изменений: {stats['unchanged']}, "
+            f"удалено из манифеста: {stats['removed']}"
+        ))
@@ -0,0 +1,48 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from studStat.jobs import claim_next_job, rows_per_second, run_job
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи импорта XML файлов в БД из очереди studstat_import_job'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Выполнить задачи из очереди и завершиться')
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'GRADES_IMPORT_WORKER_POLL_SECONDS', 2),
+                            help='Пауза между проверками очереди, с')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Обработчик импорта запущен')
+        try:
+            while True:
+                close_old_connections()
+                try:
+                    job = claim_next_job()
+                except DatabaseError as e:
+                    # Например, миграции еще не применены или БД недоступна
+                    self.stderr.write(f'Очередь недоступна: {e}')
+                    job = None
+                    if options['once']:
+                        return
+
+                if job is None:
+                    if options['once']:
+                        return
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f'Импорт {job.filename} (задача {job.id})')
+                job = run_job(job)
+                if job.status == 'done':
+                    self.stdout.write(self.style.SUCCESS(
+                        f'{job.filename}: всего {job.rows_processed}, добавлено {job.rows_created}, '
+                        f'дубликатов {job.rows_skipped}, некорректных {job.rows_invalid}, '
+                        f'{rows_per_second(job)} строк/с'
+                    ))
+                else:
+                    self.stderr.write(f'{job.filename}: ошибка: {job.error}')
+        except KeyboardInterrupt:
+            self.stdout.write('Обработчик импорта остановлен')
@@ -0,0 +1,117 @@
+import time
+import bisect
+import functools
+import threading
+from collections import defaultdict
+
+# Метрики производительности в памяти процесса и их вывод в текстовом формате Prometheus.
+# Каждый процесс (воркер) считает свои значения; Prometheus опрашивает их по /metrics.
+
+# Границы корзин гистограмм, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_value(value):
+    if isinstance(value, float) and not value.is_integer():
+        return repr(value)
+    return str(int(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.values = defaultdict(float)
+        self.lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self.lock:
+            self.values[tuple(label_values)] += amount
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for label_values, value in sorted(values.items()):
+            yield f'{self.name}{format_labels(self.labels, label_values)} {format_value(value)}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}  # значения меток -> [счетчики по корзинам (+Inf последняя), сумма, количество]
+        self.lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label_values)
+            if series is None:
+                series = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self.lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self.series.items()}
+        for label_values, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else repr(float(bound))
+                yield (f'{self.name}_bucket'
+                       f'{format_labels(self.labels, label_values, [("le", le)])} {cumulative}')
+            yield f'{self.name}_sum{format_labels(self.labels, label_values)} {format_value(total)}'
+            yield f'{self.name}_count{format_labels(self.labels, label_values)} {count}'
+
+
+REQUEST_DURATION = Histogram(
+    'studstat_request_duration_seconds', 'Время обработки запроса представлением', ('view', 'method'))
+REQUESTS_TOTAL = Counter(
+    'studstat_requests_total', 'Количество запросов по представлениям и кодам ответа', ('view', 'method', 'status'))
+DB_QUERIES_TOTAL = Counter(
+    'studstat_db_queries_total', 'Количество SQL запросов, выполненных представлением', ('view',))
+DB_DURATION_TOTAL = Counter(
+    'studstat_db_query_duration_seconds_total', 'Суммарное время SQL запросов представления', ('view',))
+XML_OPERATION_DURATION = Histogram(
+    'studstat_xml_operation_duration_seconds', 'Время работы XML функций (разбор, запись, проверка)', ('operation',))
+
+REGISTRY = (REQUEST_DURATION, REQUESTS_TOTAL, DB_QUERIES_TOTAL, DB_DURATION_TOTAL, XML_OPERATION_DURATION)
+
+
+# Декоратор: время выполнения функции попадает в гистограмму XML операций
+def timed_xml(operation):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                XML_OPERATION_DURATION.observe((operation,), time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+# Все метрики в текстовом формате Prometheus
+def render_metrics():
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.help_text}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
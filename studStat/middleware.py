@@ -0,0 +1,95 @@
+import time
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from .metrics import DB_DURATION_TOTAL, DB_QUERIES_TOTAL, REQUEST_DURATION, REQUESTS_TOTAL
+
+# Счетчик SQL текущего запроса. Контекстная переменная видна и в потоках sync_to_async,
+# поэтому запросы async ORM тоже попадают в метрики своего представления
+current_query_timer = ContextVar('current_query_timer', default=None)
+
+# Методы, которые попадают в метку method как есть; остальные учитываются как 'other',
+# чтобы произвольные методы из запросов не плодили новые ряды метрик
+METRIC_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+
+
+# Считает SQL запросы и их время в рамках одного запроса
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Обертка для всех соединений с БД: учитывает запрос, если идет замер
+def time_query(execute, sql, params, many, context):
+    timer = current_query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.duration += time.perf_counter() - started
+        timer.count += 1
+
+def install_query_timer(sender, connection, **kwargs):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+connection_created.connect(install_query_timer)
+
+
+# Время ответа, число и время SQL запросов по каждому представлению (имя из urls.py).
+# Работает и в WSGI, и в ASGI режиме без переключения между потоками
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'METRICS_ENABLED', True)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+
+        timer, token, started = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_query_timer.reset(token)
+        self.record(request, response, timer, started)
+        return response
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        timer, token, started = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_query_timer.reset(token)
+        self.record(request, response, timer, started)
+        return response
+
+    def start(self):
+        timer = QueryTimer()
+        return timer, current_query_timer.set(timer), time.perf_counter()
+
+    def record(self, request, response, timer, started):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.url_name if match and match.url_name else 'unmatched'
+        method = request.method if request.method in METRIC_METHODS else 'other'
+        REQUEST_DURATION.observe((view, method), elapsed)
+        REQUESTS_TOTAL.inc((view, method, response.status_code))
+        if timer.count:
+            DB_QUERIES_TOTAL.inc((view,), timer.count)
+            DB_DURATION_TOTAL.inc((view,), timer.duration)
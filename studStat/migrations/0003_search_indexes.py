@@ -0,0 +1,34 @@
+from django.db import migrations
+
+# Триграммные GIN индексы для поиска (только PostgreSQL).
+# Выражение UPPER(<поле>::text) совпадает с тем, что Django генерирует для icontains.
+SEARCH_FIELDS = ('name', 'subject', 'teacher', 'cafedra')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS studstat_{field}_trgm '
+            f'ON studstat USING gin ((UPPER({field}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS studstat_{field}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studStat', '0002_alter_statstudent_unique_together'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studStat', '0003_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XMLFileManifest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255, unique=True, verbose_name='Имя файла')),
+                ('size', models.BigIntegerField(verbose_name='Размер, байт')),
+                ('mtime_ns', models.BigIntegerField(verbose_name='Время изменения, нс')),
+                ('checksum', models.CharField(max_length=64, verbose_name='SHA-256')),
+                ('is_valid', models.BooleanField(default=False, verbose_name='Валидный XML')),
+                ('records_count', models.IntegerField(default=0, verbose_name='Количество оценок')),
+                ('date_from', models.DateField(blank=True, null=True, verbose_name='Первая дата')),
+                ('date_to', models.DateField(blank=True, null=True, verbose_name='Последняя дата')),
+                ('cafedras', models.JSONField(blank=True, default=list, verbose_name='Кафедры')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'XML файл',
+                'verbose_name_plural': 'XML файлы',
+                'db_table': 'xml_manifest',
+                'ordering': ['filename'],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:46
+
+from django.db import migrations, models
+from django.db.models import Count, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_grade_summary(apps, schema_editor):
+    StatStudent = apps.get_model('studStat', 'StatStudent')
+    GradeSummary = apps.get_model('studStat', 'GradeSummary')
+    for dimension, field in (('student', 'name'), ('subject', 'subject'), ('cafedra', 'cafedra')):
+        rows = (StatStudent.objects.annotate(group_value=Coalesce(field, Value('')))
+                .values('group_value', 'grade').annotate(count=Count('id')).order_by())
+        GradeSummary.objects.bulk_create(
+            GradeSummary(dimension=dimension, value=row['group_value'], grade=row['grade'], count=row['count'])
+            for row in rows
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studStat', '0004_xml_manifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GradeSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('student', 'Студент'), ('subject', 'Предмет'), ('cafedra', 'Кафедра')], max_length=10, verbose_name='Группировка')),
+                ('value', models.CharField(max_length=100, verbose_name='Значение')),
+                ('grade', models.CharField(max_length=20, verbose_name='Оценка')),
+                ('count', models.IntegerField(default=0, verbose_name='Количество')),
+            ],
+            options={
+                'verbose_name': 'Сводка по оценкам',
+                'verbose_name_plural': 'Сводки по оценкам',
+                'db_table': 'studstat_summary',
+                'unique_together': {('dimension', 'value', 'grade')},
+            },
+        ),
+        migrations.RunPython(fill_grade_summary, migrations.RunPython.noop),
+    ]
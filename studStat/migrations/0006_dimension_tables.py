@@ -0,0 +1,99 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Вынос студентов, предметов, преподавателей и кафедр в справочники, шаг 1:
+# таблицы справочников и пустые колонки внешних ключей в studstat.
+
+SQLITE_FTS_OBJECTS = (
+    'DROP TRIGGER IF EXISTS studstat_fts_ai',
+    'DROP TRIGGER IF EXISTS studstat_fts_ad',
+    'DROP TRIGGER IF EXISTS studstat_fts_au',
+    'DROP TABLE IF EXISTS studstat_fts',
+)
+
+
+def drop_sqlite_fts(apps, schema_editor):
+    # Полнотекстовая таблица SQLite ссылалась на удаляемые текстовые колонки
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in SQLITE_FTS_OBJECTS:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studStat', '0005_grade_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_sqlite_fts, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='Student',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='ФИО студента')),
+            ],
+            options={
+                'verbose_name': 'Студент',
+                'verbose_name_plural': 'Студенты',
+                'db_table': 'studstat_student',
+            },
+        ),
+        migrations.CreateModel(
+            name='Subject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=20, unique=True, verbose_name='Предмет')),
+            ],
+            options={
+                'verbose_name': 'Предмет',
+                'verbose_name_plural': 'Предметы',
+                'db_table': 'studstat_subject',
+            },
+        ),
+        migrations.CreateModel(
+            name='Teacher',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Преподаватель')),
+            ],
+            options={
+                'verbose_name': 'Преподаватель',
+                'verbose_name_plural': 'Преподаватели',
+                'db_table': 'studstat_teacher',
+            },
+        ),
+        migrations.CreateModel(
+            name='Cafedra',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='Кафедра')),
+            ],
+            options={
+                'verbose_name': 'Кафедра',
+                'verbose_name_plural': 'Кафедры',
+                'db_table': 'studstat_cafedra',
+            },
+        ),
+        migrations.AddField(
+            model_name='statstudent',
+            name='student',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='grades', to='studStat.student', verbose_name='Студент'),
+        ),
+        migrations.AddField(
+            model_name='statstudent',
+            name='subject_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='studStat.subject', verbose_name='Предмет'),
+        ),
+        migrations.AddField(
+            model_name='statstudent',
+            name='teacher_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='studStat.teacher', verbose_name='Преподаватель'),
+        ),
+        migrations.AddField(
+            model_name='statstudent',
+            name='cafedra_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='studStat.cafedra', verbose_name='Кафедра'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# Вынос студентов, предметов, преподавателей и кафедр в справочники, шаг 2:
+# заполнение справочников и ключей из текстовых колонок.
+# Отдельная миграция: в PostgreSQL нельзя менять таблицу в той же транзакции,
+# где остались отложенные проверки внешних ключей после UPDATE.
+
+# (таблица справочника, старая колонка studstat, новая колонка с ключом, пустые значения допустимы)
+DIMENSIONS = (
+    ('studstat_student', 'name', 'student_id', False),
+    ('studstat_subject', 'subject', 'subject_ref_id', False),
+    ('studstat_teacher', 'teacher', 'teacher_ref_id', True),
+    ('studstat_cafedra', 'cafedra', 'cafedra_ref_id', True),
+)
+
+
+# Имена в справочниках хранятся без пробелов по краям, как их записывают get_dimension и
+# resolve_dimension_ids, поэтому " Иванов" и "Иванов" становятся одним студентом
+def fill_dimensions(apps, schema_editor):
+    for table, column, key_column, optional in DIMENSIONS:
+        condition = f"WHERE {column} IS NOT NULL AND TRIM({column}) <> ''" if optional else ''
+        schema_editor.execute(
+            f'INSERT INTO {table} (name) SELECT DISTINCT TRIM({column}) FROM studstat {condition}'
+        )
+        schema_editor.execute(
+            f'UPDATE studstat SET {key_column} = '
+            f'(SELECT d.id FROM {table} d WHERE d.name = TRIM(studstat.{column}))'
+        )
+
+
+def restore_text_columns(apps, schema_editor):
+    for table, column, key_column, optional in DIMENSIONS:
+        default = 'NULL' if optional else "''"
+        schema_editor.execute(
+            f'UPDATE studstat SET {column} = COALESCE('
+            f'(SELECT d.name FROM {table} d WHERE d.id = studstat.{key_column}), {default})'
+        )
+
+
+# Оценки, которые после обрезки пробелов совпали с другими, нарушили бы новый уникальный ключ:
+# остается первая из них. Сводка пересчитывается по обрезанным именам
+def remove_trimmed_duplicates(apps, schema_editor):
+    schema_editor.execute(
+        'DELETE FROM studstat WHERE id NOT IN '
+        '(SELECT MIN(id) FROM studstat GROUP BY student_id, subject_ref_id, grade, date)'
+    )
+    schema_editor.execute('DELETE FROM studstat_summary')
+    for dimension, table, key_column in (
+        ('student', 'studstat_student', 'student_id'),
+        ('subject', 'studstat_subject', 'subject_ref_id'),
+        ('cafedra', 'studstat_cafedra', 'cafedra_ref_id'),
+    ):
+        schema_editor.execute(
+            f"INSERT INTO studstat_summary (dimension, value, grade, count) "
+            f"SELECT '{dimension}', COALESCE(d.name, ''), s.grade, COUNT(*) FROM studstat s "
+            f"LEFT JOIN {table} d ON d.id = s.{key_column} GROUP BY COALESCE(d.name, ''), s.grade"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studStat', '0006_dimension_tables'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_dimensions, restore_text_columns),
+        migrations.RunPython(remove_trimmed_duplicates, migrations.RunPython.noop),
+    ]
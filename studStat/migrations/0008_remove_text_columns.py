@@ -0,0 +1,70 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Вынос студентов, предметов, преподавателей и кафедр в справочники, шаг 3:
+# удаление текстовых колонок и триграммные индексы по именам в справочниках.
+
+DIMENSION_TABLES = ('studstat_student', 'studstat_subject', 'studstat_teacher', 'studstat_cafedra')
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in DIMENSION_TABLES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_name_trgm '
+            f'ON {table} USING gin ((UPPER(name::text)) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in DIMENSION_TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studStat', '0007_fill_dimension_tables'),
+    ]
+
+    # Текстовые колонки удаляются вместе с данными, и вернуть их NOT NULL колонками с содержимым нельзя,
+    # поэтому откат миграции запрещен: без обратной функции RunPython необратима
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='statstudent',
+            unique_together={('student', 'subject_ref', 'grade', 'date')},
+        ),
+        migrations.RemoveField(model_name='statstudent', name='name'),
+        migrations.RemoveField(model_name='statstudent', name='subject'),
+        migrations.RemoveField(model_name='statstudent', name='teacher'),
+        migrations.RemoveField(model_name='statstudent', name='cafedra'),
+        migrations.RenameField(model_name='statstudent', old_name='subject_ref', new_name='subject'),
+        migrations.RenameField(model_name='statstudent', old_name='teacher_ref', new_name='teacher'),
+        migrations.RenameField(model_name='statstudent', old_name='cafedra_ref', new_name='cafedra'),
+        migrations.AlterField(
+            model_name='statstudent',
+            name='student',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='grades', to='studStat.student', verbose_name='Студент'),
+        ),
+        migrations.AlterField(
+            model_name='statstudent',
+            name='subject',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='grades', to='studStat.subject', verbose_name='Предмет'),
+        ),
+        migrations.AlterField(
+            model_name='statstudent',
+            name='teacher',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='grades', to='studStat.teacher', verbose_name='Преподаватель'),
+        ),
+        migrations.AlterField(
+            model_name='statstudent',
+            name='cafedra',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='grades', to='studStat.cafedra', verbose_name='Кафедра'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
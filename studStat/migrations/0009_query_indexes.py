@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-18 15:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studStat', '0008_remove_text_columns'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='statstudent',
+            index=models.Index(fields=['-date', '-id'], name='studstat_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='statstudent',
+            index=models.Index(fields=['grade'], name='studstat_grade_idx'),
+        ),
+    ]
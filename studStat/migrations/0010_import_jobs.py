@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studStat', '0009_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Завершено'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('rows_processed', models.IntegerField(default=0, verbose_name='Обработано оценок')),
+                ('rows_created', models.IntegerField(default=0, verbose_name='Добавлено')),
+                ('rows_skipped', models.IntegerField(default=0, verbose_name='Дубликатов')),
+                ('rows_invalid', models.IntegerField(default=0, verbose_name='Некорректных')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начато')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершено')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='Последний отчет обработчика')),
+            ],
+            options={
+                'verbose_name': 'Задача импорта',
+                'verbose_name_plural': 'Задачи импорта',
+                'db_table': 'studstat_import_job',
+                'indexes': [models.Index(fields=['status', 'id'], name='import_job_status_idx')],
+            },
+        ),
+    ]
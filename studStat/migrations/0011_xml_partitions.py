@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-18 16:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studStat', '0010_import_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='XMLPartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.CharField(max_length=7, verbose_name='Месяц')),
+                ('cafedra', models.CharField(blank=True, max_length=100, verbose_name='Кафедра')),
+                ('path', models.CharField(max_length=255, unique=True, verbose_name='Файл секции')),
+                ('records_count', models.IntegerField(default=0, verbose_name='Количество оценок')),
+                ('date_from', models.DateField(blank=True, null=True, verbose_name='Первая дата')),
+                ('date_to', models.DateField(blank=True, null=True, verbose_name='Последняя дата')),
+                ('subjects', models.JSONField(blank=True, default=list, verbose_name='Предметы')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Секция XML хранилища',
+                'verbose_name_plural': 'Секции XML хранилища',
+                'db_table': 'xml_partition',
+                'ordering': ['month', 'cafedra'],
+                'unique_together': {('month', 'cafedra')},
+            },
+        ),
+    ]
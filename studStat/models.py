@@ -1,18 +1,174 @@
 from django.db import models
 
+# Справочники: студенты, предметы, преподаватели и кафедры хранятся один раз,
+# оценки ссылаются на них по целочисленным ключам
+class Student(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name='ФИО студента')
+
+    class Meta:
+        db_table = 'studstat_student'
+        verbose_name = 'Студент'
+        verbose_name_plural = 'Студенты'
+
+    def __str__(self):
+        return self.name
+
+
+class Subject(models.Model):
+    name = models.CharField(max_length=20, unique=True, verbose_name='Предмет')
+
+    class Meta:
+        db_table = 'studstat_subject'
+        verbose_name = 'Предмет'
+        verbose_name_plural = 'Предметы'
+
+    def __str__(self):
+        return self.name
+
+
+class Teacher(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name='Преподаватель')
+
+    class Meta:
+        db_table = 'studstat_teacher'
+        verbose_name = 'Преподаватель'
+        verbose_name_plural = 'Преподаватели'
+
+    def __str__(self):
+        return self.name
+
+
+class Cafedra(models.Model):
+    name = models.CharField(max_length=100, unique=True, verbose_name='Кафедра')
+
+    class Meta:
+        db_table = 'studstat_cafedra'
+        verbose_name = 'Кафедра'
+        verbose_name_plural = 'Кафедры'
+
+    def __str__(self):
+        return self.name
+
+
 class StatStudent(models.Model):
-    name = models.CharField(max_length=100, verbose_name='ФИО студента')
-    subject = models.CharField(max_length=20, verbose_name='Предмет')
+    student = models.ForeignKey(Student, on_delete=models.PROTECT, related_name='grades', verbose_name='Студент')
+    subject = models.ForeignKey(Subject, on_delete=models.PROTECT, related_name='grades', verbose_name='Предмет')
     grade = models.CharField(max_length=20, verbose_name='Оценка')
     date = models.DateField(verbose_name='Дата оценки')
-    teacher = models.CharField(blank=True, null=True, max_length=100, verbose_name='Преподаватель')
-    cafedra = models.CharField(blank=True, null=True, max_length=100, verbose_name='Кафедра')
+    teacher = models.ForeignKey(Teacher, blank=True, null=True, on_delete=models.PROTECT, related_name='grades', verbose_name='Преподаватель')
+    cafedra = models.ForeignKey(Cafedra, blank=True, null=True, on_delete=models.PROTECT, related_name='grades', verbose_name='Кафедра')
     
     class Meta: #метаданные таблицы
         db_table = 'studstat'
         verbose_name = 'Оценка'
         verbose_name_plural = 'Оценки'
-        unique_together = ['name', 'subject', 'grade', 'date']  # Для проверки дубликатов
+        unique_together = ['student', 'subject', 'grade', 'date']  # Для проверки дубликатов
+        indexes = [
+            models.Index(fields=['-date', '-id'], name='studstat_date_id_idx'),  # списки и страницы по дате
+            models.Index(fields=['grade'], name='studstat_grade_idx'),  # поиск по оценке
+        ]
     
+    # ФИО студента (как до выноса студентов в справочник)
+    @property
+    def name(self):
+        return self.student.name
+
+    def __str__(self):
+        return self.name
+
+
+class XMLFileManifest(models.Model):
+    filename = models.CharField(max_length=255, unique=True, verbose_name='Имя файла')
+    size = models.BigIntegerField(verbose_name='Размер, байт')
+    mtime_ns = models.BigIntegerField(verbose_name='Время изменения, нс')
+    checksum = models.CharField(max_length=64, verbose_name='SHA-256')
+    is_valid = models.BooleanField(default=False, verbose_name='Валидный XML')
+    records_count = models.IntegerField(default=0, verbose_name='Количество оценок')
+    date_from = models.DateField(blank=True, null=True, verbose_name='Первая дата')
+    date_to = models.DateField(blank=True, null=True, verbose_name='Последняя дата')
+    cafedras = models.JSONField(default=list, blank=True, verbose_name='Кафедры')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        db_table = 'xml_manifest'
+        verbose_name = 'XML файл'
+        verbose_name_plural = 'XML файлы'
+        ordering = ['filename']
+
+    def __str__(self):
+        return self.filename
+
+
+class GradeSummary(models.Model):
+    DIMENSION_CHOICES = [
+        ('student', 'Студент'),
+        ('subject', 'Предмет'),
+        ('cafedra', 'Кафедра'),
+    ]
+
+    dimension = models.CharField(max_length=10, choices=DIMENSION_CHOICES, verbose_name='Группировка')
+    value = models.CharField(max_length=100, verbose_name='Значение')
+    grade = models.CharField(max_length=20, verbose_name='Оценка')
+    count = models.IntegerField(default=0, verbose_name='Количество')
+
+    class Meta:
+        db_table = 'studstat_summary'
+        verbose_name = 'Сводка по оценкам'
+        verbose_name_plural = 'Сводки по оценкам'
+        unique_together = ['dimension', 'value', 'grade']
+
+    def __str__(self):
+        return f'{self.dimension}: {self.value} ({self.grade})'
+
+
+class ImportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Завершено'),
+        ('failed', 'Ошибка'),
+    ]
+
+    filename = models.CharField(max_length=255, verbose_name='Имя файла')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='Статус')
+    rows_processed = models.IntegerField(default=0, verbose_name='Обработано оценок')
+    rows_created = models.IntegerField(default=0, verbose_name='Добавлено')
+    rows_skipped = models.IntegerField(default=0, verbose_name='Дубликатов')
+    rows_invalid = models.IntegerField(default=0, verbose_name='Некорректных')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Создано')
+    started_at = models.DateTimeField(blank=True, null=True, verbose_name='Начато')
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name='Завершено')
+    heartbeat_at = models.DateTimeField(blank=True, null=True, verbose_name='Последний отчет обработчика')
+
+    class Meta:
+        db_table = 'studstat_import_job'
+        verbose_name = 'Задача импорта'
+        verbose_name_plural = 'Задачи импорта'
+        indexes = [
+            models.Index(fields=['status', 'id'], name='import_job_status_idx'),  # выбор следующей задачи
+        ]
+
+    def __str__(self):
+        return f'{self.filename} ({self.status})'
+
+
+class XMLPartition(models.Model):
+    month = models.CharField(max_length=7, verbose_name='Месяц')  # 'ГГГГ-ММ', '' - дата не распознана
+    cafedra = models.CharField(max_length=100, blank=True, verbose_name='Кафедра')
+    path = models.CharField(max_length=255, unique=True, verbose_name='Файл секции')
+    records_count = models.IntegerField(default=0, verbose_name='Количество оценок')
+    date_from = models.DateField(blank=True, null=True, verbose_name='Первая дата')
+    date_to = models.DateField(blank=True, null=True, verbose_name='Последняя дата')
+    subjects = models.JSONField(default=list, blank=True, verbose_name='Предметы')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Обновлено')
+
+    class Meta:
+        db_table = 'xml_partition'
+        verbose_name = 'Секция XML хранилища'
+        verbose_name_plural = 'Секции XML хранилища'
+        unique_together = ['month', 'cafedra']
+        ordering = ['month', 'cafedra']
+
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.path
@@ -0,0 +1,206 @@
+import re
+import calendar
+import datetime
+from django.db import connection, models
+from django.db.models.expressions import RawSQL
+from .models import StatStudent, Student, Subject, Teacher, Cafedra
+
+# Поиск по оценкам.
+# Текстовые слова ищутся в небольших справочниках (студенты, предметы, преподаватели,
+# кафедры; в PostgreSQL - по триграммным GIN индексам из миграции 0008, в SQLite -
+# по FTS5 таблицам с триграммным токенизатором, ensure_sqlite_search_index), после чего
+# оценки отбираются по целочисленным внешним ключам.
+
+SEARCH_DIMENSIONS = (
+    ('student', Student),
+    ('subject', Subject),
+    ('teacher', Teacher),
+    ('cafedra', Cafedra),
+)
+STATSTUDENT_RELATED = ('student', 'subject', 'teacher', 'cafedra')
+
+# Если слово подходит к большему числу записей справочника, ключи не выгружаются
+# в запрос списком, а передаются подзапросом
+DIMENSION_MATCH_LIMIT = 1000
+
+# Минимальная длина слова, которое может обслужить триграммный индекс
+MIN_TRIGRAM_LENGTH = 3
+
+GRADE_PATTERN = re.compile(r'^([1-5]|\d-\d|[A-F]|зачет|незачет)$', re.IGNORECASE)
+
+DATE_PATTERNS = (
+    (re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})$'), ('year', 'month', 'day')),
+    (re.compile(r'^(\d{1,2})\.(\d{1,2})\.(\d{4})$'), ('day', 'month', 'year')),
+    (re.compile(r'^(\d{4})-(\d{1,2})$'), ('year', 'month')),
+    (re.compile(r'^(\d{1,2})\.(\d{4})$'), ('month', 'year')),
+    (re.compile(r'^((?:19|20)\d{2})$'), ('year',)),
+)
+
+# Распознает дату, месяц или год и возвращает диапазон дат (или None)
+def parse_date_term(term):
+    for pattern, parts in DATE_PATTERNS:
+        match = pattern.match(term)
+        if not match:
+            continue
+        values = dict(zip(parts, map(int, match.groups())))
+        try:
+            if 'day' in values:
+                date = datetime.date(values['year'], values['month'], values['day'])
+                return date, date
+            if 'month' in values:
+                last_day = calendar.monthrange(values['year'], values['month'])[1]
+                return (datetime.date(values['year'], values['month'], 1),
+                        datetime.date(values['year'], values['month'], last_day))
+            return datetime.date(values['year'], 1, 1), datetime.date(values['year'], 12, 31)
+        except (ValueError, calendar.IllegalMonthError):
+            return None
+    return None
+
+# Разбирает строку поиска на текстовые слова и диапазоны дат
+def parse_search_query(query):
+    terms, date_ranges = [], []
+    for term in query.split():
+        date_range = parse_date_term(term)
+        if date_range:
+            date_ranges.append(date_range)
+        else:
+            terms.append(term)
+    return terms, date_ranges
+
+# FTS5 таблица справочника в SQLite
+def fts_table(model):
+    return f'{model._meta.db_table}_fts'
+
+# Строка запроса FTS5: каждое слово в кавычках, слова объединяются через AND
+def fts_match_expression(terms):
+    return ' '.join('"%s"' % term.replace('"', '""') for term in terms)
+
+def uses_sqlite_fts(term):
+    return connection.vendor == 'sqlite' and len(term) >= MIN_TRIGRAM_LENGTH
+
+# Ключи записей справочника, в имени которых есть слово (запрос без выполнения)
+def dimension_matches(model, term):
+    if uses_sqlite_fts(term):
+        ensure_sqlite_search_index()
+        table = fts_table(model)
+        return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [fts_match_expression([term])])
+    return model.objects.filter(name__icontains=term).values_list('id', flat=True)
+
+# Первые limit ключей из dimension_matches
+def fetch_ids(matches, limit):
+    if isinstance(matches, RawSQL):
+        with connection.cursor() as cursor:
+            cursor.execute(f'{matches.sql} LIMIT {int(limit)}', matches.params)
+            return [row[0] for row in cursor.fetchall()]
+    return list(matches[:limit])
+
+# Условие для одного слова: подстрока в именах справочников или оценка
+def term_q(term):
+    q = models.Q()
+    if GRADE_PATTERN.match(term):
+        q |= models.Q(grade__in={term, term.lower(), term.upper()})
+    for field, model in SEARCH_DIMENSIONS:
+        matches = dimension_matches(model, term)
+        ids = fetch_ids(matches, DIMENSION_MATCH_LIMIT + 1)
+        if len(ids) > DIMENSION_MATCH_LIMIT:
+            q |= models.Q(**{f'{field}__in': matches})
+        elif ids:
+            q |= models.Q(**{f'{field}__in': ids})
+    return q
+
+# Фильтрует оценки по строке поиска (все слова должны найтись)
+def search_statstudent(query, queryset=None):
+    if queryset is None:
+        queryset = StatStudent.objects.select_related(*STATSTUDENT_RELATED)
+
+    terms, date_ranges = parse_search_query(query)
+    for start, end in date_ranges:
+        queryset = queryset.filter(date__range=(start, end))
+
+    for term in terms:
+        q = term_q(term)
+        if not q:
+            return queryset.none()
+        queryset = queryset.filter(q)
+
+    return queryset
+
+# Упорядочивает результаты поиска по релевантности (поле rank)
+def rank_search_results(queryset, query):
+    terms, _ = parse_search_query(query)
+    if not terms:
+        return queryset.annotate(rank=models.Value(0.0, output_field=models.FloatField())).order_by('-date', '-id')
+
+    text = ' '.join(terms)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models.functions import Coalesce, Greatest
+        rank = Greatest(*[
+            Coalesce(TrigramWordSimilarity(text, f'{field}__name'), 0.0) for field, _ in SEARCH_DIMENSIONS
+        ])
+    else:
+        # Без pg_trgm: совпадение с началом ФИО важнее вхождения в середину
+        rank = models.Case(
+            models.When(student__name__istartswith=terms[0], then=models.Value(2.0)),
+            models.When(student__name__icontains=terms[0], then=models.Value(1.0)),
+            default=models.Value(0.0),
+            output_field=models.FloatField(),
+        )
+
+    return queryset.annotate(rank=rank).order_by('-rank', '-date', '-id')
+
+SQLITE_FTS_TRIGGERS = {
+    'ai': '''
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name);
+        END''',
+    'ad': '''
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name);
+        END''',
+    'au': '''
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} BEGIN
+            INSERT INTO {fts}({fts}, rowid, name) VALUES ('delete', old.id, old.name);
+            INSERT INTO {fts}(rowid, name) VALUES (new.id, new.name);
+        END''',
+}
+
+_sqlite_index_ready = False
+
+# Создает FTS5 таблицы справочников и триггеры в SQLite, если их нет.
+# Django пересоздает таблицы в SQLite при изменении схемы и теряет триггеры,
+# поэтому недостающие триггеры восстанавливаются вместе с переиндексацией
+def ensure_sqlite_search_index(conn=None):
+    global _sqlite_index_ready
+    if conn is None:
+        if _sqlite_index_ready:
+            return
+        conn = connection
+    if conn.vendor != 'sqlite':
+        return
+
+    with conn.cursor() as cursor:
+        for _, model in SEARCH_DIMENSIONS:
+            table, fts = model._meta.db_table, fts_table(model)
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE name = %s OR (type = 'trigger' AND name LIKE %s)",
+                [fts, f'{fts}_%']
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if {fts, *(f'{fts}_{suffix}' for suffix in SQLITE_FTS_TRIGGERS)} <= existing:
+                continue
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"name, content='{table}', content_rowid='id', tokenize='trigram')"
+            )
+            for sql in SQLITE_FTS_TRIGGERS.values():
+                cursor.execute(sql.format(fts=fts, table=table))
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+    if conn is connection:
+        _sqlite_index_ready = True
+
+# Обработчик post_migrate: восстанавливает поисковый индекс SQLite после миграций
+def install_search_index(sender, using, **kwargs):
+    from django.db import connections
+    ensure_sqlite_search_index(connections[using])
@@ -0,0 +1,123 @@
+from collections import Counter
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Coalesce
+from .models import StatStudent, GradeSummary
+
+# Сводные таблицы по оценкам (studstat_summary).
+# Одиночные записи меняют счетчики на +-1, пакетные загрузки прибавляют к группам
+# число созданных в пачке оценок, поэтому ни чтение статистики, ни загрузка не
+# сканируют studstat. Полный пересчет - команда rebuild_grade_summary.
+
+# Группировка -> ключ в словаре оценки (атрибут StatStudent)
+SUMMARY_DIMENSIONS = {
+    'student': 'name',
+    'subject': 'subject',
+    'cafedra': 'cafedra',
+}
+
+# Группировка -> путь к имени в справочнике для запросов к StatStudent
+SUMMARY_LOOKUPS = {
+    'student': 'student__name',
+    'subject': 'subject__name',
+    'cafedra': 'cafedra__name',
+}
+
+
+def get_value(row, field):
+    value = row.get(field) if isinstance(row, dict) else getattr(row, field)
+    if isinstance(value, models.Model):
+        value = str(value)
+    return value or ''
+
+# Значения групп оценки: {'student': ..., 'subject': ..., 'cafedra': ...}
+def summary_keys(row):
+    return {dimension: get_value(row, field) for dimension, field in SUMMARY_DIMENSIONS.items()}
+
+# Копия полей оценки, влияющих на сводку (до изменения объекта формой)
+def summary_snapshot(row):
+    return {field: get_value(row, field) for field in (*SUMMARY_DIMENSIONS.values(), 'grade')}
+
+# Увеличивает счетчик группы на count. Первая оценка группы создает строку сводки
+# в точке сохранения: если параллельный запрос успел создать ту же группу, откатывается
+# только вставка, внешняя транзакция продолжается, и счетчик увеличивается повторным UPDATE
+def add_summary_count(dimension, value, grade, count):
+    lookup = {'dimension': dimension, 'value': value, 'grade': grade}
+    if GradeSummary.objects.filter(**lookup).update(count=F('count') + count) or count <= 0:
+        return
+    try:
+        with transaction.atomic():
+            GradeSummary.objects.create(count=count, **lookup)
+    except IntegrityError:
+        GradeSummary.objects.filter(**lookup).update(count=F('count') + count)
+
+# Изменяет счетчики для одной оценки на sign (+1 при добавлении, -1 при удалении)
+def apply_summary_delta(row, sign):
+    grade = get_value(row, 'grade')
+    with transaction.atomic():
+        for dimension, value in summary_keys(row).items():
+            add_summary_count(dimension, value, grade, sign)
+            if sign < 0:
+                GradeSummary.objects.filter(dimension=dimension, value=value, grade=grade, count__lte=0).delete()
+
+# Учет изменения оценки: старые значения уходят из сводки, новые добавляются
+def apply_summary_change(old_row, new_row):
+    if summary_snapshot(old_row) == summary_snapshot(new_row):
+        return
+    with transaction.atomic():
+        apply_summary_delta(old_row, -1)
+        apply_summary_delta(new_row, +1)
+
+# Групп в одном INSERT сводки
+SUMMARY_UPSERT_ROWS = 1000
+
+# Добавляет в сводку пачку созданных оценок без пересчета групп по studstat:
+# INSERT ... ON CONFLICT DO UPDATE прибавляет к каждой затронутой группе число ее
+# новых оценок (одна инструкция на SUMMARY_UPSERT_ROWS групп, работает в SQLite и PostgreSQL)
+def apply_summary_counts(rows):
+    counts = Counter(
+        (dimension, value, get_value(row, 'grade'))
+        for row in rows
+        for dimension, value in summary_keys(row).items()
+    )
+    groups = [(*key, count) for key, count in counts.items()]
+    table = GradeSummary._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(groups), SUMMARY_UPSERT_ROWS):
+            part = groups[start:start + SUMMARY_UPSERT_ROWS]
+            cursor.execute(
+                f'INSERT INTO {table} (dimension, value, grade, count) '
+                f"VALUES {', '.join(['(%s, %s, %s, %s)'] * len(part))} "
+                f'ON CONFLICT (dimension, value, grade) DO UPDATE SET count = {table}.count + excluded.count',
+                [value for group in part for value in group]
+            )
+
+# Пересчитывает одну группировку по studstat (команда rebuild_grade_summary)
+def rebuild_dimension(dimension):
+    lookup = SUMMARY_LOOKUPS[dimension]
+    grades = StatStudent.objects.annotate(group_value=Coalesce(lookup, Value('')))
+    GradeSummary.objects.filter(dimension=dimension).delete()
+    GradeSummary.objects.bulk_create(
+        GradeSummary(dimension=dimension, value=row['group_value'], grade=row['grade'], count=row['count'])
+        for row in grades.values('group_value', 'grade').annotate(count=Count('id')).order_by()
+    )
+
+# Полный пересчет всех сводных таблиц
+def rebuild_grade_summary():
+    with transaction.atomic():
+        for dimension in SUMMARY_DIMENSIONS:
+            rebuild_dimension(dimension)
+
+# Статистика по группам: [{'value', 'total', 'grades': {оценка: количество}}], по убыванию total
+def get_grade_stats(dimension, value=None):
+    summary = GradeSummary.objects.filter(dimension=dimension)
+    if value is not None:
+        summary = summary.filter(value=value)
+
+    groups = {}
+    for row in summary.values('value', 'grade', 'count'):
+        group = groups.setdefault(row['value'], {'value': row['value'], 'total': 0, 'grades': {}})
+        group['grades'][row['grade']] = row['count']
+        group['total'] += row['count']
+
+    return sorted(groups.values(), key=lambda group: (-group['total'], group['value']))
@@ -0,0 +1,95 @@
+import bisect
+import threading
+from .dimensions import DIMENSIONS, dimension_version_source
+from .versions import get_data_version
+
+# Подсказки для строки поиска из памяти процесса.
+# Для каждого справочника (студенты, предметы, преподаватели, кафедры) хранятся
+# отсортированные массивы ключей: имя целиком и имя с каждого следующего слова
+# ("петров иван иванович", "иван иванович", "иванович"). Поиск по префиксу - bisect
+# и просмотр не более limit соседних элементов, без обращения к БД.
+# Индекс строится при первом запросе и перестраивается, когда меняется версия
+# справочника (в справочник добавлены новые имена в любом процессе).
+
+MAX_SUGGESTION_LIMIT = 50
+
+
+def normalize(text):
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+class PrefixIndex:
+    def __init__(self, names):
+        full, words = [], []
+        for name in set(names):
+            key = normalize(name)
+            full.append((key, name))
+            parts = key.split(' ')
+            for i in range(1, len(parts)):
+                words.append((' '.join(parts[i:]), name))
+        full.sort()
+        words.sort()
+        self.full = full
+        self.full_keys = [key for key, _ in full]
+        self.words = words
+        self.word_keys = [key for key, _ in words]
+
+    def __len__(self):
+        return len(self.full)
+
+    @staticmethod
+    def scan(keys, entries, prefix, limit, seen):
+        found = []
+        for i in range(bisect.bisect_left(keys, prefix), len(keys)):
+            if len(found) >= limit or not keys[i].startswith(prefix):
+                break
+            name = entries[i][1]
+            if name not in seen:
+                seen.add(name)
+                found.append(name)
+        return found
+
+    # Имена, начинающиеся с prefix, затем имена, где с prefix начинается одно из слов
+    def complete(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return [], []
+        seen = set()
+        starts = self.scan(self.full_keys, self.full, prefix, limit, seen)
+        inner = self.scan(self.word_keys, self.words, prefix, limit - len(starts), seen)
+        return starts, inner
+
+
+class SuggestionIndex:
+    def __init__(self):
+        self.indexes = {}  # ключ справочника -> (версия, PrefixIndex)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        field, model = DIMENSIONS[key]
+        version = get_data_version(dimension_version_source(model))
+        entry = self.indexes.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self.lock:
+            entry = self.indexes.get(key)
+            if entry is None or entry[0] != version:
+                entry = (version, PrefixIndex(model.objects.values_list('name', flat=True).iterator()))
+                self.indexes[key] = entry
+        return entry[1]
+
+    # Подсказки по всем справочникам (или только по fields): сначала совпадения с начала имени
+    def suggest(self, query, limit=10, fields=None):
+        starts, inner = [], []
+        for key in fields or DIMENSIONS:
+            key_starts, key_inner = self.get(key).complete(query, limit)
+            starts.extend({'field': key, 'value': name} for name in key_starts)
+            inner.extend({'field': key, 'value': name} for name in key_inner)
+        return (starts + inner)[:limit]
+
+    def clear(self):
+        with self.lock:
+            self.indexes.clear()
+
+
+suggestion_index = SuggestionIndex()
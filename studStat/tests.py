@@ -1,3 +1,403 @@
-from django.test import TestCase
+import io
+import os
+import re
+import json
+import shutil
+import sqlite3
+import datetime
+import tempfile
+from contextlib import redirect_stdout
+from unittest import mock
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils.http import http_date
+from .downloads import parse_range
+from .ingest import ingest_grades
+from .models import GradeSummary, StatStudent, Student, Subject, XMLPartition
+from .search import search_statstudent
+from .stats import rebuild_grade_summary
+from .utils import (
+    GRADES_XML_FILENAME, ensure_grades_dir, get_all_statstudent_from_db, import_grades_to_db, insert_grades_on_conflict,
+    iter_grades_from_xml, paginate_statstudent, save_statstudent_to_db, update_xml_manifest, write_grades_xml_file
+)
+from .xml_cache import file_cache_key, xml_parse_cache
+from .xml_index import IndexUnit, XMLSearchIndex
+from .xml_store import (
+    append_grades_to_partitions, get_all_grades_from_xml, partition_file_paths, partition_legacy_grades_xml,
+    save_grade_to_xml
+)
 
-# Create your tests here.
+
+def grade(name, subject='Математика', value='5', date='2024-01-15', teacher='Петров П.П.', cafedra='Информатики'):
+    return {'name': name, 'subject': subject, 'grade': value, 'date': date, 'teacher': teacher, 'cafedra': cafedra}
+
+
+# Временная MEDIA_ROOT (XML файлы и версии данных) и пустые кэши процесса для каждого теста
+class MediaTestCase(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp(prefix='studstat_test_')
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=self.media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        cache.clear()
+        xml_parse_cache.clear()
+        self.addCleanup(xml_parse_cache.clear)
+
+
+# Планы горячих запросов (команда explain_queries) не должны сканировать studstat целиком.
+# Таблица заполняется объемом, на котором последовательное сканирование заметно дороже
+# индекса, а статистика собирается ANALYZE: планировщик выбирает индекс сам
+class QueryPlanTests(TestCase):
+    seed = 20000
+
+    def test_hot_queries_use_indexes(self):
+        output = io.StringIO()
+        call_command('explain_queries', seed=self.seed, stdout=output)
+        # Синтетические данные дают немного дубликатов, которые не добавляются
+        created = int(re.search(r'Добавлено (\d+) оценок', output.getvalue()).group(1))
+        self.assertGreater(created, self.seed * 0.99)
+        self.assertIn('Все запросы используют индексы', output.getvalue())
+
+
+# Keyset-пагинация по (date, id): страницы без пропусков и повторов в обе стороны
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        # Несколько оценок в один день: порядок внутри дня задает id
+        import_grades_to_db(
+            grade(f'Студент {i}', date=f'2024-01-{10 + i // 3:02d}') for i in range(8)
+        )
+        self.expected = list(StatStudent.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+    def test_next_cursors_walk_all_rows(self):
+        ids, after = [], None
+        while True:
+            page = paginate_statstudent(get_all_statstudent_from_db(), after=after, page_size=3)
+            ids.extend(row.id for row in page['grades'])
+            after = page['next_cursor']
+            if after is None:
+                break
+        self.assertEqual(ids, self.expected)
+
+    def test_prev_cursor_returns_previous_page(self):
+        first = paginate_statstudent(get_all_statstudent_from_db(), page_size=3)
+        second = paginate_statstudent(get_all_statstudent_from_db(), after=first['next_cursor'], page_size=3)
+        back = paginate_statstudent(get_all_statstudent_from_db(), before=second['prev_cursor'], page_size=3)
+        self.assertIsNone(first['prev_cursor'])
+        self.assertEqual([row.id for row in back['grades']], [row.id for row in first['grades']])
+        self.assertEqual(back['next_cursor'], first['next_cursor'])
+
+    def test_invalid_cursor_gives_first_page(self):
+        page = paginate_statstudent(get_all_statstudent_from_db(), after='не-курсор', page_size=3)
+        self.assertEqual([row.id for row in page['grades']], self.expected[:3])
+
+    def test_grades_list_page(self):
+        first = paginate_statstudent(get_all_statstudent_from_db(), page_size=3)
+        response = self.client.get('/grades/', {'page_size': 3, 'after': first['next_cursor']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row.id for row in response.context['page']['grades']], self.expected[3:6])
+
+
+# Поиск по справочникам (в SQLite - через FTS5 таблицы, которые обновляют триггеры)
+class SearchTests(TestCase):
+    def setUp(self):
+        import_grades_to_db([
+            grade('Петров Петр', subject='Физика', teacher=''),
+            grade('Иванова Анна', subject='Математика', teacher='Сидоров С.С.'),
+        ])
+
+    def names(self, query):
+        return sorted(search_statstudent(query).values_list('student__name', flat=True))
+
+    def test_case_insensitive_substring(self):
+        self.assertEqual(self.names('петров'), ['Петров Петр'])
+        self.assertEqual(self.names('ВАНОВ'), ['Иванова Анна'])
+        self.assertEqual(self.names('сидор матем'), ['Иванова Анна'])
+        self.assertEqual(self.names('Пе'), ['Петров Петр'])
+        self.assertEqual(self.names('Физика 2024-01'), ['Петров Петр'])
+        self.assertEqual(self.names('Физика 2023'), [])
+
+    def test_index_follows_dimension_changes(self):
+        Subject.objects.filter(name='Физика').update(name='Астрономия')
+        self.assertEqual(self.names('физика'), [])
+        self.assertEqual(self.names('астроном'), ['Петров Петр'])
+
+        StatStudent.objects.filter(student__name='Петров Петр').delete()
+        Student.objects.filter(name='Петров Петр').delete()
+        self.assertEqual(self.names('петров'), [])
+        Student.objects.create(name='Петрова Ольга')
+        self.assertEqual(search_statstudent('петров').count(), 0)
+
+
+# Сводные таблицы должны совпадать с полным пересчетом после любых изменений оценок
+class GradeSummaryTests(TestCase):
+    def assertSummaryConsistent(self):
+        counts = sorted(GradeSummary.objects.values_list('dimension', 'value', 'grade', 'count'))
+        rebuild_grade_summary()
+        self.assertEqual(counts, sorted(GradeSummary.objects.values_list('dimension', 'value', 'grade', 'count')))
+
+    def summary_count(self, dimension, value, grade_value='5'):
+        row = GradeSummary.objects.filter(dimension=dimension, value=value, grade=grade_value).first()
+        return row.count if row else 0
+
+    def test_save(self):
+        save_statstudent_to_db(grade('Иванов Иван', date=datetime.date(2024, 1, 15)))
+        save_statstudent_to_db(grade('Петров Петр', date=datetime.date(2024, 1, 15)))
+        self.assertEqual(self.summary_count('subject', 'Математика'), 2)
+        self.assertSummaryConsistent()
+
+    def test_edit(self):
+        save_statstudent_to_db(grade('Иванов Иван', date=datetime.date(2024, 1, 15)))
+        statstudent = StatStudent.objects.get()
+        response = self.client.post(f'/edit/{statstudent.id}/', grade('Иванов Иван', subject='Физика', value='4'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.summary_count('subject', 'Математика'), 0)
+        self.assertEqual(self.summary_count('subject', 'Физика', '4'), 1)
+        self.assertSummaryConsistent()
+
+    def test_delete(self):
+        save_statstudent_to_db(grade('Иванов Иван', date=datetime.date(2024, 1, 15)))
+        statstudent = StatStudent.objects.get()
+        self.client.post(f'/delete/{statstudent.id}/')
+        self.assertFalse(GradeSummary.objects.exists())
+        self.assertSummaryConsistent()
+
+    def test_bulk_import_counts_only_created_rows(self):
+        grades = [grade(f'Студент {i}', value=str(2 + i % 4)) for i in range(20)]
+        stats = import_grades_to_db(grades, batch_size=7)
+        self.assertEqual((stats['created'], stats['skipped']), (20, 0))
+        stats = import_grades_to_db(grades + [grade('Новый Студент')], batch_size=7)
+        self.assertEqual((stats['created'], stats['skipped']), (1, 20))
+        self.assertEqual(sum(self.summary_count('subject', 'Математика', str(v)) for v in range(2, 6)), 21)
+        self.assertSummaryConsistent()
+
+
+# Пакетный прием /api/grades/: результат по каждой записи и проверка токена
+@override_settings(GRADES_API_TOKEN='secret')
+class IngestAPITests(TestCase):
+    def post(self, body, content_type='application/json', token='secret'):
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        return self.client.post('/api/grades/', body, content_type=content_type, **headers)
+
+    def test_results_per_record(self):
+        records = [grade('Иванов Иван'), grade('Иванов Иван'), grade(''), 'не объект', grade('Петров Петр')]
+        response = self.post(json.dumps(records))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([result['status'] for result in data['results']],
+                         ['created', 'duplicate', 'invalid', 'invalid', 'created'])
+        self.assertEqual([result['index'] for result in data['results']], list(range(5)))
+        self.assertIn('name', data['results'][2]['errors'])
+        self.assertEqual((data['created'], data['duplicates'], data['invalid']), (2, 1, 2))
+        self.assertEqual(StatStudent.objects.count(), 2)
+        self.assertEqual(GradeSummary.objects.get(dimension='subject', value='Математика').count, 2)
+
+    def test_ndjson(self):
+        body = '\n'.join([json.dumps(grade('Иванов Иван')), '{сломанная строка', ''])
+        data = self.post(body, content_type='application/x-ndjson').json()
+        self.assertEqual([result['status'] for result in data['results']], ['created', 'invalid'])
+        self.assertRegex(data['results'][1]['errors']['__all__'][0], r'^Строка 2: некорректный JSON: ')
+
+    # Пачка больше предела строк одного INSERT пишется частями, порядок результатов сохраняется
+    @mock.patch('studStat.ingest.INSERT_ROWS_PER_STATEMENT', 2)
+    def test_chunk_split_into_statements(self):
+        records = [grade(f'Студент {letter}') for letter in 'АБВГД'] + [grade('Студент А')]
+        with mock.patch('studStat.ingest.insert_grades_on_conflict', wraps=insert_grades_on_conflict) as insert:
+            data = ingest_grades(records, chunk_size=10)
+        self.assertEqual([len(call.args[0]) for call in insert.call_args_list], [2, 2, 2])
+        self.assertEqual([result['status'] for result in data['results']], ['created'] * 5 + ['duplicate'])
+        self.assertEqual(StatStudent.objects.count(), 5)
+        self.assertEqual(GradeSummary.objects.get(dimension='subject', value='Математика').count, 5)
+
+    def test_wrong_token(self):
+        self.assertEqual(self.post('[]', token='wrong').status_code, 401)
+        self.assertEqual(self.post('[]', token=None).status_code, 401)
+
+    @override_settings(GRADES_API_TOKEN=None)
+    def test_disabled_without_token(self):
+        self.assertEqual(self.post(json.dumps([grade('Иванов Иван')])).status_code, 503)
+        self.assertFalse(StatStudent.objects.exists())
+
+
+# Пакетный перенос migrate_data.py: некорректные строки старой базы - ошибки, а не дубликаты
+class MigrateDataTests(MediaTestCase):
+    def migrate(self, rows):
+        import migrate_data
+        sqlite_path = os.path.join(self.media_root, 'legacy.sqlite3')
+        sqlite_conn = sqlite3.connect(sqlite_path)
+        sqlite_conn.execute(
+            'CREATE TABLE studstat (id INTEGER PRIMARY KEY, name TEXT, subject TEXT, grade TEXT, '
+            'date TEXT, teacher TEXT, cafedra TEXT)'
+        )
+        sqlite_conn.executemany(
+            'INSERT INTO studstat (name, subject, grade, date, teacher, cafedra) VALUES (?, ?, ?, ?, ?, ?)', rows
+        )
+        sqlite_conn.commit()
+        sqlite_conn.close()
+        checkpoint_path = os.path.join(self.media_root, 'checkpoint.json')
+        with redirect_stdout(io.StringIO()):
+            success = migrate_data.migrate_sqlite_to_postgres_batched(
+                batch_size=2, sqlite_path=sqlite_path, checkpoint_path=checkpoint_path
+            )
+        with open(checkpoint_path, encoding='utf-8') as checkpoint_file:
+            return success, json.load(checkpoint_file)
+
+    def test_invalid_rows_counted_as_errors(self):
+        success, checkpoint = self.migrate([
+            (' Иванов Иван ', 'Математика', '5', '2024-01-15', ' ', None),
+            ('Иванов Иван', 'Математика', '5', '2024-01-15', '', ''),
+            ('   ', 'Математика', '4', '2024-01-15', '', ''),
+            ('Петров Петр', '', '4', '2024-01-15', '', ''),
+            ('Петров Петр', 'Физика', '4', 'не дата', '', ''),
+        ])
+        self.assertFalse(success)
+        self.assertEqual((checkpoint['processed'], checkpoint['migrated'], checkpoint['invalid']), (5, 1, 3))
+        self.assertEqual(list(Student.objects.values_list('name', flat=True)), ['Иванов Иван'])
+        statstudent = StatStudent.objects.get()
+        self.assertIsNone(statstudent.teacher_id)
+        self.assertEqual(GradeSummary.objects.get(dimension='student').value, 'Иванов Иван')
+
+
+# Скачивание XML файла: ETag, Range и If-Range
+class DownloadTests(MediaTestCase):
+    filename = 'grades_test.xml'
+
+    def setUp(self):
+        super().setUp()
+        self.file_path = os.path.join(ensure_grades_dir(), self.filename)
+        write_grades_xml_file(self.file_path, [grade(f'Студент {i}') for i in range(20)])
+        update_xml_manifest(self.filename)
+        # Файл изменен заметно раньше ответа: дата Last-Modified - сильный валидатор
+        mtime = os.stat(self.file_path).st_mtime - 60
+        os.utime(self.file_path, (mtime, mtime))
+        with open(self.file_path, 'rb') as file:
+            self.content = file.read()
+        self.url = f'/download/{self.filename}/'
+
+    def test_full_download(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_empty_file_range(self):
+        self.assertEqual(parse_range('bytes=-5', 10), (5, 9))
+        for header in ('bytes=-5', 'bytes=0-', 'bytes=0-0'):
+            with self.subTest(header=header):
+                self.assertIs(parse_range(header, 0), False)
+        self.assertIsNone(parse_range('bytes=0-1,3-4', 0))
+
+    def test_if_range(self):
+        etag = self.client.get(self.url)['ETag']
+        last_modified = os.stat(self.file_path).st_mtime
+        cases = [
+            (etag, 206),
+            ('"другая-версия"', 200),
+            (http_date(last_modified), 206),
+            # Дата новее файла - не точное совпадение, диапазон не отдается
+            (http_date(last_modified + 30), 200),
+            (http_date(last_modified - 30), 200),
+        ]
+        for if_range, status in cases:
+            with self.subTest(if_range=if_range):
+                response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=if_range)
+                self.assertEqual(response.status_code, status)
+
+
+# XML хранилище: запись через журналы секций, слияние журнала и перенос старого grades.xml
+class XMLStoreTests(MediaTestCase):
+    def test_save_and_read_back(self):
+        self.assertTrue(save_grade_to_xml(grade('Иванов Иван', date='2024-02-03')))
+        self.assertTrue(save_grade_to_xml(grade('Петров Петр', date='2024-03-05', cafedra='Физики')))
+
+        partition = XMLPartition.objects.get(month='2024-02')
+        self.assertEqual((partition.cafedra, partition.records_count), ('Информатики', 1))
+        self.assertEqual(partition.subjects, ['Математика'])
+        self.assertEqual({row['name'] for row in get_all_grades_from_xml()}, {'Иванов Иван', 'Петров Петр'})
+
+        grades = get_all_grades_from_xml(date_from=datetime.date(2024, 3, 1), cafedra='Физики')
+        self.assertEqual([row['name'] for row in grades], ['Петров Петр'])
+        self.assertEqual(grades[0]['date'], '2024-03-05')
+
+    @override_settings(GRADES_XML_JOURNAL_MAX_BYTES=1)
+    def test_journal_merged_into_partition_file(self):
+        append_grades_to_partitions([grade(f'Студент {i}') for i in range(3)], flush_rows=1)
+        file_path, journal_path = partition_file_paths(XMLPartition.objects.get())
+        self.assertTrue(os.path.exists(file_path))
+        self.assertFalse(os.path.exists(journal_path) and os.path.getsize(journal_path))
+        self.assertEqual([row['name'] for row in iter_grades_from_xml(file_path)],
+                         ['Студент 0', 'Студент 1', 'Студент 2'])
+        self.assertEqual(len(get_all_grades_from_xml()), 3)
+
+    def test_legacy_file_moved_to_partitions(self):
+        legacy_path = os.path.join(ensure_grades_dir(), GRADES_XML_FILENAME)
+        write_grades_xml_file(legacy_path, [grade('Иванов Иван', date='2023-05-01'), grade('Петров Петр')])
+        self.assertEqual(partition_legacy_grades_xml(), 2)
+        self.assertFalse(os.path.exists(legacy_path))
+        self.assertEqual(set(XMLPartition.objects.values_list('month', flat=True)), {'2023-05', '2024-01'})
+        self.assertEqual(len(get_all_grades_from_xml()), 2)
+
+
+# Индекс поиска по XML: файлы читаются через кэш разбора, память ограничена бюджетом
+class XMLSearchIndexTests(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.units = []
+        for name in ('Иванов Иван', 'Петров Петр'):
+            filename = f'grades_{len(self.units)}.xml'
+            file_path = os.path.join(ensure_grades_dir(), filename)
+            write_grades_xml_file(file_path, [grade(name, subject=subject) for subject in ('Математика', 'Физика')])
+            self.units.append(IndexUnit(filename, filename, file_path))
+
+    def test_search_uses_parse_cache(self):
+        index = XMLSearchIndex(1024 * 1024)
+        hits = index.search('иван физ', self.units)
+        self.assertEqual([(filename, hit['name'], hit['subject']) for filename, hit in hits],
+                         [('grades_0.xml', 'Иванов Иван', 'Физика')])
+        self.assertIn(file_cache_key(self.units[0].file_path), xml_parse_cache.entries)
+        self.assertEqual(set(index.entries), {'grades_0.xml', 'grades_1.xml'})
+
+    def test_memory_budget(self):
+        size = XMLSearchIndex(1024 * 1024).get(self.units[0]).size
+        index = XMLSearchIndex(size * 3 // 2)
+        for unit in self.units:
+            index.get(unit)
+        self.assertEqual(list(index.entries), ['grades_1.xml'])
+        self.assertLessEqual(index.current_bytes, index.max_bytes)
+
+        # Индекс больше бюджета строится для запроса, но не сохраняется
+        index = XMLSearchIndex(size // 2)
+        self.assertEqual(len(index.search('иванов', self.units)), 2)
+        self.assertEqual((len(index.entries), index.current_bytes), (0, 0))
+
+
+# Команда benchmark на маленьком объеме: замеры проходят, данные откатываются
+class BenchmarkCommandTests(TestCase):
+    def test_small_run(self):
+        output = io.StringIO()
+        call_command('benchmark', sizes='50', repeat=1, connections=0,
+                     only='grades_list_db,ajax_search,save_grade_to_xml', stdout=output, stderr=io.StringIO())
+        results = json.loads(output.getvalue())
+        self.assertEqual(results['database'], connection.vendor)
+        operations = results['sizes']['50']
+        self.assertEqual(set(operations), {'setup_s', 'grades_list_db', 'ajax_search', 'save_grade_to_xml'})
+        self.assertLessEqual({'min_ms', 'median_ms', 'max_ms'}, set(operations['grades_list_db']))
+        self.assertFalse(StatStudent.objects.exists())
+        self.assertFalse(XMLPartition.objects.exists())
@@ -8,7 +8,16 @@ urlpatterns = [
     path('files/', views.xml_files_list, name='xml_files_list'),
     path('files/<str:filename>/', views.view_xml_file, name='view_xml_file'),
     path('download/<str:filename>/', views.download_xml_file, name='download_xml_file'),
+    path('import/<str:filename>/', views.import_xml_file, name='import_xml_file'),
+    path('jobs/', views.import_jobs, name='import_jobs'),
     path('ajax-search/', views.ajax_search, name='ajax_search'),
+    path('suggest/', views.suggest, name='suggest'),
+    path('export/', views.export_grades, name='export_grades'),
+    path('stats/', views.grade_stats, name='grade_stats'),
+    path('stats/json/', views.grade_stats_json, name='grade_stats_json'),
+    path('analytics/<str:report>/', views.analytics_report, name='analytics_report'),
+    path('api/grades/', views.api_grades, name='api_grades'),
+    path('metrics', views.metrics, name='metrics'),
     path('edit/<int:grade_id>/', views.edit_grade, name='edit_grade'),
     path('delete/<int:grade_id>/', views.delete_grade, name='delete_grade')
 ]
\ No newline at end of file
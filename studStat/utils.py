@@ -1,38 +1,43 @@
 import os
+import gzip
+import lzma
 import uuid
-from django.db import models
+import asyncio
+import contextvars
+import random
+import hashlib
+import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.db import models, connection, transaction, close_old_connections
 import xml.etree.ElementTree as ET
 from django.conf import settings
 from xml.etree.ElementTree import ParseError
-from .models import StatStudent
+from .models import StatStudent, XMLFileManifest
+from .dimensions import DIMENSIONS, resolve_dimension_ids
+from .search import search_statstudent, STATSTUDENT_RELATED
+from .stats import apply_summary_counts, apply_summary_delta
+from .metrics import timed_xml
+from .versions import bump_data_version
+from .xml_cache import xml_parse_cache
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки файлов недоступны
+    fcntl = None
 
 #Data Base
 
 
 def save_statstudent_to_db(statstudent_data):
     try:
-        # Проверяем на дубликат
-        duplicate = StatStudent.objects.filter(
-            name=statstudent_data['name'],
-            subject=statstudent_data['subject'],
-            grade=statstudent_data['grade'],
-            date=statstudent_data['date'],
-            teacher=statstudent_data.get('teacher', ''),
-            cafedra=statstudent_data.get('cafedra', '')
-        ).exists()
-        
-        if duplicate:
-            return False, "Студент уже существует в базе данных"
-        
-        # Создаем новую оценку
-        statstudent = StatStudent.objects.create(
-            name=statstudent_data['name'],
-            subject=statstudent_data['subject'],
-            grade=statstudent_data['grade'],
-            date=statstudent_data['date'],
-            teacher=statstudent_data.get('teacher', ''),
-            cafedra=statstudent_data.get('cafedra', '')
-        )
+        # Вставка с ON CONFLICT: дубликат определяется уникальным индексом без гонки между запросами
+        with transaction.atomic():
+            grade_id, = insert_grades_on_conflict([statstudent_data])
+            if grade_id is None:
+                return False, "Студент уже существует в базе данных"
+            apply_summary_delta(statstudent_data, +1)
         return True, "Оценка успешно сохранена в базу данных"
     
     except Exception as e:
@@ -41,19 +46,147 @@ def save_statstudent_to_db(statstudent_data):
 
 def search_statstudent_in_db(query):
     if not query:
-        return StatStudent.objects.all()
+        return get_all_statstudent_from_db()
     
-    return StatStudent.objects.filter(
-        models.Q(name__istartswith=query) |
-        models.Q(subject__istartswith=query) |
-        models.Q(grade__istartswith=query) |
-        models.Q(date__istartswith=query) |
-        models.Q(teacher__istartswith=query) |
-        models.Q(cafedra__istartswith=query)
-    ).order_by('-date')
+    return search_statstudent(query).order_by('-date', '-id')
 
 def get_all_statstudent_from_db():
-    return StatStudent.objects.all().order_by('-date')
+    return StatStudent.objects.select_related(*STATSTUDENT_RELATED).order_by('-date', '-id')
+
+# Курсор страницы - дата и id граничной записи, например "2024-01-31_125"
+def encode_grade_cursor(statstudent):
+    return f"{statstudent.date.isoformat()}_{statstudent.id}"
+
+def decode_grade_cursor(cursor):
+    try:
+        date, grade_id = cursor.split('_')
+        return datetime.date.fromisoformat(date), int(grade_id)
+    except (AttributeError, ValueError):
+        return None
+
+# Размер страницы из запроса с ограничением сверху
+def get_page_size(value=None):
+    default = getattr(settings, 'GRADES_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'GRADES_MAX_PAGE_SIZE', 500)
+    try:
+        page_size = int(value) if value else default
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+# Быстрая оценка числа строк: статистика PostgreSQL для всей таблицы, иначе COUNT
+def approximate_count(queryset):
+    if connection.vendor == 'postgresql' and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= 0:
+            return row[0]
+    return queryset.count()
+
+# Keyset-пагинация по (date, id) в порядке убывания
+def paginate_statstudent(queryset, after=None, before=None, page_size=None, with_total=False):
+    page_size = get_page_size(page_size)
+    total = approximate_count(queryset) if with_total else None
+    rows_queryset, backwards, after = keyset_page_queryset(queryset, after, before, page_size)
+    return build_grade_page(list(rows_queryset), backwards, after, page_size, total)
+
+# То же для async представлений: строки страницы читаются через async ORM
+async def apaginate_statstudent(queryset, after=None, before=None, page_size=None, with_total=False):
+    page_size = get_page_size(page_size)
+    total = await sync_to_async(approximate_count)(queryset) if with_total else None
+    rows_queryset, backwards, after = keyset_page_queryset(queryset, after, before, page_size)
+    rows = [row async for row in rows_queryset]
+    return build_grade_page(rows, backwards, after, page_size, total)
+
+# Запрос строк страницы (на одну больше page_size, чтобы узнать о следующей странице)
+def keyset_page_queryset(queryset, after, before, page_size):
+    after = decode_grade_cursor(after)
+    before = decode_grade_cursor(before) if after is None else None
+
+    if before is not None:
+        date, grade_id = before
+        return queryset.filter(
+            models.Q(date__gt=date) | models.Q(date=date, id__gt=grade_id)
+        ).order_by('date', 'id')[:page_size + 1], True, None
+
+    if after is not None:
+        date, grade_id = after
+        queryset = queryset.filter(
+            models.Q(date__lt=date) | models.Q(date=date, id__lt=grade_id)
+        )
+    return queryset.order_by('-date', '-id')[:page_size + 1], False, after
+
+def build_grade_page(rows, backwards, after, page_size, total):
+    if backwards:
+        has_prev = len(rows) > page_size
+        grades = rows[:page_size][::-1]
+        has_next = True
+    else:
+        has_next = len(rows) > page_size
+        grades = rows[:page_size]
+        has_prev = after is not None
+
+    return {
+        'grades': grades,
+        'page_size': page_size,
+        'next_cursor': encode_grade_cursor(grades[-1]) if grades and has_next else None,
+        'prev_cursor': encode_grade_cursor(grades[0]) if grades and has_prev else None,
+        'total': total,
+    }
+
+# Синтетические оценки для нагрузочных проверок
+SYNTHETIC_SURNAMES = ('Иванов', 'Петров', 'Сидоров', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев',
+                      'Соколов', 'Михайлов', 'Новиков', 'Федоров', 'Морозов', 'Волков', 'Алексеев')
+SYNTHETIC_MALE_NAMES = ('Иван', 'Петр', 'Алексей', 'Сергей', 'Дмитрий', 'Андрей', 'Павел', 'Никита', 'Артем')
+SYNTHETIC_FEMALE_NAMES = ('Мария', 'Анна', 'Елена', 'Ольга', 'Наталья', 'Татьяна', 'Ирина')
+# Отчества: (мужское, женское)
+SYNTHETIC_PATRONYMICS = (('Иванович', 'Ивановна'), ('Петрович', 'Петровна'), ('Алексеевич', 'Алексеевна'),
+                         ('Сергеевич', 'Сергеевна'), ('Дмитриевич', 'Дмитриевна'), ('Андреевич', 'Андреевна'),
+                         ('Павлович', 'Павловна'), ('Николаевич', 'Николаевна'))
+SYNTHETIC_SUBJECTS = ('Математика', 'Физика', 'Информатика', 'История', 'Философия', 'Химия',
+                      'Английский язык', 'Экономика', 'Базы данных', 'Программирование')
+SYNTHETIC_GRADES = ('2', '3', '4', '5', 'зачет', 'незачет')
+SYNTHETIC_CAFEDRAS = ('Прикладной математики', 'Информатики', 'Физики', 'Истории', 'Экономики')
+
+# ФИО студента; фамилии в списке мужские, женская получается окончанием "а"
+def synthetic_full_name(rng, surname):
+    patronymic = rng.choice(SYNTHETIC_PATRONYMICS)
+    if rng.random() < 0.5:
+        return f'{surname} {rng.choice(SYNTHETIC_MALE_NAMES)} {patronymic[0]}'
+    return f'{surname}а {rng.choice(SYNTHETIC_FEMALE_NAMES)} {patronymic[1]}'
+
+# Синтетические оценки; число студентов растет вместе с count (около 50 оценок на студента)
+def iter_synthetic_grades(count, seed=0, start_date=datetime.date(2020, 9, 1), days=5 * 365):
+    rng = random.Random(seed)
+    students = [synthetic_full_name(rng, rng.choice(SYNTHETIC_SURNAMES))
+                for _ in range(max(len(SYNTHETIC_SURNAMES), count // 50))]
+    teachers = [f'{surname} {first_name[0]}.{rng.choice(SYNTHETIC_PATRONYMICS)[0][0]}.'
+                for surname in SYNTHETIC_SURNAMES for first_name in SYNTHETIC_MALE_NAMES[:5]]
+    for _ in range(count):
+        yield {
+            'name': rng.choice(students),
+            'subject': rng.choice(SYNTHETIC_SUBJECTS),
+            'grade': rng.choice(SYNTHETIC_GRADES),
+            'date': start_date + datetime.timedelta(days=rng.randrange(days)),
+            'teacher': rng.choice(teachers),
+            'cafedra': rng.choice(SYNTHETIC_CAFEDRAS),
+        }
+
+# Записывает оценки в XML файл потоково, не собирая дерево целиком (*.xml.gz, *.xml.xz - со сжатием)
+@timed_xml('write')
+def write_grades_xml_file(file_path, grades):
+    count = 0
+    with open_xml_file(file_path, 'wb') as output:
+        output.write(b"<?xml version='1.0' encoding='utf-8'?>\n<StudentsGrades>\n")
+        for grade in grades:
+            output.write((ET.tostring(build_grade_element(grade), encoding='unicode') + '\n').encode('utf-8'))
+            count += 1
+        output.write(b'</StudentsGrades>\n')
+    return count
 
 #XML
 
@@ -68,138 +201,539 @@ def ensure_grades_dir():
         os.makedirs(grades_dir)
     return grades_dir
 
-# Генерирует уникальное имя для XML файла
-def generate_xml_filename():
-    return f"grades_{uuid.uuid4().hex[:8]}.xml"
+# Сжатие файлов в grades_xml (модули stdlib): файл хранится как *.xml.gz или *.xml.xz,
+# все чтения распаковывают его потоково. grades.xml и журнал не сжимаются - в них дописывают
+XML_COMPRESSIONS = {
+    'gz': gzip,
+    'xz': lzma,
+}
+
+# Способ сжатия по имени файла ('gz', 'xz' или None)
+def xml_compression(filename):
+    for compression in XML_COMPRESSIONS:
+        if filename.endswith(f'.xml.{compression}'):
+            return compression
+    return None
+
+# Файл оценок в grades_xml: XML без сжатия или сжатый
+def is_grades_xml_filename(filename):
+    return filename.endswith('.xml') or xml_compression(filename) is not None
+
+# Открывает XML файл оценок, сжатые файлы - через распаковку (запись - через сжатие)
+def open_xml_file(file_path, mode='rb'):
+    compression = xml_compression(file_path)
+    if compression is None:
+        return open(file_path, mode)
+    return XML_COMPRESSIONS[compression].open(file_path, mode)
+
+# Генерирует уникальное имя для XML файла (compression - 'gz', 'xz' или None)
+def generate_xml_filename(compression=None):
+    suffix = f'.{compression}' if compression else ''
+    return f"grades_{uuid.uuid4().hex[:8]}.xml{suffix}"
+
+# Ограниченный пул потоков для разбора XML из async представлений:
+# долгий разбор большого файла не занимает цикл событий, в котором обслуживается поиск
+xml_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'GRADES_XML_THREADS', 4), thread_name_prefix='studstat-xml'
+)
+
+async def run_xml_task(func, *args):
+    def call():
+        try:
+            return func(*args)
+        finally:
+            # Соединения с БД в потоках пула закрываются так же, как в конце запроса
+            close_old_connections()
+
+    # run_in_executor не переносит контекстные переменные: без копии контекста SQL запросы
+    # и замеры в потоке пула не попали бы в метрики представления, начавшего задачу
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(xml_executor, context.run, call)
+
+# Основной XML файл, журнал дозаписи и файл блокировки
+GRADES_XML_FILENAME = 'grades.xml'
+GRADES_JOURNAL_FILENAME = 'grades.journal'
+GRADES_LOCK_FILENAME = 'grades.lock'
+
+# Эксклюзивная блокировка основного XML файла и журнала между процессами
+@contextmanager
+def grades_xml_lock():
+    lock_path = os.path.join(ensure_grades_dir(), GRADES_LOCK_FILENAME)
+    with open(lock_path, 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+# Создает XML элемент оценки
+def build_grade_element(grade_data):
+    grade = ET.Element('Grade')
+
+    date = grade_data.get('date')
+    ET.SubElement(grade, 'StudentName').text = grade_data.get('name')
+    ET.SubElement(grade, 'Subject').text = grade_data.get('subject')
+    ET.SubElement(grade, 'GradeValue').text = grade_data.get('grade')
+    ET.SubElement(grade, 'Date').text = date.isoformat() if hasattr(date, 'isoformat') else date
+    if grade_data.get('teacher'):
+        ET.SubElement(grade, 'Teacher').text = grade_data['teacher']
+    if grade_data.get('cafedra'):
+        ET.SubElement(grade, 'Cafedra').text = grade_data['cafedra']
+
+    return grade
+
+# Потоково читает оценки из журнала дозаписи
+def iter_journal_grades(journal_path):
+    def chunks():
+        yield b'<Journal>'
+        yield from read_file_chunks(journal_path)
+        yield b'</Journal>'
+
+    return iter_grades_from_chunks(chunks())
+
+# Потоково читает оценки основного XML файла вместе с журналом
+def iter_all_grades_from_xml():
+    grades_dir = get_grades_xml_dir()
+    file_path = os.path.join(grades_dir, GRADES_XML_FILENAME)
+    journal_path = os.path.join(grades_dir, GRADES_JOURNAL_FILENAME)
 
-# Сохраняет оценку студента в XML файл
-def save_grade_to_xml(grade_data):
-    grades_dir = ensure_grades_dir()
-    file_path = os.path.join(grades_dir, 'grades.xml')
+    if os.path.exists(file_path):
+        yield from iter_grades_from_xml(file_path)
+    if os.path.exists(journal_path):
+        yield from iter_journal_grades(journal_path)
 
-    try:
-        if os.path.exists(file_path):
-            # Если файл существует, добавляем новую оценку
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-        else:
-            # Создаем новый файл
-            root = ET.Element('StudentsGrades')
-            tree = ET.ElementTree(root)
-
-        # Создаем элемент оценки
-        grade = ET.Element('Grade')
-        
-        ET.SubElement(grade, 'StudentName').text = grade_data['name']
-        ET.SubElement(grade, 'Subject').text = grade_data['subject']
-        ET.SubElement(grade, 'GradeValue').text = grade_data['grade']
-        ET.SubElement(grade, 'Date').text = grade_data['date'].isoformat()
-        if grade_data.get('teacher'):
-            ET.SubElement(grade, 'Teacher').text = grade_data['teacher']
-        if grade_data.get('cafedra'):
-            ET.SubElement(grade, 'Cafedra').text = grade_data['cafedra']
-
-        root.append(grade)
-
-        # Сохраняем файл
-        tree.write(file_path, encoding='utf-8', xml_declaration=True)
-        return True
+# Переносит записи журнала в основной XML файл, возвращает число перенесенных оценок
+@timed_xml('compact')
+def compact_grades_xml():
+    grades_dir = ensure_grades_dir()
+    file_path = os.path.join(grades_dir, GRADES_XML_FILENAME)
+    journal_path = os.path.join(grades_dir, GRADES_JOURNAL_FILENAME)
 
-    except Exception as e:
-        print(f"Error saving to XML: {e}")
-        return False
+    with grades_xml_lock():
+        moved = merge_journal(file_path, journal_path)
+    if moved:
+        update_xml_manifest(GRADES_XML_FILENAME)
 
-# Получает все оценки из основного XML файла
-def get_all_grades_from_xml():
-    grades_dir = get_grades_xml_dir()
-    file_path = os.path.join(grades_dir, 'grades.xml')
-    grades = []
+    return moved
 
-    if not os.path.exists(file_path):
-        return grades
+# Сливает журнал дозаписи с XML файлом и удаляет журнал (вызывается под grades_xml_lock)
+def merge_journal(file_path, journal_path):
+    if not os.path.exists(journal_path) or os.path.getsize(journal_path) == 0:
+        return 0
 
+    tmp_path = file_path + '.tmp'
+    moved = 0
+    with open(tmp_path, 'wb') as output:
+        output.write(b"<?xml version='1.0' encoding='utf-8'?>\n<StudentsGrades>")
+        if os.path.exists(file_path):
+            for grade in iter_grades_from_xml(file_path):
+                output.write(ET.tostring(build_grade_element(grade), encoding='unicode').encode('utf-8'))
+        for grade in iter_journal_grades(journal_path):
+            output.write(ET.tostring(build_grade_element(grade), encoding='unicode').encode('utf-8'))
+            moved += 1
+        output.write(b'</StudentsGrades>')
+
+    os.replace(tmp_path, file_path)
+    os.remove(journal_path)
+    return moved
+
+# Разбирает XML файл оценок за один проход: (валиден ли файл, список оценок)
+@timed_xml('parse')
+def parse_grades_file(file_path):
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-
-        for grade_elem in root.findall('Grade'):
-            grade = {
-                'name': grade_elem.find('StudentName').text if grade_elem.find('StudentName') is not None else '',
-                'subject': grade_elem.find('Subject').text if grade_elem.find('Subject') is not None else '',
-                'grade': grade_elem.find('GradeValue').text if grade_elem.find('GradeValue') is not None else '',
-                'date': grade_elem.find('Date').text if grade_elem.find('Date') is not None else '',
-                'teacher': grade_elem.find('Teacher').text if grade_elem.find('Teacher') is not None else '',
-                'cafedra': grade_elem.find('Cafedra').text if grade_elem.find('Cafedra') is not None else '',
-            }
-            grades.append(grade)
-
-    except (ParseError, ET.ParseError) as e:
-        print(f"Error parsing XML: {e}")
+        return True, list(iter_grades_from_xml(file_path))
+    except (ParseError, ET.ParseError):
+        return False, []
+    except Exception as e:
+        print(f"Error reading uploaded XML: {e}")
+        return False, []
 
-    return grades
+# Результат разбора из кэша (повторный разбор только при изменении файла)
+def get_parsed_grades_file(file_path):
+    return xml_parse_cache.get(file_path, parse_grades_file)
 
 # Проверяет валидность XML файла
+@timed_xml('validate')
 def validate_xml_file(file_path):
-    try:
-        ET.parse(file_path)
-        return True
-    except (ParseError, ET.ParseError):
-        return False
+    is_valid, _ = get_parsed_grades_file(file_path)
+    return is_valid
 
 # Извлекает оценки из загруженного XML файла
 def get_grades_from_uploaded_xml(file_path):
-    grades = []
-    if not validate_xml_file(file_path):
-        return grades
+    _, grades = get_parsed_grades_file(file_path)
+    return list(grades)
+
+# Соответствие тегов XML и полей оценки
+GRADE_XML_FIELDS = (
+    ('StudentName', 'name'),
+    ('Subject', 'subject'),
+    ('GradeValue', 'grade'),
+    ('Date', 'date'),
+    ('Teacher', 'teacher'),
+    ('Cafedra', 'cafedra'),
+)
+
+# Размер блока при потоковом чтении файлов
+XML_CHUNK_SIZE = 64 * 1024
+
+# Читает файл блоками (сжатые файлы - распакованными блоками)
+def read_file_chunks(file_path):
+    with open_xml_file(file_path) as file:
+        for chunk in iter(lambda: file.read(XML_CHUNK_SIZE), b''):
+            yield chunk
+
+# Словарь оценки из элемента <Grade>
+def grade_from_element(elem):
+    grade = {}
+    for tag, key in GRADE_XML_FIELDS:
+        child = elem.find(tag)
+        if child is not None:
+            grade[key] = child.text
+    return grade
+
+# Потоково разбирает XML из последовательности блоков байт, выдавая оценки
+def iter_grades_from_chunks(chunks):
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    stack = []
+
+    def read_events():
+        for event, elem in parser.read_events():
+            if event == 'start':
+                stack.append(elem)
+                continue
+
+            stack.pop()
+            if elem.tag != 'Grade':
+                continue
+
+            grade = grade_from_element(elem)
+            # Освобождаем память: обработанный элемент больше не нужен
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+            if grade:
+                yield grade
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from read_events()
+    parser.close()
+    yield from read_events()
+
+# Потоково читает оценки из XML файла, не загружая дерево целиком
+def iter_grades_from_xml(file_path):
+    return iter_grades_from_chunks(read_file_chunks(file_path))
+
+# Загружаемый XML файл не соответствует схеме StudentsGrades/Grade
+class XMLUploadError(ValueError):
+    pass
+
+GRADE_XML_TAGS = {tag for tag, _ in GRADE_XML_FIELDS}
+
+# Потоково разбирает загружаемый XML и проверяет структуру: корень <StudentsGrades>,
+# в нем только <Grade> с известными полями, обязательные поля заполнены, дата в формате ISO.
+# Ошибка возникает на первом неверном элементе, без чтения остатка файла
+def iter_validated_grades(chunks):
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    stack = []
+    count = 0
+
+    def read_events():
+        nonlocal count
+        for event, elem in parser.read_events():
+            if event == 'start':
+                depth = len(stack)
+                if depth == 0 and elem.tag != 'StudentsGrades':
+                    raise XMLUploadError(f'корневой элемент <{elem.tag}> вместо <StudentsGrades>')
+                if depth == 1 and elem.tag != 'Grade':
+                    raise XMLUploadError(f'элемент <{elem.tag}> вместо <Grade> после записи {count}')
+                if depth == 2 and elem.tag not in GRADE_XML_TAGS:
+                    raise XMLUploadError(f'запись {count + 1}: неизвестное поле <{elem.tag}>')
+                if depth >= 3:
+                    raise XMLUploadError(f'запись {count + 1}: вложенный элемент <{elem.tag}>')
+                stack.append(elem)
+                continue
+
+            stack.pop()
+            if elem.tag != 'Grade' or len(stack) != 1:
+                continue
+
+            count += 1
+            grade = grade_from_element(elem)
+            if clean_grade_data(grade) is None:
+                raise XMLUploadError(f'запись {count}: не заполнены обязательные поля или неверная дата')
+            elem.clear()
+            stack[-1].remove(elem)
+            yield grade
 
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-
-        for grade_elem in root.findall('.//Grade'):
-            grade = {}
-            name_elem = grade_elem.find('StudentName')
-            subject_elem = grade_elem.find('Subject')
-            grade_elem_val = grade_elem.find('GradeValue')
-            date_elem = grade_elem.find('Date')
-            teacher_elem = grade_elem.find('Teacher')
-            cafedra_elem = grade_elem.find('Cafedra')
-
-            if name_elem is not None:
-                grade['name'] = name_elem.text
-            if subject_elem is not None:
-                grade['subject'] = subject_elem.text
-            if grade_elem_val is not None:
-                grade['grade'] = grade_elem_val.text
-            if date_elem is not None:
-                grade['date'] = date_elem.text
-            if teacher_elem is not None:
-                grade['teacher'] = teacher_elem.text
-            if cafedra_elem is not None:
-                grade['cafedra'] = cafedra_elem.text
-
-            if grade:  # Добавляем только если есть основные поля
-                grades.append(grade)
-
-    except Exception as e:
-        print(f"Error reading uploaded XML: {e}")
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from read_events()
+        parser.close()
+        yield from read_events()
+    except ET.ParseError as e:
+        raise XMLUploadError(f'некорректный XML ({e})') from e
+
+# Проверяет и нормализует словарь оценки (None, если запись некорректна)
+def clean_grade_data(grade_data):
+    values = {}
+    for _, key in GRADE_XML_FIELDS:
+        value = grade_data.get(key) or ''
+        values[key] = value.strip() if isinstance(value, str) else value
+
+    if not all(values[key] for key in ('name', 'subject', 'grade', 'date')):
+        return None
+
+    if len(values['grade']) > StatStudent._meta.get_field('grade').max_length:
+        return None
+    for key, (_, model) in DIMENSIONS.items():
+        if len(values[key]) > model._meta.get_field('name').max_length:
+            return None
+
+    if not isinstance(values['date'], datetime.date):
+        try:
+            values['date'] = datetime.date.fromisoformat(values['date'])
+        except ValueError:
+            return None
+
+    return values
+
+# Пакетно записывает оценки в БД, дубликаты пропускаются на уровне unique_together.
+# created - сумма вставленных строк по пачкам (RETURNING), а не разница COUNT(*) до и после:
+# так счетчики верны и при параллельной записи из других запросов.
+# progress(stats) вызывается после каждой записанной пачки
+def import_grades_to_db(grades, batch_size=None, progress=None):
+    batch_size = batch_size or getattr(settings, 'GRADES_IMPORT_BATCH_SIZE', 5000)
+    stats = {'total': 0, 'created': 0, 'skipped': 0, 'invalid': 0}
+    batch = []
+
+    def write(batch):
+        created = bulk_insert_statstudent(batch)
+        stats['created'] += created
+        stats['skipped'] += len(batch) - created
+
+    for grade_data in grades:
+        stats['total'] += 1
+        values = clean_grade_data(grade_data)
+        if values is None:
+            stats['invalid'] += 1
+            continue
+
+        batch.append(values)
+        if len(batch) >= batch_size:
+            write(batch)
+            batch = []
+            if progress:
+                progress(stats)
+
+    if batch:
+        write(batch)
+    return stats
+
+# Строк в одном INSERT: 6 параметров на строку укладываются в лимиты SQLite и PostgreSQL
+INSERT_ROWS_PER_STATEMENT = 1000
+
+# Вставляет пачку оценок (словари с именами), добавляет созданные оценки в сводку.
+# Возвращает число созданных оценок
+def bulk_insert_statstudent(batch):
+    with transaction.atomic():
+        created = []
+        for start in range(0, len(batch), INSERT_ROWS_PER_STATEMENT):
+            part = batch[start:start + INSERT_ROWS_PER_STATEMENT]
+            grade_ids = insert_grades_on_conflict(part)
+            created.extend(values for values, grade_id in zip(part, grade_ids) if grade_id)
+        apply_summary_counts(created)
+    return len(created)
+
+# Вставляет пачку оценок одним INSERT ... ON CONFLICT DO NOTHING.
+# Возвращает id созданной оценки для каждой записи пачки (None - дубликат)
+def insert_grades_on_conflict(batch):
+    ids = {
+        key: resolve_dimension_ids(model, (values.get(key) for values in batch))
+        for key, (_, model) in DIMENSIONS.items()
+    }
+    rows = [
+        (ids['name'][values['name']], ids['subject'][values['subject']], values['grade'], values['date'],
+         ids['teacher'].get(values.get('teacher')), ids['cafedra'].get(values.get('cafedra')))
+        for values in batch
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {StatStudent._meta.db_table} '
+            f'(student_id, subject_id, grade, date, teacher_id, cafedra_id) '
+            f"VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))} "
+            f'ON CONFLICT DO NOTHING RETURNING id, student_id, subject_id, grade, date',
+            [value for row in rows for value in row]
+        )
+        # SQLite возвращает дату строкой, PostgreSQL - объектом date
+        created = {(student, subject, grade, str(date)): grade_id
+                   for grade_id, student, subject, grade, date in cursor.fetchall()}
+    if created:
+        bump_data_version('db')
+
+    # Повтор записи внутри пачки - тоже дубликат: id получает только первая
+    return [created.pop((row[0], row[1], row[2], str(row[3])), None) for row in rows]
+
+# Импортирует оценки из XML файла в БД
+@timed_xml('import')
+def import_xml_file_to_db(file_path, batch_size=None, progress=None):
+    return import_grades_to_db(iter_grades_from_xml(file_path), batch_size=batch_size, progress=progress)
+
+# Манифест XML файлов
+
+# Контрольная сумма и сводка по оценкам файла для манифеста, собираемые по ходу чтения
+class XMLFileSummary:
+    def __init__(self):
+        self.checksum = hashlib.sha256()
+        self.records_count = 0
+        self.date_from = None
+        self.date_to = None
+        self.cafedras = set()
+
+    # Пропускает блоки файла, обновляя контрольную сумму
+    def hashed(self, chunks):
+        for chunk in chunks:
+            self.checksum.update(chunk)
+            yield chunk
+
+    # Пропускает оценки, учитывая их в сводке
+    def collect(self, grades):
+        for grade in grades:
+            self.add(grade)
+            yield grade
+
+    def add(self, grade):
+        self.records_count += 1
+        if grade.get('cafedra'):
+            self.cafedras.add(grade['cafedra'])
+        try:
+            date = datetime.date.fromisoformat(grade.get('date') or '')
+        except ValueError:
+            return
+        if self.date_from is None or date < self.date_from:
+            self.date_from = date
+        if self.date_to is None or date > self.date_to:
+            self.date_to = date
+
+    # Поля XMLFileManifest для файла
+    def manifest_info(self, file_path, is_valid=True):
+        stat = os.stat(file_path)
+        return {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'is_valid': is_valid,
+            'records_count': self.records_count,
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'checksum': self.checksum.hexdigest(),
+            'cafedras': sorted(self.cafedras),
+        }
+
+# Один проход по файлу: контрольная сумма, валидность и сводка по оценкам
+@timed_xml('scan')
+def scan_xml_file(file_path):
+    summary = XMLFileSummary()
+    try:
+        for _ in summary.collect(iter_grades_from_chunks(summary.hashed(read_file_chunks(file_path)))):
+            pass
+    except (ParseError, ET.ParseError):
+        # Разбор прервался на ошибке - контрольную сумму считаем заново по всему файлу
+        summary = XMLFileSummary()
+        for _ in summary.hashed(read_file_chunks(file_path)):
+            pass
+        return summary.manifest_info(file_path, is_valid=False)
+    return summary.manifest_info(file_path)
+
+# Сохраняет загруженный файл за один проход по блокам: запись на диск (со сжатием для
+# *.xml.gz/*.xml.xz), проверка структуры, сводка для манифеста и (import_to_db) импорт в БД.
+# При ошибке структуры чтение прекращается, файл удаляется, импорт откатывается. Возвращает (поля манифеста, итоги импорта или None)
+@timed_xml('upload')
+def receive_xml_upload(uploaded_file, file_path, import_to_db=False):
+    summary = XMLFileSummary()
+    stats = None
+    try:
+        with open_xml_file(file_path, 'wb') as destination:
+            def received_chunks():
+                for chunk in uploaded_file.chunks():
+                    destination.write(chunk)
+                    yield chunk
+
+            grades = summary.collect(iter_validated_grades(summary.hashed(received_chunks())))
+            if import_to_db:
+                with transaction.atomic():
+                    stats = import_grades_to_db(grades)
+            else:
+                for _ in grades:
+                    pass
+    except XMLUploadError:
+        os.remove(file_path)
+        raise
+    return summary.manifest_info(file_path), stats
+
+# Обновляет запись манифеста для файла из grades_xml (удаляет, если файла нет);
+# info - уже собранные поля манифеста, чтобы не читать файл повторно
+def update_xml_manifest(filename, info=None):
+    file_path = os.path.join(get_grades_xml_dir(), filename)
+    bump_data_version('xml')
+    if not os.path.exists(file_path):
+        XMLFileManifest.objects.filter(filename=filename).delete()
+        return None
 
-    return grades
+    manifest, _ = XMLFileManifest.objects.update_or_create(
+        filename=filename, defaults=info or scan_xml_file(file_path)
+    )
+    return manifest
 
-# Возвращает список всех XML файлов в директории
-def get_all_xml_files():
+# Сверяет манифест с содержимым директории; full=True пересчитывает все файлы
+def reconcile_xml_manifest(full=False):
     grades_dir = ensure_grades_dir()
-    xml_files = []
+    stats = {'scanned': 0, 'unchanged': 0, 'removed': 0}
+    manifests = {manifest.filename: manifest for manifest in XMLFileManifest.objects.all()}
+    on_disk = set()
 
     for filename in os.listdir(grades_dir):
-        if filename.endswith('.xml'):
-            file_path = os.path.join(grades_dir, filename)
-            file_info = {
-                'filename': filename,
-                'filepath': file_path,
-                'size': os.path.getsize(file_path),
-                'is_valid': validate_xml_file(file_path)
-            }
-            xml_files.append(file_info)
-
-    return xml_files
\ No newline at end of file
+        if not is_grades_xml_filename(filename):
+            continue
+        on_disk.add(filename)
+        manifest = manifests.get(filename)
+        stat = os.stat(os.path.join(grades_dir, filename))
+        if (not full and manifest is not None and manifest.size == stat.st_size
+                and manifest.mtime_ns == stat.st_mtime_ns):
+            stats['unchanged'] += 1
+            continue
+        update_xml_manifest(filename)
+        stats['scanned'] += 1
+
+    missing = set(manifests) - on_disk
+    if missing:
+        XMLFileManifest.objects.filter(filename__in=missing).delete()
+        stats['removed'] = len(missing)
+        bump_data_version('xml')
+
+    return stats
+
+# Возвращает список всех XML файлов в директории (по манифесту, без чтения файлов).
+# Список ничего не меняет: журнал grades.xml сливается при просмотре, скачивании и импорте
+# файла, обработчиком очереди и командой compact_grades_xml
+def get_all_xml_files():
+    grades_dir = get_grades_xml_dir()
+
+    xml_files = []
+    for manifest in XMLFileManifest.objects.all():
+        xml_files.append({
+            'filename': manifest.filename,
+            'filepath': os.path.join(grades_dir, manifest.filename),
+            'size': manifest.size,
+            'is_valid': manifest.is_valid,
+            'compression': xml_compression(manifest.filename),
+            'grades_count': manifest.records_count,
+            'date_from': manifest.date_from,
+            'date_to': manifest.date_to,
+            'cafedras': manifest.cafedras,
+        })
+
+    return xml_files
@@ -0,0 +1,106 @@
+import os
+import uuid
+import hashlib
+import datetime
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Версии данных для кэша списков и условных GET запросов.
+# У каждого источника ('db', 'xml') есть файл с версией в MEDIA_ROOT; любая запись
+# меняет версию, поэтому старые записи кэша и ETag перестают совпадать.
+# Файл общий для всех процессов, а чтение версии не обращается ни к БД, ни к XML.
+
+DATA_SOURCES = ('db', 'xml')
+
+
+def version_path(source):
+    return os.path.join(settings.MEDIA_ROOT, 'data_versions', source)
+
+def get_data_version(source):
+    if '+' in source:
+        # Составной источник ('db+xml') меняется при изменении любой из частей
+        return '-'.join(get_data_version(part) for part in source.split('+'))
+    try:
+        with open(version_path(source), encoding='ascii') as version_file:
+            return version_file.read().strip() or '0'
+    except FileNotFoundError:
+        return '0'
+
+# Время последнего изменения источника (None, если изменений еще не было)
+def get_data_modified(source):
+    if '+' in source:
+        modified = [value for value in map(get_data_modified, source.split('+')) if value is not None]
+        return max(modified, default=None)
+    try:
+        mtime = os.stat(version_path(source)).st_mtime
+    except FileNotFoundError:
+        return None
+    return datetime.datetime.fromtimestamp(mtime, tz=datetime.timezone.utc)
+
+def write_data_version(source):
+    path = version_path(source)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp_path, 'w', encoding='ascii') as version_file:
+        version_file.write(uuid.uuid4().hex)
+    os.replace(tmp_path, path)
+
+# Новая версия источника; внутри транзакции - только после ее фиксации,
+# иначе параллельный запрос мог бы закэшировать старые данные под новой версией
+def bump_data_version(source):
+    transaction.on_commit(lambda: write_data_version(source))
+
+
+# Кэш результатов списков (GRADES_RESPONSE_CACHE_ALIAS из CACHES)
+def result_cache():
+    return caches[getattr(settings, 'GRADES_RESPONSE_CACHE_ALIAS', 'default')]
+
+def result_cache_timeout():
+    return getattr(settings, 'GRADES_RESPONSE_CACHE_TIMEOUT', 300)
+
+# Ключ кэша: источник, его текущая версия и параметры запроса
+def result_cache_key(source, request):
+    params = sorted(request.GET.lists())
+    digest = hashlib.sha1(f'{request.path}:{params!r}'.encode('utf-8')).hexdigest()
+    return f'studstat:result:{source}:{get_data_version(source)}:{digest}'
+
+
+# Результат из кэша или build() с сохранением; списки длиннее max_rows не кэшируются
+async def aget_or_build(key, build, max_rows=None):
+    cache = result_cache()
+    result = await cache.aget(key)
+    if result is None:
+        result = await build()
+        if max_rows is None or len(result) <= max_rows:
+            await cache.aset(key, result, result_cache_timeout())
+    return result
+
+
+# Источник данных списка оценок (параметр source, как в grades_list)
+def grades_list_source(request, *args, **kwargs):
+    return 'db' if request.GET.get('source', 'db') == 'db' else 'xml'
+
+# Источники поиска ajax_search: source=db (по умолчанию), xml или all
+SEARCH_SOURCES = {'db': 'db', 'xml': 'xml', 'all': 'db+xml'}
+
+def search_source(request, *args, **kwargs):
+    return SEARCH_SOURCES.get(request.GET.get('source'), 'db')
+
+# Функции ETag и Last-Modified для django.views.decorators.http.condition.
+# Если у пользователя есть неотображенные сообщения, условный ответ не используется:
+# 304 скрыл бы их
+def conditional_funcs(source_func):
+    def etag(request, *args, **kwargs):
+        if 'messages' in request.COOKIES:
+            return None
+        source = source_func(request)
+        key = f'{source}:{get_data_version(source)}:{request.get_full_path()}'
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if 'messages' in request.COOKIES:
+            return None
+        return get_data_modified(source_func(request))
+
+    return {'etag_func': etag, 'last_modified_func': last_modified}
@@ -1,17 +1,44 @@
 import os
+import xml.etree.ElementTree as ET
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse, JsonResponse
-from django.http import FileResponse, Http404
+from django.http import Http404, StreamingHttpResponse
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib import messages
-from django.db import models
-from .forms import StudentForm, UploadXMLForm, StudentEditForm, DataSourceForm
-from .models import StatStudent
+from django.db import models, transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
+from .forms import StudentForm, UploadXMLForm, StudentEditForm, DataSourceForm, XMLFilterForm
+from .models import StatStudent, GradeSummary, ImportJob
 from .utils import (
-    save_grade_to_xml, get_all_grades_from_xml,
     validate_xml_file, get_grades_from_uploaded_xml,
     get_all_xml_files, generate_xml_filename, ensure_grades_dir, get_grades_xml_dir,
-    save_statstudent_to_db, search_statstudent_in_db, get_all_statstudent_from_db
+    save_statstudent_to_db, get_all_statstudent_from_db,
+    import_xml_file_to_db, compact_grades_xml, GRADES_XML_FILENAME,
+    apaginate_statstudent, get_page_size, update_xml_manifest, run_xml_task,
+    receive_xml_upload, XMLUploadError, is_grades_xml_filename, read_file_chunks, xml_compression
+)
+from .search import search_statstudent, rank_search_results
+from .export import EXPORT_FORMATS, aiter_blocks, filter_grades_for_export, gzip_stream
+from .downloads import serve_decoded_file, serve_file
+from .xml_store import get_all_grades_from_xml, partition_filter_choices, save_grade_to_xml, select_partitions
+from .xml_index import list_index_units, xml_search_index
+from .ingest import IngestError, ingest_grades, iter_request_records
+from .metrics import render_metrics
+from .analytics import AnalyticsError, run_report
+from .suggest import MAX_SUGGESTION_LIMIT, suggestion_index
+from .jobs import ACTIVE_STATUSES, enqueue_import, import_jobs_enabled, job_status_data, latest_jobs
+from .dimensions import DIMENSIONS, dimension_ids, grade_lookup, prune_dimensions
+from .versions import (
+    aget_or_build, bump_data_version, conditional_funcs, grades_list_source, result_cache_key,
+    search_source
+)
+from .stats import (
+    SUMMARY_DIMENSIONS, summary_snapshot, apply_summary_delta, apply_summary_change, get_grade_stats
 )
 
 # Форма для ввода оценки студента
@@ -42,100 +69,308 @@ def student_form(request):
 
     return render(request, 'student_form.html', {'form': form})
 
-# Список всех оценок из основного XML файла
-def grades_list(request):
+# Список всех оценок из основного XML файла (async: БД через async ORM, XML в пуле потоков).
+# Результат кэшируется до следующей записи в источник, неизмененная страница отдается как 304
+@condition(**conditional_funcs(grades_list_source))
+async def grades_list(request):
     source_form = DataSourceForm(request.GET or None)
     source = request.GET.get('source', 'db') #Получаем выбранный источник данных (или 'db' по умолчанию)
+    cache_key = result_cache_key(grades_list_source(request), request)
+    page = None
+    filter_form = None
 
     if source == 'db':
-        grades = get_all_statstudent_from_db()
+        page = await aget_or_build(cache_key, lambda: apaginate_statstudent(
+            get_all_statstudent_from_db(),
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+            page_size=request.GET.get('page_size'),
+            with_total=True
+        ))
+        grades = page['grades']
         from_db = True
     else:
-        grades = get_all_grades_from_xml()
+        # Фильтры открывают только секции XML хранилища, где могут быть подходящие оценки
+        cafedras, subjects = await sync_to_async(partition_filter_choices)()
+        filter_form = XMLFilterForm(request.GET, cafedras=cafedras, subjects=subjects)
+        filters = filter_form.get_filters()
+
+        async def build_xml_grades():
+            partitions = await sync_to_async(select_partitions)(**filters)
+            return await run_xml_task(lambda: get_all_grades_from_xml(**filters, partitions=partitions))
+
+        grades = await aget_or_build(
+            cache_key, build_xml_grades, max_rows=getattr(settings, 'GRADES_RESPONSE_CACHE_MAX_ROWS', 5000)
+        )
         from_db = False
     
     context = {
         'grades': grades,
         'has_grades': len(grades) > 0,
         'source_form': source_form,
+        'filter_form': filter_form,
         'from_db': from_db,
-        'current_source': source
+        'current_source': source,
+        'page': page,
+        'next_url': page_url(request, after=page['next_cursor']) if page and page['next_cursor'] else None,
+        'prev_url': page_url(request, before=page['prev_cursor']) if page and page['prev_cursor'] else None,
+    }
+    response = await sync_to_async(render)(request, 'grades_list.html', context)
+    # Браузер должен каждый раз спрашивать сервер (получая 304), а не показывать копию
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+# Ссылка на соседнюю страницу с сохранением остальных параметров запроса
+def page_url(request, **cursor):
+    params = request.GET.copy()
+    params.pop('after', None)
+    params.pop('before', None)
+    params.update(cursor)
+    return '?' + params.urlencode()
+
+# Представление оценки из БД для JSON ответа
+def serialize_grade(grade):
+    return {
+        'source': 'db',
+        'id': grade.id,
+        'name': grade.name or '-',
+        'subject': grade.subject.name or '-',
+        'grade': grade.grade or '-',
+        'date': grade.date.strftime('%Y-%m-%d') if grade.date else '-',
+        'teacher': grade.teacher.name if grade.teacher else '-',
+        'cafedra': grade.cafedra.name if grade.cafedra else '-'
+    }
+
+# Оценка из XML файла в формате ответа поиска (file - None для XML хранилища)
+def serialize_xml_grade(filename, grade):
+    return {
+        'source': 'xml',
+        'file': filename,
+        'id': None,
+        **{field: grade[field] or '-' for field in ('name', 'subject', 'grade', 'date', 'teacher', 'cafedra')},
     }
-    return render(request, 'grades_list.html', context)
 
-#AJAX поиск оценок в базе данных
-def ajax_search(request):
+#AJAX поиск оценок (async, не ждет медленные XML страницы других пользователей).
+# source=db - база данных (по умолчанию), xml - XML файлы и хранилище, all - оба источника.
+# Ответ кэшируется по строке запроса до следующего изменения данных источника
+@condition(**conditional_funcs(search_source))
+async def ajax_search(request):
     if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-        query = request.GET.get('q', '').strip()
-        
-        if query:
-            # Улучшенный поиск с учетом разных форматов данных
-            grades = StatStudent.objects.filter(
-                models.Q(name__icontains=query) |
-                models.Q(subject__icontains=query) |
-                models.Q(grade__icontains=query) |
-                models.Q(teacher__icontains=query) |
-                models.Q(cafedra__icontains=query) |
-                models.Q(date__icontains=query)  # Поиск по дате как строке
-            ).order_by('-date')
-            
-            results = []
-            for grade in grades:
-                results.append({
-                    'id': grade.id,
-                    'name': grade.name or '-',
-                    'subject': grade.subject or '-',
-                    'grade': grade.grade or '-',
-                    'date': grade.date.strftime('%Y-%m-%d') if grade.date else '-',
-                    'teacher': grade.teacher or '-',
-                    'cafedra': grade.cafedra or '-'
-                })
-            return JsonResponse({'grades': results, 'query': query})
-        else:
-            # Если запрос пустой, возвращаем все оценки
-            grades = get_all_statstudent_from_db()
-            results = []
-            for grade in grades:
-                results.append({
-                    'id': grade.id,
-                    'name': grade.name or '-',
-                    'subject': grade.subject or '-',
-                    'grade': grade.grade or '-',
-                    'date': grade.date.strftime('%Y-%m-%d') if grade.date else '-',
-                    'teacher': grade.teacher or '-',
-                    'cafedra': grade.cafedra or '-'
-                })
-            return JsonResponse({'grades': results})
+        source = search_source(request)
+        build = (lambda: search_response_data(request)) if source == 'db' else (lambda: unified_search_data(request))
+        data = await aget_or_build(result_cache_key(source, request), build)
+        response = JsonResponse(data)
+        patch_cache_control(response, private=True, no_cache=True)
+        response['Vary'] = 'X-Requested-With'
+        return response
     
     return JsonResponse({'error': 'Invalid request'}, status=400)
 
+# Данные ответа ajax_search
+async def search_response_data(request):
+    query = request.GET.get('q', '').strip()
+
+    if query:
+        # Поиск по индексам с учетом дат в запросе (ключи справочников выбираются синхронно)
+        grades = await sync_to_async(search_statstudent)(query)
+    else:
+        # Если запрос пустой, возвращаем все оценки
+        grades = get_all_statstudent_from_db()
+
+    if query and request.GET.get('order') == 'relevance':
+        # Лучшие совпадения по релевантности, без курсоров
+        ranked = rank_search_results(grades, query)[:get_page_size(request.GET.get('page_size'))]
+        return {
+            'grades': [serialize_grade(grade) async for grade in ranked],
+            'query': query,
+            'next_cursor': None,
+            'prev_cursor': None,
+            'total': None,
+        }
+
+    page = await apaginate_statstudent(
+        grades,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page_size=request.GET.get('page_size'),
+        with_total=request.GET.get('total') == '1'
+    )
+    response = {
+        'grades': [serialize_grade(grade) for grade in page['grades']],
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor'],
+        'total': page['total'],
+    }
+    if query:
+        response['query'] = query
+    return response
+
+# Поиск по XML (source=xml) или по БД и XML вместе (source=all).
+# Результаты обоих источников сливаются по убыванию даты; курсор - смещение в общем списке
+async def unified_search_data(request):
+    query = request.GET.get('q', '').strip()
+    page_size = get_page_size(request.GET.get('page_size'))
+    after = request.GET.get('after', '')
+    offset = int(after) if after.isdigit() else 0
+    limit = offset + page_size + 1
+
+    # Индекс XML: источники выбираются в потоке запроса, разбор и поиск - в пуле потоков XML
+    units = await sync_to_async(list_index_units)()
+
+    def find_xml():
+        xml_search_index.prune(units)
+        return xml_search_index.search(query, units)
+
+    xml_hits = await run_xml_task(find_xml)
+    hits = [serialize_xml_grade(filename, grade) for filename, grade in xml_hits[:limit]]
+    total = len(xml_hits)
+
+    if search_source(request) == 'db+xml':
+        grades = await sync_to_async(search_statstudent)(query) if query else get_all_statstudent_from_db()
+        grades = grades.order_by('-date', '-id')
+        hits.extend([serialize_grade(grade) async for grade in grades[:limit]])
+        # Сортировка устойчивая: при равной дате оценки из БД идут первыми
+        hits.sort(key=lambda hit: hit['source'] != 'db')
+        hits.sort(key=lambda hit: hit['date'], reverse=True)
+        if request.GET.get('total') == '1':
+            total += await grades.acount()
+        else:
+            total = None
+
+    response = {
+        'grades': hits[offset:offset + page_size],
+        'next_cursor': str(offset + page_size) if len(hits) > offset + page_size else None,
+        'prev_cursor': str(max(offset - page_size, 0)) if offset else None,
+        'total': total,
+    }
+    if query:
+        response['query'] = query
+    return response
+
+# Потоковый экспорт оценок из БД в XML или CSV (?format=xml|csv&q=...&gzip=1)
+def export_grades(request):
+    export_format = request.GET.get('format', 'xml')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': 'Unknown format'}, status=400)
+
+    queryset = filter_grades_for_export(
+        request.GET.get('q', '').strip(),
+        request.GET.get('date_from'),
+        request.GET.get('date_to'),
+    )
+    exporter, content_type, extension = EXPORT_FORMATS[export_format]
+    content = exporter(queryset)
+    filename = f'grades_export.{extension}'
+
+    if request.GET.get('gzip') == '1':
+        content = gzip_stream(content)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    if isinstance(request, ASGIRequest):
+        content = aiter_blocks(content)
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+# Подсказки для строки поиска: ?q=...&limit=10&field=name|subject|teacher|cafedra.
+# Ответ строится по индексу в памяти процесса, без запросов к БД
+def suggest(request):
+    query = request.GET.get('q', '').strip()
+    fields = [field for field in request.GET.getlist('field') if field in DIMENSIONS]
+    try:
+        limit = int(request.GET.get('limit', ''))
+    except ValueError:
+        limit = getattr(settings, 'GRADES_SUGGEST_LIMIT', 10)
+    limit = max(1, min(limit, MAX_SUGGESTION_LIMIT))
+
+    suggestions = suggestion_index.suggest(query, limit, fields) if query else []
+    response = JsonResponse({'query': query, 'suggestions': suggestions})
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+# Статистика по студентам, предметам и кафедрам (только сводные таблицы)
+def grade_stats(request):
+    dimension = request.GET.get('dimension', 'subject')
+    if dimension not in SUMMARY_DIMENSIONS:
+        dimension = 'subject'
+    groups = get_grade_stats(dimension, request.GET.get('value'))
+    grade_values = sorted({grade for group in groups for grade in group['grades']})
+    for group in groups:
+        group['distribution'] = [group['grades'].get(grade, 0) for grade in grade_values]
+
+    return render(request, 'grade_stats.html', {
+        'dimension': dimension,
+        'dimensions': GradeSummary.DIMENSION_CHOICES,
+        'groups': groups,
+        'grade_values': grade_values,
+    })
+
+# Статистика в JSON: ?dimension=student|subject|cafedra&value=...
+def grade_stats_json(request):
+    dimension = request.GET.get('dimension', 'subject')
+    if dimension not in SUMMARY_DIMENSIONS:
+        return JsonResponse({'error': 'Unknown dimension'}, status=400)
+    return JsonResponse({
+        'dimension': dimension,
+        'groups': get_grade_stats(dimension, request.GET.get('value')),
+    })
+
+# Отчеты по оценкам в JSON: /analytics/<distribution|gpa|percentiles|pass_rates|trends>/
+# ?source=db|xml&by=student|subject|teacher|cafedra&date_from=...&date_to=...&subject=...
+@condition(**conditional_funcs(grades_list_source))
+def analytics_report(request, report):
+    try:
+        data = run_report(report, grades_list_source(request), request.GET)
+    except AnalyticsError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(data)
+
+# Пакетный прием оценок: POST с JSON массивом или NDJSON (Content-Type: application/x-ndjson).
+# Нужен заголовок Authorization: Bearer <GRADES_API_TOKEN>; без настроенного токена прием выключен
+@csrf_exempt
+@require_POST
+def api_grades(request):
+    token = getattr(settings, 'GRADES_API_TOKEN', None)
+    if not token:
+        return JsonResponse({'error': 'API disabled: GRADES_API_TOKEN is not configured'}, status=503)
+    if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return JsonResponse({'error': 'Unauthorized'}, status=401)
+
+    try:
+        records = iter_request_records(request)
+    except IngestError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(ingest_grades(records))
+
+# Метрики в формате Prometheus; доступны только с адресов из METRICS_ALLOWED_IPS
+def metrics(request):
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ('127.0.0.1', '::1'))
+    if request.META.get('REMOTE_ADDR') not in allowed:
+        raise Http404
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Редактирование оценки
 def edit_grade(request, grade_id):
     grade = get_object_or_404(StatStudent, id=grade_id) #Ищем оценку через grade_id
+    old_values = summary_snapshot(grade) # форма меняет объект при проверке, запоминаем старые значения
+    old_ids = dimension_ids(grade)
     
     if request.method == 'POST':
         form = StudentEditForm(request.POST, instance=grade)
         if form.is_valid():
-            #Проверка на дубликаты
-            name = form.cleaned_data['name']
-            subject = form.cleaned_data['subject']
-            grade_value = form.cleaned_data['grade']
-            date = form.cleaned_data['date']
-            teacher = form.cleaned_data['teacher']
-            cafedra = form.cleaned_data['cafedra']
+            #Проверка на дубликаты (по уникальному ключу студент, предмет, оценка, дата)
             duplicate = StatStudent.objects.filter(
-                name=name,
-                subject=subject,
-                grade=grade_value,
-                date=date,
-                teacher=teacher,
-                cafedra=cafedra
-
+                **grade_lookup(form.cleaned_data)
             ).exclude(id=grade_id).exists()
             if duplicate:
                 messages.error(request, 'Данный студент уже существует')
             else:
-                form.save()
+                with transaction.atomic():
+                    form.save()
+                    apply_summary_change(old_values, grade)
+                    prune_dimensions(old_ids)
+                    bump_data_version('db')
                 messages.success(request, 'Оценка успешно обновлена!')
                 return redirect('grades_list')
         else:
@@ -154,7 +389,12 @@ def delete_grade(request, grade_id):
     grade = get_object_or_404(StatStudent, id=grade_id)
     
     if request.method == 'POST':
-        grade.delete()
+        with transaction.atomic():
+            apply_summary_delta(grade, -1)
+            old_ids = dimension_ids(grade)
+            grade.delete()
+            prune_dimensions(old_ids)
+            bump_data_version('db')
         messages.success(request, 'Оценка успешно удалена!')
         return redirect('grades_list')
     
@@ -170,39 +410,76 @@ def upload_xml(request):
             xml_file = request.FILES['xml_file']
 
             # Генерируем безопасное имя файла
-            safe_filename = generate_xml_filename()
+            safe_filename = generate_xml_filename(form.cleaned_data['compression'] or None)
             upload_dir = ensure_grades_dir()
             file_path = os.path.join(upload_dir, safe_filename)
 
-            # Сохраняем файл
-            with open(file_path, 'wb+') as destination:
-                for chunk in xml_file.chunks():
-                    destination.write(chunk)
-
-            # Проверяем валидность XML
-            if validate_xml_file(file_path):
-                messages.success(request, f'Файл {xml_file.name} успешно загружен и проверен!')
-                return redirect('xml_files_list')
+            # Сохраняем файл, проверяя структуру и импортируя оценки за один проход
+            # (с очередью импорт выполняет run_import_worker, запрос сразу возвращает ответ)
+            import_to_db = form.cleaned_data['import_to_db']
+            queue_import = import_to_db and import_jobs_enabled()
+            try:
+                info, stats = receive_xml_upload(xml_file, file_path, import_to_db and not queue_import)
+            except XMLUploadError as e:
+                messages.error(request, f'Файл {xml_file.name} отклонен: {e}. Файл удален.')
             else:
-                # Удаляем невалидный файл
-                os.remove(file_path)
-                messages.error(request, 'Файл не является валидным XML. Файл удален.')
+                update_xml_manifest(safe_filename, info)
+                messages.success(
+                    request, f"Файл {xml_file.name} успешно загружен и проверен! Записей: {info['records_count']}"
+                )
+                if queue_import:
+                    enqueue_import(safe_filename)
+                    messages.info(request, 'Импорт в БД поставлен в очередь')
+                elif stats is not None:
+                    messages.info(request, format_import_stats(stats))
+                return redirect('xml_files_list')
     else:
         form = UploadXMLForm()
 
     return render(request, 'upload_xml.html', {'form': form})
 
+# Текст сообщения с итогами импорта
+def format_import_stats(stats):
+    return (f"Импортировано в БД: {stats['created']}, "
+            f"пропущено дубликатов: {stats['skipped']}, "
+            f"некорректных записей: {stats['invalid']}")
+
+# Импорт оценок из XML файла в базу данных
+def import_xml_file(request, filename):
+    if request.method != 'POST':
+        return redirect('view_xml_file', filename=filename)
+
+    grades_dir = get_grades_xml_dir()
+    file_path = os.path.join(grades_dir, filename)
+
+    if import_jobs_enabled():
+        if not os.path.exists(file_path):
+            messages.error(request, 'Файл не найден')
+        else:
+            enqueue_import(filename)
+            messages.info(request, f'Импорт файла {filename} поставлен в очередь')
+        return redirect('xml_files_list')
+
+    if filename == GRADES_XML_FILENAME:
+        compact_grades_xml()
+
+    if not os.path.exists(file_path):
+        messages.error(request, 'Файл не найден')
+        return redirect('xml_files_list')
+
+    try:
+        stats = import_xml_file_to_db(file_path)
+    except ET.ParseError:
+        messages.error(request, 'Файл не является валидным XML')
+        return redirect('xml_files_list')
+
+    messages.success(request, f'Файл {filename} импортирован. ' + format_import_stats(stats))
+    return redirect('grades_list')
+
 # Список всех XML файлов и их содержимого
 def xml_files_list(request):
-    xml_files = get_all_xml_files()
-
-    # Для каждого файла получаем оценки
-    files_data = []
-    for file_info in xml_files:
-        grades = get_grades_from_uploaded_xml(file_info['filepath'])
-        file_info['grades'] = grades
-        file_info['grades_count'] = len(grades)
-        files_data.append(file_info)
+    # Сведения о файлах берутся из манифеста, сами файлы не читаются
+    files_data = get_all_xml_files()
 
     context = {
         'files_data': files_data,
@@ -211,53 +488,101 @@ def xml_files_list(request):
 
     return render(request, 'xml_files_list.html', context)
 
-# Просмотр содержимого конкретного XML файла
-def view_xml_file(request, filename):
+# Состояние задач импорта: ?filename=... (можно несколько) или ?id=...
+def import_jobs(request):
+    if request.GET.get('id'):
+        jobs = ImportJob.objects.filter(id=request.GET['id']) if request.GET['id'].isdigit() else []
+    else:
+        jobs = latest_jobs(request.GET.getlist('filename'))
+    data = [job_status_data(job) for job in jobs]
+    return JsonResponse({
+        'jobs': data,
+        'active': any(job['status'] in ACTIVE_STATUSES for job in data),
+    })
+
+# Сжатие файла -> значение Content-Encoding
+CONTENT_ENCODINGS = {'gz': 'gzip', 'xz': 'xz'}
+
+# Принимает ли клиент ответ с таким Content-Encoding (значения с q=0 не считаются)
+def accepts_encoding(request, encoding):
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = item.strip().partition(';')
+        if coding.strip().lower() != encoding:
+            continue
+        quality = params.strip().lower().removeprefix('q=')
+        try:
+            return not params or float(quality) > 0
+        except ValueError:
+            return True
+    return False
+
+# Просмотр содержимого конкретного XML файла (разбор в пуле потоков)
+async def view_xml_file(request, filename):
     grades_dir = ensure_grades_dir()
     file_path = os.path.join(grades_dir, filename)
 
+    if filename == GRADES_XML_FILENAME:
+        await run_xml_task(compact_grades_xml)
+
     if not os.path.exists(file_path):
         messages.error(request, 'Файл не найден')
         return redirect('xml_files_list')
 
-    if not validate_xml_file(file_path):
+    if not await run_xml_task(validate_xml_file, file_path):
         messages.error(request, 'Файл не является валидным XML')
         return redirect('xml_files_list')
 
-    grades = get_grades_from_uploaded_xml(file_path)
+    query = request.GET.get('q', '').strip()
+    if query:
+        # Поиск по индексу файла вместо вывода всех записей
+        units = await sync_to_async(list_index_units)([filename])
+        grades = [grade for _, grade in await run_xml_task(xml_search_index.search, query, units)]
+    else:
+        grades = await run_xml_task(get_grades_from_uploaded_xml, file_path)
 
     context = {
         'filename': filename,
         'grades': grades,
-        'has_grades': len(grades) > 0
+        'has_grades': len(grades) > 0,
+        'query': query,
     }
 
-    return render(request, 'xml_file_detail.html', context)
+    return await sync_to_async(render)(request, 'xml_file_detail.html', context)
 
-# Скачивание XML файла
+# Скачивание XML файла: через фронтальный сервер (GRADES_DOWNLOAD_OFFLOAD) или из процесса
+# с поддержкой Range и условных запросов. Сжатый файл отдается как есть с Content-Encoding,
+# если клиент принимает это сжатие, иначе распаковывается на лету
 def download_xml_file(request, filename):
     grades_dir = get_grades_xml_dir()
     file_path = os.path.join(grades_dir, filename)
 
+    if filename == GRADES_XML_FILENAME:
+        compact_grades_xml()
+
     if not os.path.exists(file_path):
         messages.error(request, 'Файл не найден')
         return redirect('xml_files_list')
 
     try:
         # Проверяем, что файл является XML
-        if not filename.endswith('.xml'):
+        if not is_grades_xml_filename(filename):
             messages.error(request, 'Файл не является XML')
             return redirect('xml_files_list')
 
-        # Открываем файл для чтения в бинарном режиме
-        response = FileResponse(open(file_path, 'rb'))
-        
-        # Устанавливаем заголовки для скачивания
-        response['Content-Type'] = 'application/xml'
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
+        compression = xml_compression(filename)
+        xml_filename = filename.removesuffix(f'.{compression}') if compression else filename
+        content_encoding = CONTENT_ENCODINGS.get(compression)
+
+        if compression is None or accepts_encoding(request, content_encoding):
+            response = serve_file(request, file_path, 'application/xml', xml_filename, content_encoding)
+        else:
+            response = serve_decoded_file(
+                request, file_path, 'application/xml', xml_filename, read_file_chunks(file_path)
+            )
+        if compression is not None:
+            patch_vary_headers(response, ('Accept-Encoding',))
         return response
 
     except Exception as e:
         messages.error(request, f'Ошибка при скачивании файла: {str(e)}')
-        return redirect('xml_files_list')
\ No newline at end of file
+        return redirect('xml_files_list')
@@ -0,0 +1,105 @@
+import os
+import sys
+import hashlib
+import threading
+from collections import OrderedDict
+from django.conf import settings
+
+# Кэш результатов разбора XML файлов оценок.
+# Ключ - (путь, mtime, размер, inode): любое изменение файла дает новый ключ,
+# поэтому инвалидировать ничего не нужно, старые записи вытесняются по LRU.
+
+
+# Ключ кэша для файла на диске (None, если файла нет)
+def file_cache_key(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+# Примерный объем памяти, занимаемый разобранными оценками
+def estimate_grades_size(grades):
+    size = sys.getsizeof(grades)
+    for grade in grades:
+        size += sys.getsizeof(grade)
+        size += sum(sys.getsizeof(value) for value in grade.values())
+    return size
+
+
+class XMLParseCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()  # ключ -> (результат, размер)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Возвращает результат loader(file_path) из кэша или разбирает файл
+    def get(self, file_path, loader):
+        key = file_cache_key(file_path)
+        if key is None:
+            return loader(file_path)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        result = get_shared(key)
+        if result is None:
+            result = loader(file_path)
+            set_shared(key, result)
+        self.put(key, result)
+        return result
+
+    def put(self, key, result):
+        is_valid, grades = result
+        size = estimate_grades_size(grades)
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self.entries[key] = (result, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+
+# Общий кэш через Django cache framework (GRADES_XML_CACHE_ALIAS), если он настроен
+def shared_cache():
+    alias = getattr(settings, 'GRADES_XML_CACHE_ALIAS', None)
+    if not alias:
+        return None
+    from django.core.cache import caches
+    return caches[alias]
+
+def shared_cache_key(key):
+    return 'studstat:xmlparse:' + hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+
+def get_shared(key):
+    cache = shared_cache()
+    if cache is None:
+        return None
+    return cache.get(shared_cache_key(key))
+
+def set_shared(key, result):
+    cache = shared_cache()
+    if cache is not None:
+        cache.set(shared_cache_key(key), result)
+
+
+xml_parse_cache = XMLParseCache(getattr(settings, 'GRADES_XML_CACHE_MAX_BYTES', 64 * 1024 * 1024))
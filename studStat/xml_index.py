@@ -0,0 +1,201 @@
+import os
+import re
+import sys
+import bisect
+import threading
+from collections import OrderedDict, defaultdict
+from django.conf import settings
+from .models import XMLFileManifest, XMLPartition
+from .search import parse_search_query
+from .utils import (
+    GRADE_XML_FIELDS, GRADES_JOURNAL_FILENAME, GRADES_XML_FILENAME, get_grades_xml_dir,
+    get_parsed_grades_file, iter_journal_grades
+)
+from .xml_cache import estimate_grades_size, file_cache_key
+from .xml_store import partition_file_paths
+
+# Поиск по XML файлам через инвертированный индекс в памяти процесса.
+# Индекс строится лениво для каждого файла (загруженные файлы из манифеста, секции
+# XML хранилища, старый grades.xml) и перестраивается только для файлов, у которых
+# изменились mtime, размер или inode. Слова запроса ищутся как начала слов записей
+# (ФИО, предмет, оценка, преподаватель, кафедра), даты - как в поиске по БД.
+# Файлы читаются через кэш разбора (xml_parse_cache), индексы занимают не больше
+# GRADES_XML_INDEX_MAX_BYTES и вытесняются по LRU.
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# Поля оценки, по словам которых строится индекс
+INDEXED_FIELDS = ('name', 'subject', 'grade', 'teacher', 'cafedra')
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall((text or '').lower().replace('ё', 'е'))
+
+
+class FileIndex:
+    def __init__(self, records):
+        self.records = records
+        postings = defaultdict(list)
+        for number, grade in enumerate(records):
+            for token in {token for field in INDEXED_FIELDS for token in tokenize(grade[field])}:
+                postings[token].append(number)
+        self.tokens = sorted(postings)
+        self.postings = [postings[token] for token in self.tokens]
+        # Примерный объем памяти: записи, слова и списки номеров записей
+        self.size = (estimate_grades_size(records)
+                     + sum(sys.getsizeof(token) for token in self.tokens)
+                     + sum(sys.getsizeof(numbers) for numbers in self.postings))
+
+    # Номера записей, в которых есть слово, начинающееся с prefix
+    def match_prefix(self, prefix):
+        found = set()
+        for i in range(bisect.bisect_left(self.tokens, prefix), len(self.tokens)):
+            if not self.tokens[i].startswith(prefix):
+                break
+            found.update(self.postings[i])
+        return found
+
+    # Записи, подходящие под все слова и все диапазоны дат
+    def search(self, terms, date_ranges):
+        numbers = None
+        for term in terms:
+            for word in tokenize(term):
+                matched = self.match_prefix(word)
+                numbers = matched if numbers is None else numbers & matched
+                if not numbers:
+                    return []
+        records = self.records if numbers is None else [self.records[number] for number in sorted(numbers)]
+        for start, end in date_ranges:
+            start, end = start.isoformat(), end.isoformat()
+            records = [grade for grade in records if start <= grade['date'] <= end]
+        return records
+
+
+# Индексируемый источник: имя файла для ответа (None для XML хранилища), XML файл и журнал
+class IndexUnit:
+    def __init__(self, key, filename, file_path, journal_path=None):
+        self.key = key
+        self.filename = filename
+        self.file_path = file_path
+        self.journal_path = journal_path
+
+    def stat_key(self):
+        return file_cache_key(self.file_path), self.journal_path and file_cache_key(self.journal_path)
+
+    # Записи файла берутся из кэша разбора как есть (без копии), если в них заполнены все поля
+    def load(self):
+        records = []
+
+        def add(grades):
+            for grade_data in grades:
+                if all(grade_data.get(key) is not None for _, key in GRADE_XML_FIELDS):
+                    records.append(grade_data)
+                    continue
+                grade = {key: '' for _, key in GRADE_XML_FIELDS}
+                grade.update((key, value) for key, value in grade_data.items() if value is not None)
+                records.append(grade)
+
+        if os.path.exists(self.file_path):
+            is_valid, grades = get_parsed_grades_file(self.file_path)
+            if not is_valid:
+                print(f"Error parsing XML: {self.file_path}")
+            add(grades)
+        if self.journal_path and os.path.exists(self.journal_path):
+            add(iter_journal_grades(self.journal_path))
+        return records
+
+
+# Источники для поиска (читает манифест и сводки секций, поэтому вызывается в потоке запроса).
+# filenames - только указанные загруженные файлы
+def list_index_units(filenames=None):
+    grades_dir = get_grades_xml_dir()
+    units = []
+    manifests = XMLFileManifest.objects.filter(is_valid=True)
+    if filenames is not None:
+        manifests = manifests.filter(filename__in=filenames)
+    for filename in manifests.values_list('filename', flat=True):
+        journal_path = os.path.join(grades_dir, GRADES_JOURNAL_FILENAME) if filename == GRADES_XML_FILENAME else None
+        units.append(IndexUnit(filename, filename, os.path.join(grades_dir, filename), journal_path))
+    if filenames is None:
+        for partition in XMLPartition.objects.all():
+            units.append(IndexUnit(partition.path, None, *partition_file_paths(partition)))
+    return units
+
+
+# Индексы файлов в памяти процесса с бюджетом max_bytes.
+# Общая блокировка защищает только словарь индексов, индекс строится под блокировкой
+# своего источника: запросы к другим файлам в это время не ждут
+class XMLSearchIndex:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()  # ключ источника -> (ключ состояния файлов, FileIndex)
+        self.build_locks = {}  # ключ источника -> блокировка построения
+        self.lock = threading.Lock()
+
+    def get(self, unit):
+        stat_key = unit.stat_key()
+        with self.lock:
+            index = self.lookup(unit.key, stat_key)
+            if index is not None:
+                return index
+            build_lock = self.build_locks.setdefault(unit.key, threading.Lock())
+
+        with build_lock:
+            # Пока ждали, индекс мог построить другой поток
+            with self.lock:
+                index = self.lookup(unit.key, stat_key)
+            if index is None:
+                index = FileIndex(unit.load())
+                self.put(unit.key, stat_key, index)
+        return index
+
+    # Индекс из памяти, если файлы источника не менялись (вызывается под self.lock)
+    def lookup(self, key, stat_key):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != stat_key:
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    # Индекс больше бюджета не сохраняется: он используется только в текущем запросе
+    def put(self, key, stat_key, index):
+        with self.lock:
+            self.discard(key)
+            if index.size > self.max_bytes:
+                return
+            self.entries[key] = (stat_key, index)
+            self.current_bytes += index.size
+            while self.current_bytes > self.max_bytes:
+                self.discard(next(iter(self.entries)))
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1].size
+
+    # Оценки из XML, подходящие под строку поиска: [(имя файла, оценка)], новые даты первыми
+    def search(self, query, units):
+        terms, date_ranges = parse_search_query(query)
+        hits = []
+        for unit in units:
+            hits.extend((unit.filename, grade) for grade in self.get(unit).search(terms, date_ranges))
+        hits.sort(key=lambda hit: hit[1]['date'], reverse=True)
+        return hits
+
+    # Убирает из памяти индексы файлов, которых больше нет среди источников
+    def prune(self, units):
+        keys = {unit.key for unit in units}
+        with self.lock:
+            for key in set(self.entries) - keys:
+                self.discard(key)
+            for key in set(self.build_locks) - keys:
+                del self.build_locks[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+
+xml_search_index = XMLSearchIndex(getattr(settings, 'GRADES_XML_INDEX_MAX_BYTES', 64 * 1024 * 1024))
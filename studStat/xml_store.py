@@ -0,0 +1,246 @@
+import os
+import hashlib
+import datetime
+from collections import defaultdict
+import xml.etree.ElementTree as ET
+from xml.etree.ElementTree import ParseError
+from django.conf import settings
+from django.utils.text import slugify
+from .models import XMLPartition
+from .metrics import timed_xml
+from .versions import bump_data_version
+from .utils import (
+    GRADE_XML_FIELDS, GRADES_JOURNAL_FILENAME, GRADES_XML_FILENAME, build_grade_element, compact_grades_xml,
+    ensure_grades_dir, get_grades_xml_dir, get_parsed_grades_file, grades_xml_lock, iter_grades_from_xml,
+    iter_journal_grades, merge_journal, update_xml_manifest
+)
+
+# XML хранилище оценок, разбитое на секции по месяцу и кафедре:
+# grades_xml/partitions/<ГГГГ-ММ>/<кафедра>-<хэш>.xml и журнал дозаписи .journal рядом.
+# Сводка по секции (период, количество, предметы) хранится в таблице xml_partition,
+# поэтому выборка с фильтрами по датам, кафедре и предмету открывает только секции,
+# в которых могут быть подходящие оценки. Старый grades.xml читается целиком, пока
+# его не разнесет по секциям команда partition_grades_xml.
+
+PARTITIONS_DIRNAME = 'partitions'
+
+# Сколько оценок накапливать в памяти перед записью в журналы секций
+PARTITION_FLUSH_ROWS = 10000
+
+
+def parse_grade_date(value):
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(value or '')
+    except (TypeError, ValueError):
+        return None
+
+# Ключ секции оценки: (месяц 'ГГГГ-ММ', кафедра)
+def partition_key(grade_data):
+    date = parse_grade_date(grade_data.get('date'))
+    return (date.strftime('%Y-%m') if date else '', grade_data.get('cafedra') or '')
+
+# Путь файла секции относительно grades_xml; хэш различает кафедры с одинаковым slug
+def partition_path(month, cafedra):
+    digest = hashlib.sha1(cafedra.encode('utf-8')).hexdigest()[:8]
+    slug = slugify(cafedra, allow_unicode=True)[:40] or 'none'
+    return os.path.join(PARTITIONS_DIRNAME, month or 'undated', f'{slug}-{digest}.xml')
+
+def partition_file_paths(partition):
+    file_path = os.path.join(get_grades_xml_dir(), partition.path)
+    return file_path, file_path.removesuffix('.xml') + '.journal'
+
+# Учитывает оценки в сводке секции
+def add_to_partition_summary(partition, grades):
+    subjects = set(partition.subjects)
+    for grade_data in grades:
+        partition.records_count += 1
+        if grade_data.get('subject'):
+            subjects.add(grade_data['subject'])
+        date = parse_grade_date(grade_data.get('date'))
+        if date is None:
+            continue
+        if partition.date_from is None or date < partition.date_from:
+            partition.date_from = date
+        if partition.date_to is None or date > partition.date_to:
+            partition.date_to = date
+    partition.subjects = sorted(subjects)
+
+# Дописывает накопленные оценки в журналы их секций и обновляет сводки
+def flush_partitions(pending):
+    if not pending:
+        return
+    grades_dir = ensure_grades_dir()
+    max_journal_bytes = getattr(settings, 'GRADES_XML_JOURNAL_MAX_BYTES', 1024 * 1024)
+
+    with grades_xml_lock():
+        for (month, cafedra), grades in pending.items():
+            partition, _ = XMLPartition.objects.get_or_create(
+                month=month, cafedra=cafedra, defaults={'path': partition_path(month, cafedra)}
+            )
+            file_path, journal_path = partition_file_paths(partition)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(journal_path, 'ab') as journal:
+                for grade_data in grades:
+                    record = ET.tostring(build_grade_element(grade_data), encoding='unicode') + '\n'
+                    journal.write(record.encode('utf-8'))
+                journal_size = journal.tell()
+
+            add_to_partition_summary(partition, grades)
+            partition.save()
+
+            # Журнал секции разросся - переносим его в файл секции
+            if journal_size >= max_journal_bytes:
+                merge_journal(file_path, journal_path)
+
+    bump_data_version('xml')
+
+# Раскладывает оценки по секциям, возвращает число записанных оценок
+@timed_xml('write')
+def append_grades_to_partitions(grades, flush_rows=PARTITION_FLUSH_ROWS):
+    pending = defaultdict(list)
+    count = buffered = 0
+    for grade_data in grades:
+        pending[partition_key(grade_data)].append(grade_data)
+        count += 1
+        buffered += 1
+        if buffered >= flush_rows:
+            flush_partitions(pending)
+            pending, buffered = defaultdict(list), 0
+    flush_partitions(pending)
+    return count
+
+# Сохраняет оценку студента в XML хранилище (дозапись в журнал секции)
+def save_grade_to_xml(grade_data):
+    try:
+        append_grades_to_partitions([grade_data])
+    except Exception as e:
+        print(f"Error saving to XML: {e}")
+        return False
+    return True
+
+# Оценки секции: файл (через кэш разбора) и журнал
+def iter_partition_grades(partition):
+    file_path, journal_path = partition_file_paths(partition)
+    if os.path.exists(file_path):
+        is_valid, records = get_parsed_grades_file(file_path)
+        if not is_valid:
+            print(f"Error parsing XML: {file_path}")
+        yield from records
+    if os.path.exists(journal_path):
+        yield from iter_journal_grades(journal_path)
+
+# Оценки старого grades.xml и его журнала
+def iter_legacy_grades():
+    grades_dir = get_grades_xml_dir()
+    file_path = os.path.join(grades_dir, GRADES_XML_FILENAME)
+    journal_path = os.path.join(grades_dir, GRADES_JOURNAL_FILENAME)
+    if os.path.exists(file_path):
+        is_valid, records = get_parsed_grades_file(file_path)
+        if not is_valid:
+            print(f"Error parsing XML: {file_path}")
+        yield from records
+    if os.path.exists(journal_path):
+        yield from iter_journal_grades(journal_path)
+
+# Секции, в которых могут быть оценки под фильтр (по сводкам, без чтения файлов)
+def select_partitions(date_from=None, date_to=None, cafedra=None, subject=None):
+    partitions = XMLPartition.objects.all()
+    if date_from:
+        partitions = partitions.filter(date_to__gte=date_from)
+    if date_to:
+        partitions = partitions.filter(date_from__lte=date_to)
+    if cafedra:
+        partitions = partitions.filter(cafedra=cafedra)
+    return [partition for partition in partitions if not subject or subject in partition.subjects]
+
+def grade_matches(grade, date_from=None, date_to=None, cafedra=None, subject=None):
+    if cafedra and grade.get('cafedra') != cafedra:
+        return False
+    if subject and grade.get('subject') != subject:
+        return False
+    if date_from or date_to:
+        date = parse_grade_date(grade.get('date'))
+        if date is None or (date_from and date < date_from) or (date_to and date > date_to):
+            return False
+    return True
+
+# Оценки из XML хранилища с фильтрами по периоду, кафедре и предмету.
+# partitions - заранее выбранные секции (async представление выбирает их в потоке запроса)
+@timed_xml('read')
+def get_all_grades_from_xml(date_from=None, date_to=None, cafedra=None, subject=None, partitions=None):
+    filters = {'date_from': date_from, 'date_to': date_to, 'cafedra': cafedra, 'subject': subject}
+    if partitions is None:
+        partitions = select_partitions(**filters)
+    grades = []
+
+    def add_grades(records):
+        for grade_data in records:
+            if not grade_matches(grade_data, **filters):
+                continue
+            grade = {key: '' for _, key in GRADE_XML_FIELDS}
+            grade.update((key, value) for key, value in grade_data.items() if value is not None)
+            grades.append(grade)
+
+    for partition in partitions:
+        try:
+            add_grades(iter_partition_grades(partition))
+        except (ParseError, ET.ParseError) as e:
+            print(f"Error parsing XML: {e}")
+
+    try:
+        add_grades(iter_legacy_grades())
+    except (ParseError, ET.ParseError) as e:
+        print(f"Error parsing XML: {e}")
+
+    return grades
+
+# Кафедры и предметы из сводок секций (для фильтров списка)
+def partition_filter_choices():
+    cafedras, subjects = set(), set()
+    for cafedra, partition_subjects in XMLPartition.objects.values_list('cafedra', 'subjects'):
+        if cafedra:
+            cafedras.add(cafedra)
+        subjects.update(partition_subjects)
+    return sorted(cafedras), sorted(subjects)
+
+# Разносит старый grades.xml (вместе с журналом) по секциям и удаляет его
+def partition_legacy_grades_xml():
+    compact_grades_xml()
+    file_path = os.path.join(get_grades_xml_dir(), GRADES_XML_FILENAME)
+    if not os.path.exists(file_path):
+        return 0
+
+    moved = append_grades_to_partitions(iter_grades_from_xml(file_path))
+    os.remove(file_path)
+    update_xml_manifest(GRADES_XML_FILENAME)
+    return moved
+
+# Пересчитывает сводки всех секций по их файлам (после ручных изменений в директории)
+def rebuild_partition_summaries():
+    partitions_dir = os.path.join(ensure_grades_dir(), PARTITIONS_DIRNAME)
+    found = {}
+    for root, _, filenames in os.walk(partitions_dir):
+        for filename in filenames:
+            if filename.endswith(('.xml', '.journal')):
+                base = os.path.splitext(os.path.join(root, filename))[0]
+                found[os.path.relpath(base, get_grades_xml_dir()) + '.xml'] = True
+
+    with grades_xml_lock():
+        XMLPartition.objects.exclude(path__in=found).delete()
+        for path in found:
+            partition = XMLPartition(path=path)
+            grades = list(iter_partition_grades(partition))
+            if not grades:
+                XMLPartition.objects.filter(path=path).delete()
+                continue
+            partition.month, partition.cafedra = partition_key(grades[0])
+            add_to_partition_summary(partition, grades)
+            XMLPartition.objects.update_or_create(path=path, defaults={
+                field: getattr(partition, field)
+                for field in ('month', 'cafedra', 'records_count', 'date_from', 'date_to', 'subjects')
+            })
+
+    bump_data_version('xml')
+    return len(found)
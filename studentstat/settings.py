@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'studStat.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,9 +91,28 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('POSTGRES_HOST', 'postgres'),
         'PORT': os.getenv('POSTGRES_PORT', 5432),
+        'OPTIONS': {
+            # Ограничение времени одного SQL запроса, мс (0 - без ограничения)
+            'options': f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))}",
+        },
     }
 }
 
+# Пул соединений psycopg 3: соединение не открывается заново на каждый запрос,
+# перед выдачей из пула оно проверяется (check_connection)
+if os.getenv('DB_POOL', '1') == '1':
+    try:
+        from psycopg_pool import ConnectionPool
+    except ImportError:  # psycopg2 или psycopg без пула
+        ConnectionPool = None
+    if ConnectionPool is not None:
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'check': ConnectionPool.check_connection,
+        }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -141,4 +161,30 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/' # URL для доступа к загруженным файлам
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media') # путь на диске, где будут храниться файлы
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media') # путь на диске, где будут храниться файлы
+
+GRADES_IMPORT_BATCH_SIZE = int(os.getenv('GRADES_IMPORT_BATCH_SIZE', 5000)) # размер пачки при импорте оценок из XML в БД
+GRADES_XML_JOURNAL_MAX_BYTES = int(os.getenv('GRADES_XML_JOURNAL_MAX_BYTES', 1024 * 1024)) # размер журнала grades.xml, после которого он сливается в основной файл
+GRADES_PAGE_SIZE = int(os.getenv('GRADES_PAGE_SIZE', 50)) # оценок на странице списка и в ответе поиска
+GRADES_MAX_PAGE_SIZE = 500 # максимальный размер страницы, который можно запросить через page_size
+GRADES_XML_CACHE_MAX_BYTES = int(os.getenv('GRADES_XML_CACHE_MAX_BYTES', 64 * 1024 * 1024)) # бюджет памяти кэша разобранных XML файлов
+GRADES_XML_CACHE_ALIAS = os.getenv('GRADES_XML_CACHE_ALIAS') or None # алиас из CACHES для общего кэша разбора между процессами
+GRADES_XML_INDEX_MAX_BYTES = int(os.getenv('GRADES_XML_INDEX_MAX_BYTES', 64 * 1024 * 1024)) # бюджет памяти индекса поиска по XML файлам
+GRADES_EXPORT_CHUNK_SIZE = int(os.getenv('GRADES_EXPORT_CHUNK_SIZE', 2000)) # строк за одну выборку при потоковом экспорте
+GRADES_API_CHUNK_SIZE = int(os.getenv('GRADES_API_CHUNK_SIZE', 500)) # оценок в одном INSERT при приеме через /api/grades/
+GRADES_API_TOKEN = os.getenv('GRADES_API_TOKEN') or None # токен для /api/grades/ (если не задан, прием через API выключен)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1' # сбор метрик запросов для /metrics
+METRICS_ALLOWED_IPS = tuple(os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')) # адреса, с которых доступен /metrics
+GRADES_XML_THREADS = int(os.getenv('GRADES_XML_THREADS', 4)) # потоков для разбора XML в async представлениях
+GRADES_RESPONSE_CACHE_ALIAS = os.getenv('GRADES_RESPONSE_CACHE_ALIAS', 'default') # алиас из CACHES для кэша списков и поиска
+GRADES_RESPONSE_CACHE_TIMEOUT = int(os.getenv('GRADES_RESPONSE_CACHE_TIMEOUT', 300)) # сколько секунд хранить результат (сбрасывается и при записи)
+GRADES_RESPONSE_CACHE_MAX_ROWS = int(os.getenv('GRADES_RESPONSE_CACHE_MAX_ROWS', 5000)) # списки XML длиннее этого не кэшируются
+GRADES_SUGGEST_LIMIT = int(os.getenv('GRADES_SUGGEST_LIMIT', 10)) # подсказок в ответе /suggest/ по умолчанию
+GRADES_IMPORT_JOBS = os.getenv('GRADES_IMPORT_JOBS', '1') == '1' # импорт XML в БД через очередь (команда run_import_worker), а не в запросе
+GRADES_IMPORT_JOB_STALE_SECONDS = int(os.getenv('GRADES_IMPORT_JOB_STALE_SECONDS', 300)) # задача без отчета дольше этого считается брошенной и выполняется заново
+GRADES_IMPORT_WORKER_POLL_SECONDS = float(os.getenv('GRADES_IMPORT_WORKER_POLL_SECONDS', 2)) # пауза между проверками очереди обработчиком
+GRADES_XML_COMPRESSION = os.getenv('GRADES_XML_COMPRESSION', '') # сжатие загружаемых XML файлов по умолчанию: '', 'gz' или 'xz'
+GRADES_DOWNLOAD_OFFLOAD = os.getenv('GRADES_DOWNLOAD_OFFLOAD', '') # отдача XML файлов фронтальным сервером: '', 'x-accel-redirect' (nginx) или 'x-sendfile'
+GRADES_DOWNLOAD_ACCEL_PREFIX = os.getenv('GRADES_DOWNLOAD_ACCEL_PREFIX', '/protected/') # internal location nginx, соответствующий MEDIA_ROOT
+GRADES_ANALYTICS_CHUNK_SIZE = int(os.getenv('GRADES_ANALYTICS_CHUNK_SIZE', 20000)) # строк, переводимых в массивы NumPy за раз при загрузке отчетов
+GRADES_ANALYTICS_LIMIT = int(os.getenv('GRADES_ANALYTICS_LIMIT', 100)) # групп в ответе /analytics/ по умолчанию